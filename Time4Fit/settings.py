@@ -24,6 +24,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
 
     'user',
     'user_profile',
@@ -161,6 +162,15 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 CELERY_BROKER_URL = 'redis://localhost:6379/0'
 CELERY_RESULT_BACKEND = 'redis://localhost:6379/0'
 
+# Wspólny cache dla wszystkich procesów (gunicorn, celery) - szczegóły eventów, role i klastry mapy
+# są unieważniane przez bump wersji, który w LocMem widziałby tylko proces, który go zrobił
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/1"),
+    }
+}
+
 
 if ENV == "local":
     STORAGES = {
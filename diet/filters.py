@@ -1,32 +1,70 @@
 from rest_framework.filters import BaseFilterBackend
-from django.db.models import Q
-from .models import Allergen 
+from django.db.models import Q, F
+from django.utils.translation import get_language
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramWordSimilarity
+
+from .models import ProductCategory
+from .search import DEFAULT_SEARCH_CONFIG, get_search_config, product_search_vector
+from .utils import barcode_variants, normalize_barcode
+
+
+# 14 alergenów z rozporządzenia UE 1169/2011 w formacie tagów Open Food Facts
+ALLERGENS = {
+    'gluten', 'crustaceans', 'eggs', 'fish', 'peanuts', 'soybeans', 'milk', 'nuts',
+    'celery', 'mustard', 'sesame-seeds', 'sulphur-dioxide-and-sulphites', 'lupin', 'molluscs',
+}
+
+
+class ProductSearchFilter(BaseFilterBackend):
+    """
+    Wyszukiwanie po tsvector (konfiguracja wg języka, ranking ts_rank) połączone
+    z podobieństwem trigramowym tytułu, które łapie literówki i fragmenty słów.
+    Alergen w zapytaniu wyklucza produkty, które go zawierają.
+    """
 
-class SmartHybridSearchFilter(BaseFilterBackend):
     def filter_queryset(self, request, queryset, view):
         search_param = request.query_params.get('search', '')
-        
-        if not search_param:
-            return queryset
-        
+
         terms = [term.strip() for term in search_param.replace(',', ' ').split() if term.strip()]
-        
+
         if not terms:
             return queryset
-        
-        include_fields = ['title', 'category__name', 'barcode']
 
+        words = []
         for term in terms:
-            is_allergen = Allergen.objects.filter(name__icontains=term).exists()
-
-            if is_allergen:
-                queryset = queryset.exclude(allergens__name__icontains=term)
+            if term.lower() in ALLERGENS:
+                queryset = queryset.exclude(allergens__contains=[term.lower()])
             else:
-                term_query = Q()
-                for field in include_fields:
-                    lookup = f"{field}__icontains"
-                    term_query |= Q(**{lookup: term})
-                
-                queryset = queryset.filter(term_query)
-
-        return queryset.distinct()
\ No newline at end of file
+                words.append(term)
+
+        if not words:
+            return queryset
+
+        text = ' '.join(words)
+
+        # Pełny kod kreskowy szukamy dokładnie, we wszystkich formach zapisu - prefiks nie trafi w indeks B-tree.
+        # Cyfry, które nie są poprawnym kodem, idą do zwykłego wyszukiwania
+        if text.isdigit():
+            try:
+                return queryset.filter(barcode__in=barcode_variants(normalize_barcode(text)))
+            except ValueError:
+                pass
+
+        config = get_search_config(request.query_params.get('lang') or get_language())
+        query = SearchQuery(text, config=config, search_type='websearch')
+
+        # Dla 'simple' jest zapisana kolumna, dla pozostałych języków indeksy na tym samym wyrażeniu
+        if config == DEFAULT_SEARCH_CONFIG:
+            document = F('search_vector')
+        else:
+            document = product_search_vector(config)
+
+        # Lista id zamiast podzapytania - `= ANY(array)` wchodzi do BitmapOr, podzapytanie w OR wymusza Seq Scan
+        categories = list(ProductCategory.objects.filter(name__trigram_word_similar=text).values_list('id', flat=True))
+
+        return queryset.annotate(
+            search_document=document,
+            rank=SearchRank(document, query) + TrigramWordSimilarity(text, 'title'),
+        ).filter(
+            Q(search_document=query) | Q(title__trigram_word_similar=text) | Q(category_id__in=categories)
+        ).order_by('-rank', 'id')
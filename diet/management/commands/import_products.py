@@ -1,14 +1,41 @@
+import hashlib
+import io
 import json
+import multiprocessing
+import os
+from collections import deque
 from decimal import Decimal
-from django.core.management.base import BaseCommand
-from django.db import transaction
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, models, transaction
 
 from diet.models import (
+    Dish,
     Product,
     ProductAdditionalInfo,
     ProductCategory,
     ProductServingUnit,
 )
+from diet.services import recalculate_dish_totals
+
+
+COPY_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+# Kolumny wypełniane przez writer (id, kategoria, FK) nie są renderowane w workerach,
+# kolumny generowane (search_vector) liczy sama baza
+PRODUCT_COPY_FIELDS = [
+    f for f in Product._meta.concrete_fields
+    if f.attname not in ("id", "category_id", "user_id") and not f.generated
+]
+INFO_COPY_FIELDS = [
+    f for f in ProductAdditionalInfo._meta.concrete_fields if f.attname != "product_id"
+]
+SERVING_COPY_FIELDS = [
+    f for f in ProductServingUnit._meta.concrete_fields if f.attname not in ("id", "product_id", "created_by_id")
+]
+
+# Przy synchronizacji nie nadpisujemy klucza ani właściciela produktu
+SYNC_PRODUCT_FIELDS = [f.name for f in PRODUCT_COPY_FIELDS if f.name != "barcode"] + ["category"]
+SYNC_INFO_FIELDS = [f.name for f in INFO_COPY_FIELDS]
 
 
 def to_dec(val, div=1):
@@ -36,6 +63,188 @@ def clean_data(val):
     return val
 
 
+def parse_line(line):
+    line = line.decode("utf-8", errors="ignore")
+    if not line.strip():
+        return None
+    try:
+        return json.loads(line)
+    except Exception:
+        return None
+
+
+def build_record(row):
+    """Normalizuje surowy wiersz JSONL do pól Product / ProductAdditionalInfo / ProductServingUnit."""
+    nutri = row.get("nutriments_100g") or {}
+    diet = row.get("diet_flags") or {}
+    additives = row.get("additives") or {}
+
+    product = dict(
+        title=clean_text(row.get("name")) or "Bez nazwy",
+        brand=clean_text(row.get("brand")),
+        barcode=clean_text(str(row.get("id"))) if row.get("id") else None,
+        quantity_display=clean_text(row.get("quantity")),
+        image_url=clean_text(row.get("image_url")),
+        kcal_1g=to_dec(nutri.get("energy_kcal"), 100) or Decimal(0),
+        protein_1g=to_dec(nutri.get("proteins"), 100) or Decimal(0),
+        fat_1g=to_dec(nutri.get("fat"), 100) or Decimal(0),
+        carbohydrates_1g=to_dec(nutri.get("carbohydrates"), 100) or Decimal(0),
+        salt_1g=to_dec(nutri.get("salt"), 100) or Decimal(0),
+        sugars_1g=to_dec(nutri.get("sugars"), 100),
+        saturated_fat_1g=to_dec(nutri.get("saturated_fat"), 100),
+        fiber_1g=to_dec(nutri.get("fiber"), 100),
+        nutriscore=clean_text(row.get("nutriscore")),
+        nova_group=row.get("nova_group"),
+        allergens=clean_data(row.get("allergens") or []),
+        countries=clean_data(row.get("countries") or []),
+        package_whole_g=to_dec(row.get("package_whole_g")),
+        package_name=clean_text(row.get("package_name")),
+    )
+
+    info = dict(
+        is_vegan=diet.get("is_vegan"),
+        is_vegetarian=diet.get("is_vegetarian"),
+        is_palm_oil_free=diet.get("is_palm_oil_free"),
+        is_complete_profile=row.get("is_complete_profile", True),
+        ingredients_text=clean_text(row.get("ingredients")),
+        traces=clean_data(row.get("traces") or []),
+        labels=clean_data(row.get("labels") or []),
+        additives_tags=clean_data(additives.get("tags") or []),
+    )
+
+    record = {
+        "category": clean_text(row.get("category")) or None,
+        "product": product,
+        "info": info,
+        "serving_g": to_dec(row.get("serving_g")),
+    }
+    product["content_hash"] = content_hash(record)
+    return record
+
+
+def content_hash(record):
+    payload = json.dumps(record, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(payload.encode("utf-8")).hexdigest()
+
+
+def parse_chunk(lines):
+    records = []
+    for line in lines:
+        row = parse_line(line)
+        if row is not None:
+            records.append(build_record(row))
+    return records
+
+
+def copy_value(field, value):
+    if value is None:
+        return "\\N"
+    if isinstance(field, models.JSONField):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    return str(value).translate(COPY_ESCAPES)
+
+
+def copy_line(instance, fields):
+    return "\t".join(copy_value(f, getattr(instance, f.attname)) for f in fields)
+
+
+def render_chunk(lines):
+    """
+    Uruchamiane w procesie workera: parsuje i normalizuje paczkę linii,
+    zwraca gotowe fragmenty wierszy COPY (bez id i kategorii - te nadaje writer).
+    Pierwszy element krotki to nazwa kategorii, drugi kod kreskowy.
+    """
+    rendered = []
+    for record in parse_chunk(lines):
+        serving = None
+        if record["serving_g"]:
+            serving = copy_line(
+                ProductServingUnit(
+                    unit_name="serving",
+                    custom_label="Porcja producenta",
+                    gram_weight=record["serving_g"],
+                    is_global=True,
+                ),
+                SERVING_COPY_FIELDS,
+            )
+
+        rendered.append((
+            record["category"],
+            record["product"]["barcode"],
+            copy_line(Product(**record["product"]), PRODUCT_COPY_FIELDS),
+            copy_line(ProductAdditionalInfo(**record["info"]), INFO_COPY_FIELDS),
+            serving,
+        ))
+    return rendered
+
+
+def iter_chunks(f, batch_size):
+    """Zwraca paczki surowych linii razem z offsetem bajtowym końca paczki."""
+    offset = f.tell()
+    lines = []
+    for line in f:
+        offset += len(line)
+        lines.append(line)
+        if len(lines) >= batch_size:
+            yield offset, lines
+            lines = []
+    if lines:
+        yield offset, lines
+
+
+class CategoryResolver:
+    """
+    Cache nazw kategorii -> id na czas importu. Brakujące nazwy z paczki
+    zapisuje jednym bulk_create i dociąga ich id jednym zapytaniem.
+    """
+
+    def __init__(self):
+        self.ids = dict(ProductCategory.objects.values_list("name", "id"))
+
+    def resolve(self, names):
+        missing = {name for name in names if name and name not in self.ids}
+        if missing:
+            ProductCategory.objects.bulk_create(
+                [ProductCategory(name=name) for name in missing],
+                ignore_conflicts=True,
+            )
+            self.ids.update(
+                ProductCategory.objects.filter(name__in=missing).values_list("name", "id")
+            )
+        return self.ids
+
+
+class Checkpoint:
+    def __init__(self, path, file_path):
+        self.path = path
+        self.file_path = os.path.abspath(file_path)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return 0, 0
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        if data.get("file") != self.file_path:
+            raise CommandError(f"Checkpoint {self.path} dotyczy innego pliku: {data.get('file')}")
+        return data["offset"], data["count"]
+
+    def save(self, offset, count):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"file": self.file_path, "offset": offset, "count": count}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
 class Command(BaseCommand):
     help = "Prosty import produktów z pliku jsonl z sanityzacją znaków NUL"
 
@@ -47,119 +256,275 @@ class Command(BaseCommand):
             default=0,
             help="Liczba linii do pominięcia (jeśli import wywalił się w trakcie)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Liczba procesów parsujących. Powyżej 1 zapis idzie przez COPY z jednego writera",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--checkpoint",
+            type=str,
+            default=None,
+            help="Plik z offsetem bajtowym do wznowienia importu (domyślnie <file_path>.checkpoint)",
+        )
+        parser.add_argument(
+            "--sync",
+            action="store_true",
+            help="Synchronizacja przyrostowa: aktualizuje po kodzie kreskowym tylko zmienione produkty",
+        )
 
     def handle(self, *args, **options):
         file_path = options["file_path"]
         skip_lines = options["skip"]
-        batch_size = 5000
+        batch_size = options["batch_size"]
+        workers = options["workers"]
 
-        products_batch = []
-        raw_rows = []
-        count = skip_lines
-        line_num = 0
+        # Bez --sync istniejące kody kreskowe są pomijane, z --sync aktualizowane jeśli zmienił się hash
+        if options["sync"]:
+            parse, write = parse_chunk, self.sync_batch
+        elif workers > 1:
+            parse, write = render_chunk, self.copy_batch
+        else:
+            parse, write = parse_chunk, self.save_batch
 
-        if skip_lines > 0:
-            self.stdout.write(self.style.WARNING(f"Pomijam pierwsze {skip_lines:,} linii..."))
+        checkpoint = Checkpoint(options["checkpoint"] or f"{file_path}.checkpoint", file_path)
+        offset, count = checkpoint.load()
+        self.categories = CategoryResolver()
+        self.written = 0
 
-        with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-            for line in f:
-                line_num += 1
-                if line_num <= skip_lines:
-                    continue
+        if offset:
+            self.stdout.write(self.style.WARNING(f"Wznawiam import od bajtu {offset:,} ({count:,} produktów)..."))
 
-                if not line.strip():
-                    continue
+        with open(file_path, "rb") as f:
+            f.seek(offset)
 
-                try:
-                    row = json.loads(line)
-                except Exception:
-                    continue
+            if skip_lines > 0:
+                self.stdout.write(self.style.WARNING(f"Pomijam pierwsze {skip_lines:,} linii..."))
+                for _ in range(skip_lines):
+                    if not f.readline():
+                        break
+                count += skip_lines
 
-                nutri = row.get("nutriments_100g") or {}
-
-                category = None
-                raw_category = clean_text(row.get("category"))
-                if raw_category:
-                    category, _ = ProductCategory.objects.get_or_create(
-                        name=raw_category
-                    )
-
-                p = Product(
-                    title=clean_text(row.get("name")) or "Bez nazwy",
-                    brand=clean_text(row.get("brand")),
-                    barcode=clean_text(str(row.get("id"))) if row.get("id") else None,
-                    quantity_display=clean_text(row.get("quantity")),
-                    image_url=clean_text(row.get("image_url")),
-                    category=category,
-                    kcal_1g=to_dec(nutri.get("energy_kcal"), 100) or Decimal(0),
-                    protein_1g=to_dec(nutri.get("proteins"), 100) or Decimal(0),
-                    fat_1g=to_dec(nutri.get("fat"), 100) or Decimal(0),
-                    carbohydrates_1g=to_dec(nutri.get("carbohydrates"), 100) or Decimal(0),
-                    salt_1g=to_dec(nutri.get("salt"), 100) or Decimal(0),
-                    sugars_1g=to_dec(nutri.get("sugars"), 100),
-                    saturated_fat_1g=to_dec(nutri.get("saturated_fat"), 100),
-                    fiber_1g=to_dec(nutri.get("fiber"), 100),
-                    nutriscore=clean_text(row.get("nutriscore")),
-                    nova_group=row.get("nova_group"),
-                    allergens=clean_data(row.get("allergens") or []),
-                    countries=clean_data(row.get("countries") or []),
-                    package_whole_g=to_dec(row.get("package_whole_g")),
-                    package_name=clean_text(row.get("package_name")),
-                )
+            chunks = iter_chunks(f, batch_size)
+
+            if workers > 1:
+                count = self.import_parallel(chunks, parse, write, workers, checkpoint, count)
+            else:
+                for end, lines in chunks:
+                    records = parse(lines)
+                    if records:
+                        self.written += write(records)
+                    count = self.commit_checkpoint(checkpoint, end, count + len(records))
+
+        checkpoint.clear()
+        self.stdout.write(self.style.SUCCESS(
+            f"Gotowe! Łącznie przetworzono: {count:,}, zapisano/zaktualizowano: {self.written:,}"
+        ))
+
+    def import_parallel(self, chunks, parse, write, workers, checkpoint, count):
+        # Workery nie dotykają bazy, ale nie mogą odziedziczyć otwartego połączenia
+        connections.close_all()
+        pending = deque()
+
+        with multiprocessing.Pool(workers) as pool:
+            for end, lines in chunks:
+                pending.append((end, pool.apply_async(parse, (lines,))))
 
-                products_batch.append(p)
-                raw_rows.append(row)
+                # Ograniczamy liczbę paczek w locie, żeby nie wczytać całego pliku do pamięci
+                if len(pending) >= workers * 2:
+                    count = self.write_pending(pending.popleft(), write, checkpoint, count)
 
-                if len(products_batch) >= batch_size:
-                    self.save_batch(products_batch, raw_rows)
-                    count += len(products_batch)
-                    self.stdout.write(f"Zaimportowano łącznie: {count:,} produktów...")
-                    products_batch = []
-                    raw_rows = []
+            while pending:
+                count = self.write_pending(pending.popleft(), write, checkpoint, count)
 
-            if products_batch:
-                self.save_batch(products_batch, raw_rows)
-                count += len(products_batch)
+        return count
 
-        self.stdout.write(self.style.SUCCESS(f"Gotowe! Łącznie przetworzono: {count:,}"))
+    def write_pending(self, item, write, checkpoint, count):
+        end, result = item
+        records = result.get()
+        if records:
+            self.written += write(records)
+        return self.commit_checkpoint(checkpoint, end, count + len(records))
+
+    def commit_checkpoint(self, checkpoint, offset, count):
+        checkpoint.save(offset, count)
+        self.stdout.write(f"Zaimportowano łącznie: {count:,} produktów...")
+        return count
+
+    def build_servings(self, products, records):
+        return [
+            ProductServingUnit(
+                product=prod,
+                unit_name="serving",
+                custom_label="Porcja producenta",
+                gram_weight=record["serving_g"],
+                is_global=True,
+            )
+            for prod, record in zip(products, records)
+            if record["serving_g"]
+        ]
+
+    def save_batch(self, records):
+        # Kody kreskowe są unikalne w katalogu: pomijamy te, które już w nim są lub powtarzają się w paczce
+        seen = set(
+            Product.objects.filter(
+                user__isnull=True,
+                barcode__in=[r["product"]["barcode"] for r in records if r["product"]["barcode"]],
+            ).values_list("barcode", flat=True)
+        )
+        new_records = []
+        for record in records:
+            barcode = record["product"]["barcode"]
+            if barcode:
+                if barcode in seen:
+                    continue
+                seen.add(barcode)
+            new_records.append(record)
+
+        if not new_records:
+            return 0
 
-    def save_batch(self, products, raw_rows):
         with transaction.atomic():
+            categories = self.categories.resolve(r["category"] for r in new_records)
+
+            products = [
+                Product(category_id=categories.get(r["category"]), **r["product"])
+                for r in new_records
+            ]
             created_prods = Product.objects.bulk_create(products)
 
-            infos = []
-            servings = []
-
-            for prod, raw in zip(created_prods, raw_rows):
-                diet = raw.get("diet_flags") or {}
-                additives = raw.get("additives") or {}
-
-                infos.append(
-                    ProductAdditionalInfo(
-                        product=prod,
-                        is_vegan=diet.get("is_vegan"),
-                        is_vegetarian=diet.get("is_vegetarian"),
-                        is_palm_oil_free=diet.get("is_palm_oil_free"),
-                        is_complete_profile=raw.get("is_complete_profile", True),
-                        ingredients_text=clean_text(raw.get("ingredients")),
-                        traces=clean_data(raw.get("traces") or []),
-                        labels=clean_data(raw.get("labels") or []),
-                        additives_tags=clean_data(additives.get("tags") or []),
-                    )
+            ProductAdditionalInfo.objects.bulk_create([
+                ProductAdditionalInfo(product=prod, **record["info"])
+                for prod, record in zip(created_prods, new_records)
+            ])
+            servings = self.build_servings(created_prods, new_records)
+            if servings:
+                ProductServingUnit.objects.bulk_create(servings)
+
+        return len(new_records)
+
+    def sync_batch(self, records):
+        # Ostatnie wystąpienie kodu w paczce wygrywa
+        by_barcode = {r["product"]["barcode"]: r for r in records if r["product"]["barcode"]}
+        # Produkty użytkowników mają własne kody i import ich nie dotyka
+        stored = {
+            barcode: (pk, content_hash)
+            for barcode, pk, content_hash in Product.objects.filter(
+                user__isnull=True, barcode__in=by_barcode
+            ).values_list("barcode", "pk", "content_hash")
+        }
+        changed = [
+            record for barcode, record in by_barcode.items()
+            if barcode not in stored or stored[barcode][1] != record["product"]["content_hash"]
+        ]
+        if not changed:
+            return 0
+
+        with transaction.atomic():
+            categories = self.categories.resolve(r["category"] for r in changed)
+
+            products = [
+                Product(
+                    pk=stored.get(r["product"]["barcode"], (None,))[0],
+                    category_id=categories.get(r["category"]),
+                    **r["product"],
                 )
+                for r in changed
+            ]
+            # Unikalność kodu jest częściowa (tylko katalog), więc ON CONFLICT (barcode) jej nie wskaże -
+            # istniejące wiersze aktualizujemy po kluczu, nowe dokładamy osobno
+            Product.objects.bulk_update([p for p in products if p.pk], SYNC_PRODUCT_FIELDS)
+            Product.objects.bulk_create([p for p in products if not p.pk])
 
-                serving_g = to_dec(raw.get("serving_g"))
-                if serving_g:
-                    servings.append(
-                        ProductServingUnit(
-                            product=prod,
-                            unit_name="serving",
-                            custom_label="Porcja producenta",
-                            gram_weight=serving_g,
-                            is_global=True,
-                        )
-                    )
-
-            ProductAdditionalInfo.objects.bulk_create(infos)
-            if servings:
-                ProductServingUnit.objects.bulk_create(servings)
\ No newline at end of file
+            ProductAdditionalInfo.objects.bulk_create(
+                [ProductAdditionalInfo(product=prod, **record["info"]) for prod, record in zip(products, changed)],
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=SYNC_INFO_FIELDS,
+            )
+
+            # Porcję producenta aktualizujemy w miejscu - usunięcie odpięłoby ją (SET_NULL) od pozycji posiłków.
+            # Gdy źródło przestało ją podawać, zostaje ostatnia znana wartość.
+            existing = {
+                unit.product_id: unit
+                for unit in ProductServingUnit.objects.filter(
+                    product__in=products, unit_name="serving", is_global=True
+                )
+            }
+            new_servings, updated_servings = [], []
+            for serving in self.build_servings(products, changed):
+                unit = existing.get(serving.product_id)
+                if unit is None:
+                    new_servings.append(serving)
+                elif unit.gram_weight != serving.gram_weight:
+                    unit.gram_weight = serving.gram_weight
+                    updated_servings.append(unit)
+
+            if new_servings:
+                ProductServingUnit.objects.bulk_create(new_servings)
+            if updated_servings:
+                ProductServingUnit.objects.bulk_update(updated_servings, ["gram_weight"])
+
+            # bulk_create nie wysyła post_save, więc sumy dań z tymi produktami przeliczamy tutaj
+            recalculate_dish_totals(
+                Dish.objects.filter(ingredients__product__in=products).values_list("pk", flat=True).distinct()
+            )
+
+        return len(changed)
+
+    def copy_batch(self, rendered):
+        with transaction.atomic(), connection.cursor() as cursor:
+            categories = self.categories.resolve(r[0] for r in rendered)
+
+            cursor.execute(
+                "SELECT nextval(pg_get_serial_sequence(%s, 'id')) FROM generate_series(1, %s)",
+                [Product._meta.db_table, len(rendered)],
+            )
+            ids = [row[0] for row in cursor.fetchall()]
+
+            products = io.StringIO()
+            for pk, (category, barcode, product_line, info_line, serving_line) in zip(ids, rendered):
+                category_id = categories[category] if category else "\\N"
+                products.write(f"{pk}\t{category_id}\t{product_line}\n")
+
+            # COPY idzie do tabeli tymczasowej, bo istniejące kody kreskowe trzeba pominąć
+            table = connection.ops.quote_name(Product._meta.db_table)
+            columns = self.quote_columns(["id", "category_id"], PRODUCT_COPY_FIELDS)
+            cursor.execute(f"CREATE TEMP TABLE import_product_stage (LIKE {table}) ON COMMIT DROP")
+            self.copy_into(cursor, "import_product_stage", ["id", "category_id"], PRODUCT_COPY_FIELDS, products)
+            cursor.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {columns} FROM import_product_stage "
+                "ON CONFLICT DO NOTHING RETURNING id"
+            )
+            inserted = {row[0] for row in cursor.fetchall()}
+
+            infos, servings = io.StringIO(), io.StringIO()
+            for pk, (category, barcode, product_line, info_line, serving_line) in zip(ids, rendered):
+                if pk not in inserted:
+                    continue
+                infos.write(f"{pk}\t{info_line}\n")
+                if serving_line is not None:
+                    servings.write(f"{pk}\t{serving_line}\n")
+
+            self.copy_into(cursor, ProductAdditionalInfo._meta.db_table, ["product_id"], INFO_COPY_FIELDS, infos)
+            self.copy_into(cursor, ProductServingUnit._meta.db_table, ["product_id"], SERVING_COPY_FIELDS, servings)
+
+        return len(inserted)
+
+    def quote_columns(self, leading_columns, fields):
+        return ", ".join(
+            connection.ops.quote_name(c) for c in [*leading_columns, *(f.column for f in fields)]
+        )
+
+    def copy_into(self, cursor, table, leading_columns, fields, buffer):
+        if not buffer.tell():
+            return
+
+        columns = self.quote_columns(leading_columns, fields)
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY {connection.ops.quote_name(table)} ({columns}) FROM STDIN",
+            buffer,
+        )
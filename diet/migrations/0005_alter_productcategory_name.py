@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 10:12
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_categories(apps, schema_editor):
+    # Inaczej przepięte FK zostawiają odroczone triggery i ALTER TABLE poniżej się wywali
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    ProductCategory = apps.get_model('diet', 'ProductCategory')
+    Product = apps.get_model('diet', 'Product')
+
+    duplicates = (
+        ProductCategory.objects.values('name')
+        .annotate(keep_id=Min('id'), cnt=Count('id'))
+        .filter(cnt__gt=1)
+    )
+    for dup in duplicates:
+        others = ProductCategory.objects.filter(name=dup['name']).exclude(id=dup['keep_id'])
+        Product.objects.filter(category__in=others).update(category_id=dup['keep_id'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0004_productadditionalinfo_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_categories, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='name',
+            field=models.CharField(max_length=255, unique=True),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:02
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_barcodes(apps, schema_editor):
+    # Inaczej przepięte FK zostawiają odroczone triggery i ALTER TABLE poniżej się wywali
+    schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+    Product = apps.get_model('diet', 'Product')
+    DishIngredient = apps.get_model('diet', 'DishIngredient')
+    MealItem = apps.get_model('diet', 'MealItem')
+    ProductServingUnit = apps.get_model('diet', 'ProductServingUnit')
+
+    Product.objects.filter(barcode='').update(barcode=None)
+
+    # Scalamy tylko produkty z katalogu - produkty użytkowników mogą mieć ten sam kod
+    catalog = Product.objects.filter(user__isnull=True)
+    duplicates = (
+        catalog.exclude(barcode=None)
+        .values('barcode')
+        .annotate(keep_id=Min('id'), cnt=Count('id'))
+        .filter(cnt__gt=1)
+    )
+    for dup in duplicates:
+        others = catalog.filter(barcode=dup['barcode']).exclude(id=dup['keep_id'])
+
+        DishIngredient.objects.filter(product__in=others).update(product_id=dup['keep_id'])
+        MealItem.objects.filter(original_product__in=others).update(original_product_id=dup['keep_id'])
+        ProductServingUnit.objects.filter(product__in=others, is_global=False).update(product_id=dup['keep_id'])
+        others.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0005_alter_productcategory_name'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_barcodes, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='product',
+            name='diet_produc_barcode_26a834_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='content_hash',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='product',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('barcode',), name='product_catalog_barcode_unique'),
+        ),
+    ]
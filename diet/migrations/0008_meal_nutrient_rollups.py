@@ -0,0 +1,120 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:25
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+NUTRIENTS = ('kcal', 'protein', 'fat', 'carbohydrates', 'salt')
+
+
+def backfill_rollups(apps, schema_editor):
+    MealItem = apps.get_model('diet', 'MealItem')
+    MealCategory = apps.get_model('diet', 'MealCategory')
+    FullMeal = apps.get_model('diet', 'FullMeal')
+    DailyMealCalendar = apps.get_model('diet', 'DailyMealCalendar')
+
+    def item_sum(nutrient, **filters):
+        total = (
+            MealItem.objects.filter(**filters)
+            .values(*filters)
+            .annotate(s=Sum(F(f'{nutrient}_1g') * F('calculated_gram_weight')))
+            .values('s')
+        )
+        return Coalesce(Subquery(total, output_field=DecimalField()), Value(0), output_field=DecimalField())
+
+    MealCategory.objects.update(**{
+        f'category_{n}': item_sum(n, meal_category=OuterRef('pk')) for n in NUTRIENTS
+    })
+    FullMeal.objects.update(**{
+        f'meal_{n}': item_sum(n, full_meal=OuterRef('pk')) for n in NUTRIENTS
+    })
+    DailyMealCalendar.objects.update(**{
+        f'total_day_{n}': item_sum(n, meal_category__calendar=OuterRef('pk')) for n in NUTRIENTS
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0007_product_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailymealcalendar',
+            name='total_day_carbohydrates',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailymealcalendar',
+            name='total_day_fat',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailymealcalendar',
+            name='total_day_kcal',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailymealcalendar',
+            name='total_day_protein',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dailymealcalendar',
+            name='total_day_salt',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='fullmeal',
+            name='meal_carbohydrates',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='fullmeal',
+            name='meal_fat',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='fullmeal',
+            name='meal_kcal',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='fullmeal',
+            name='meal_protein',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='fullmeal',
+            name='meal_salt',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='mealcategory',
+            name='category_carbohydrates',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='mealcategory',
+            name='category_fat',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='mealcategory',
+            name='category_kcal',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='mealcategory',
+            name='category_protein',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='mealcategory',
+            name='category_salt',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:54
+
+from django.db import migrations, models
+from django.db.models import DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+NUTRIENTS = ('kcal', 'protein', 'fat', 'carbohydrates', 'salt')
+
+
+def backfill_dish_totals(apps, schema_editor):
+    Dish = apps.get_model('diet', 'Dish')
+    DishIngredient = apps.get_model('diet', 'DishIngredient')
+
+    def ingredient_sum(expression):
+        total = (
+            DishIngredient.objects.filter(dish=OuterRef('pk'))
+            .values('dish')
+            .annotate(s=Sum(expression))
+            .values('s')
+        )
+        return Coalesce(Subquery(total, output_field=DecimalField()), Value(0), output_field=DecimalField())
+
+    Dish.objects.update(
+        dish_weight_g=ingredient_sum(F('weight_in_g')),
+        **{f'dish_{n}': ingredient_sum(F(f'product__{n}_1g') * F('weight_in_g')) for n in NUTRIENTS},
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0008_meal_nutrient_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dish',
+            name='dish_carbohydrates',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='dish_fat',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='dish_kcal',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='dish_protein',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='dish_salt',
+            field=models.DecimalField(decimal_places=5, default=0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='dish',
+            name='dish_weight_g',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.RunPython(backfill_dish_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 15:11
+
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('diet', '0010_product_user_partial_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='productcategory',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['name'], name='product_category_name_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -1,10 +1,13 @@
 from django.db import models
-from django.db.models import F, ExpressionWrapper, DecimalField, Case, When, Value
+from django.db.models import F, Q, ExpressionWrapper, DecimalField, Case, When, Value
 from django.db.models.functions import Coalesce
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from user.models import CentralUser
 from decimal import Decimal, ROUND_HALF_UP
 from django.core.exceptions import ValidationError
 from typing import List
+from .search import SEARCH_CONFIGS, DEFAULT_SEARCH_CONFIG, product_search_vector
 
 
 class ProductCountry(models.Model):
@@ -12,7 +15,12 @@ class ProductCountry(models.Model):
 
 
 class ProductCategory(models.Model):
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=["name"], opclasses=["gin_trgm_ops"], name="product_category_name_trgm"),
+        ]
 
 
 class DishCategory(models.Model):
@@ -53,33 +61,30 @@ class ProductQuerySet(models.QuerySet):
 
 class MealItemQuerySet(models.QuerySet):
     def with_nutrients(self):
-        multiplier = Coalesce(F('amount_g'), Value(0.0), output_field=DecimalField())
+        # MealItem trzyma wartości na 1g, więc mnożnikiem jest wyliczona waga w gramach
+        multiplier = Coalesce(F('calculated_gram_weight'), Value(0), output_field=DecimalField())
 
         return self.annotate(
             total_kcal=ExpressionWrapper(F('kcal_1g') * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)),
             total_protein=ExpressionWrapper(F('protein_1g') * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)),
             total_fat=ExpressionWrapper(F('fat_1g') * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)),
             total_carbohydrates=ExpressionWrapper(F('carbohydrates_1g') * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)),
-            display_salt=Case(
-                When(label_type='US', then=ExpressionWrapper(
-                    (F('salt_1g') / 2.5) * 1000 * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)
-                )),
-                default=ExpressionWrapper(F('salt_1g') * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)),
-                output_field=DecimalField(max_digits=12, decimal_places=2)
-            )
+            display_salt=ExpressionWrapper(F('salt_1g') * multiplier, output_field=DecimalField(max_digits=12, decimal_places=2)),
         )
 
 
 class Product(models.Model):
     title = models.CharField(max_length=255, db_index=True)
     brand = models.CharField(max_length=150,blank=True,null=True,db_index=True,help_text="np. Piątnica, Bovetti")
-    barcode = models.CharField(max_length=64, db_index=True, blank=True, null=True, help_text="EAN-13, EAN-8, UPC")
+    barcode = models.CharField(max_length=64, blank=True, null=True, db_index=True, help_text="EAN-13, EAN-8, UPC")
     quantity_display = models.CharField(max_length=100, blank=True, null=True, help_text="Oryginalny tekst z etykiety np. '350 g', '4 x 125g'",)
 
     image_url = models.URLField(max_length=500, blank=True, null=True, help_text="Link do miniatury z CDN",)
     
     category = models.ForeignKey('ProductCategory', related_name='products', on_delete=models.SET_NULL, null=True, blank=True)
-    user = models.ForeignKey('user.CentralUser', on_delete=models.CASCADE, null=True, blank=True)
+    # Indeks tylko na produktach użytkowników - przy pełnym indeksie warunek `user_id IS NULL OR user_id = X`
+    # dostaje ścieżkę bitmapową po całym katalogu i planner pomija indeksy wyszukiwania
+    user = models.ForeignKey('user.CentralUser', on_delete=models.CASCADE, null=True, blank=True, db_index=False)
 
     # Makro na 1g
     kcal_1g = models.DecimalField(max_digits=10, decimal_places=5)
@@ -102,12 +107,32 @@ class Product(models.Model):
     package_whole_g = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True, help_text="Waga całego opakowania w gramach/ml")
     package_name = models.CharField(max_length=100, null=True, blank=True, help_text="np. Puszka, Kubek, Paczka, Butelka")
 
+    # Hash znormalizowanego wiersza z importu - sync aktualizuje tylko produkty, które się zmieniły
+    content_hash = models.CharField(max_length=32, null=True, blank=True, editable=False)
+
+    search_vector = models.GeneratedField(
+        expression=product_search_vector(),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
     objects = MealItemQuerySet.as_manager()
 
     class Meta:
         indexes = [
-            models.Index(fields=["barcode"]),
             models.Index(fields=["title", "brand"]),
+            models.Index(fields=["user"], condition=Q(user__isnull=False), name="product_user_idx"),
+            GinIndex(fields=["search_vector"], name="product_search_vector_gin"),
+            GinIndex(fields=["title"], opclasses=["gin_trgm_ops"], name="product_title_trgm"),
+            *[
+                GinIndex(product_search_vector(config), name=f"product_search_{lang}")
+                for lang, config in SEARCH_CONFIGS.items()
+                if config != DEFAULT_SEARCH_CONFIG
+            ],
+        ]
+        constraints = [
+            # Kod kreskowy jest unikalny tylko w katalogu - produkt użytkownika może mieć kod produktu z katalogu
+            models.UniqueConstraint(fields=["barcode"], condition=Q(user__isnull=True), name="product_catalog_barcode_unique"),
         ]
 
     def __str__(self):
@@ -169,6 +194,14 @@ class Dish(models.Model):
     recipe = models.JSONField(default=dict, null=True, blank=True)
     img = models.ImageField(upload_to='dishes_images/', blank=True, null=True)
 
+    # Sumy całego dania utrzymywane przy zmianach DishIngredient (diet/signals.py)
+    dish_weight_g = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    dish_kcal = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    dish_protein = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    dish_fat = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    dish_carbohydrates = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    dish_salt = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+
 
 class DishIngredient(models.Model):
     dish = models.ForeignKey(Dish, on_delete=models.CASCADE, related_name='ingredients')
@@ -181,19 +214,33 @@ class DishIngredient(models.Model):
         super().clean()
         if self.name_packaging:
             if not Packaging.objects.filter(name=self.name_packaging).exists():
-                raise ValidationError({
-                    'error': f"Opakowanie '{self.name_packaging}' nie istnieje w bazie systemowej.", "code": 'packaging doesnt exist'
-                })
+                raise self.packaging_error(self.name_packaging)
+
+    @staticmethod
+    def packaging_error(name):
+        return ValidationError({
+            'error': f"Opakowanie '{name}' nie istnieje w bazie systemowej.", "code": 'packaging doesnt exist'
+        })
 
     def save(self, *args, **kwargs):
         self.full_clean()
         super().save(*args, **kwargs)
 
 
+NUTRIENTS = ('kcal', 'protein', 'fat', 'carbohydrates', 'salt')
+
+
 class DailyMealCalendar(models.Model):
     user = models.ForeignKey(CentralUser, on_delete=models.CASCADE)
     date = models.DateField()
 
+    # Sumy utrzymywane przyrostowo przy zmianach MealItem (diet/signals.py)
+    total_day_kcal = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    total_day_protein = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    total_day_fat = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    total_day_carbohydrates = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    total_day_salt = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+
     class Meta:
         unique_together = ('user', 'date')
 
@@ -203,6 +250,12 @@ class MealCategory(models.Model):
     name = models.CharField(max_length=100) # np. "Śniadanie", "Przekąska po treningu"
     order = models.PositiveIntegerField(default=1)
 
+    category_kcal = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    category_protein = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    category_fat = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    category_carbohydrates = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    category_salt = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+
     class Meta:
         ordering = ['order']
 
@@ -212,6 +265,12 @@ class FullMeal(models.Model):
     name = models.CharField(max_length=255)
     portion= models.FloatField()
 
+    meal_kcal = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    meal_protein = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    meal_fat = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    meal_carbohydrates = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+    meal_salt = models.DecimalField(max_digits=14, decimal_places=5, default=0)
+
 
 
 class MealItem(models.Model):
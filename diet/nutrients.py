@@ -0,0 +1,87 @@
+from array import array
+from decimal import Decimal
+
+from .models import Product, NUTRIENTS
+from .utils import TTLCache
+
+
+# Kolejność składowych wektora jest zawsze taka jak w NUTRIENTS
+PER_GRAM_FIELDS = tuple(f'{n}_1g' for n in NUTRIENTS)
+
+product_vector_cache = TTLCache(maxsize=50000, ttl=3600)
+
+
+def zero_vector():
+    return array('d', [0.0] * len(NUTRIENTS))
+
+
+def nutrient_vector(obj, fields=PER_GRAM_FIELDS):
+    """Wektor wartości na 1g z dowolnego obiektu z polami *_1g (Product, MealItem)."""
+    return array('d', (float(getattr(obj, field) or 0) for field in fields))
+
+
+def scale(vector, factor):
+    factor = float(factor or 0)
+    return array('d', (value * factor for value in vector))
+
+
+def add_into(total, vector, factor=1.0):
+    for i, value in enumerate(vector):
+        total[i] += value * factor
+    return total
+
+
+def to_decimals(vector, places=5):
+    return {n: Decimal(str(round(value, places))) for n, value in zip(NUTRIENTS, vector)}
+
+
+def get_product_vectors(product_ids):
+    """
+    Wektory na 1g dla podanych produktów. Braki w cache są doczytywane jednym
+    zapytaniem, więc koszt nie zależy od liczby produktów.
+    """
+    vectors = {}
+    missing = []
+    for product_id in set(product_ids):
+        vector = product_vector_cache.get(product_id)
+        if vector is None:
+            missing.append(product_id)
+        else:
+            vectors[product_id] = vector
+
+    if missing:
+        for row in Product.objects.filter(pk__in=missing).values_list('pk', *PER_GRAM_FIELDS):
+            vector = array('d', (float(value or 0) for value in row[1:]))
+            product_vector_cache.set(row[0], vector)
+            vectors[row[0]] = vector
+
+    return vectors
+
+
+def get_product_vector(product):
+    """Przyjmuje id albo instancję; z instancji wektor budujemy bez zapytania."""
+    if isinstance(product, Product):
+        vector = product_vector_cache.get(product.pk)
+        if vector is None:
+            vector = nutrient_vector(product)
+            product_vector_cache.set(product.pk, vector)
+        return vector
+
+    return get_product_vectors([product]).get(product)
+
+
+def combine(portions):
+    """Suma dla listy (product_id, gramy) - jedno mnożenie wektora na pozycję."""
+    portions = list(portions)
+    vectors = get_product_vectors(product_id for product_id, _ in portions)
+
+    total = zero_vector()
+    for product_id, grams in portions:
+        vector = vectors.get(product_id)
+        if vector is not None:
+            add_into(total, vector, float(grams or 0))
+    return total
+
+
+def invalidate_product_vectors(*product_ids):
+    product_vector_cache.delete(*product_ids)
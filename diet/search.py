@@ -0,0 +1,25 @@
+from django.contrib.postgres.search import SearchVector
+
+
+# Postgres nie ma wbudowanej konfiguracji dla polskiego - zostaje 'simple' bez stemmingu.
+# Klucze odpowiadają settings.LANGUAGES (te same języki co w translation.py).
+SEARCH_CONFIGS = {
+    'pl': 'simple',
+    'en': 'english',
+    'de': 'german',
+    'fr': 'french',
+    'es': 'spanish',
+}
+DEFAULT_SEARCH_CONFIG = 'simple'
+
+
+def product_search_vector(config=DEFAULT_SEARCH_CONFIG):
+    # To samo wyrażenie buduje kolumnę/indeksy i zapytanie - inaczej planner nie użyje indeksu
+    return (
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('brand', weight='B', config=config)
+    )
+
+
+def get_search_config(lang):
+    return SEARCH_CONFIGS.get((lang or '')[:2], DEFAULT_SEARCH_CONFIG)
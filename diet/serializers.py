@@ -4,7 +4,7 @@ from django.db import transaction
 from django.db.models import CharField
 from django.contrib.postgres.fields import ArrayField
 
-from .models import MealItem, MealCategory, FullMeal, DailyMealCalendar, ProductServingUnit
+from .models import MealItem, MealCategory, FullMeal, DailyMealCalendar, ProductServingUnit, Product, DishIngredient
 
 
 class ProductServingUnitSerializer(serializers.ModelSerializer):
@@ -16,6 +16,17 @@ class ProductServingUnitSerializer(serializers.ModelSerializer):
         fields = ['id', 'unit_code', 'label', 'gram_weight']
 
 
+class ProductListSerializer(serializers.ModelSerializer):
+    category_name = serializers.CharField(source='category.name', default=None, read_only=True)
+
+    class Meta:
+        model = Product
+        fields = [
+            'id', 'title', 'brand', 'barcode', 'quantity_display', 'image_url', 'category_name',
+            'nutriscore', 'kcal_1g', 'protein_1g', 'fat_1g', 'carbohydrates_1g', 'salt_1g'
+        ]
+
+
 class MealItemSerializer(serializers.ModelSerializer):
     total_kcal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     total_protein = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -34,7 +45,7 @@ class MealItemSerializer(serializers.ModelSerializer):
 
 
 class FullMealSerializer(serializers.ModelSerializer):
-    products = MealItemSerializer(many=True, read_only=True)
+    products = MealItemSerializer(source='items_list', many=True, read_only=True)
 
     meal_kcal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     meal_protein = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -53,7 +64,7 @@ class FullMealSerializer(serializers.ModelSerializer):
 
 class MealCategorySerializer(serializers.ModelSerializer):
     direct_items = MealItemSerializer(source='direct_items_list', many=True, read_only=True)
-    full_meals = FullMealSerializer(source='fullmeal', many=True, read_only=True)
+    full_meals = FullMealSerializer(source='full_meals_list', many=True, read_only=True)
 
     category_kcal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     category_protein = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -72,7 +83,7 @@ class MealCategorySerializer(serializers.ModelSerializer):
 
 
 class DailyMealCalendarSerializer(serializers.ModelSerializer):
-    meals = MealCategorySerializer(many=True, read_only=True)
+    meals = MealCategorySerializer(source='meals_list', many=True, read_only=True)
 
     total_day_kcal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
     total_day_protein = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
@@ -87,4 +98,75 @@ class DailyMealCalendarSerializer(serializers.ModelSerializer):
             'total_day_kcal', 'total_day_protein', 'total_day_fat', 
             'total_day_carbohydrates', 'total_day_salt', 
             'meals'
-        ]
\ No newline at end of file
+        ]
+
+
+class DailyMealCalendarTotalsSerializer(serializers.ModelSerializer):
+    total_day_kcal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    total_day_protein = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    total_day_fat = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    total_day_carbohydrates = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    total_day_salt = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = DailyMealCalendar
+        fields = [
+            'id', 'date',
+            'total_day_kcal', 'total_day_protein', 'total_day_fat',
+            'total_day_carbohydrates', 'total_day_salt'
+        ]
+
+
+class MealItemCreateSerializer(serializers.Serializer):
+    meal_category = serializers.PrimaryKeyRelatedField(queryset=MealCategory.objects.select_related('calendar'))
+    full_meal = serializers.PrimaryKeyRelatedField(queryset=FullMeal.objects.all(), required=False, allow_null=True)
+    product = serializers.PrimaryKeyRelatedField(queryset=Product.objects.all())
+    serving_unit = serializers.PrimaryKeyRelatedField(queryset=ProductServingUnit.objects.all(), required=False, allow_null=True)
+    amount = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0, default=1)
+    grams = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=0, required=False)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        category, product = attrs['meal_category'], attrs['product']
+
+        if category.calendar.user_id != user.id:
+            raise serializers.ValidationError({"error": "Meal category not found", "code": "meal_category_not_found"})
+        if product.user_id is not None and product.user_id != user.id:
+            raise serializers.ValidationError({"error": "Product not found", "code": "product_not_found"})
+
+        full_meal = attrs.get('full_meal')
+        if full_meal is not None and full_meal.meal_category_id != category.id:
+            raise serializers.ValidationError({"error": "Meal does not belong to this category", "code": "wrong_full_meal"})
+
+        serving = attrs.get('serving_unit')
+        if serving is not None:
+            if serving.product_id != product.id:
+                raise serializers.ValidationError({"error": "Serving unit does not belong to this product", "code": "wrong_serving_unit"})
+            attrs['grams'] = serving.gram_weight * attrs['amount']
+        elif 'grams' not in attrs:
+            raise serializers.ValidationError({"error": "Provide grams or serving_unit", "code": "missing_grams"})
+
+        return attrs
+
+
+class DishNutrientsSerializer(serializers.Serializer):
+    grams = serializers.FloatField(allow_null=True)
+    kcal = serializers.FloatField()
+    protein = serializers.FloatField()
+    fat = serializers.FloatField()
+    carbohydrates = serializers.FloatField()
+    salt = serializers.FloatField()
+
+
+class DishIngredientSerializer(serializers.ModelSerializer):
+    # Samo id - istnienie produktów sprawdza save_dish_ingredients jednym zapytaniem na partię
+    product_id = serializers.IntegerField()
+
+    class Meta:
+        model = DishIngredient
+        fields = ['id', 'product_id', 'name_packaging', 'ammount', 'weight_in_g']
+        read_only_fields = ['id']
+
+
+class DishIngredientsCreateSerializer(serializers.Serializer):
+    ingredients = DishIngredientSerializer(many=True, allow_empty=False, max_length=200)
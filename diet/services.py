@@ -1,7 +1,11 @@
 from decimal import Decimal, ROUND_HALF_UP
-from .models import Product, MealItem, DailyMealCalendar, MealCategory, FullMeal
+from .models import (
+    Product, MealItem, DailyMealCalendar, MealCategory, FullMeal, Dish, DishIngredient, Packaging, NUTRIENTS,
+)
+from .nutrients import combine, get_product_vector, nutrient_vector, scale, to_decimals, zero_vector
 
-from django.db.models import Prefetch, Sum, ExpressionWrapper, F, DecimalField, Value
+from django.core.exceptions import ValidationError
+from django.db.models import Q, Sum, F, DecimalField, Value, OuterRef, Subquery
 from django.db.models.functions import Coalesce
 
 
@@ -70,38 +74,141 @@ class ProductService:
         return instance
 
 
-def get_daily_meal_plan(user, target_date):
-    annotated_items = MealItem.objects.with_neutriens()
-
-    calendar_day = DailyMealCalendar.objects.filter(
-        user=user,
-        date=target_date
-    ).prefetch_related(
-        Prefetch(
-            'meal',
-            MealCategory.objects.prefetch_related(
-                Prefetch(('items', annotated_items)),
-                Prefetch('fullmeal', FullMeal.objects.prefetch_related(
-                    Prefetch('products', annotated_items)
-                ))
-            )
-        )
-    ).first()
-
-    if not calendar_day:
-        return None
-
-    day_totals = MealItem.objects.filter(
-        meal_category__calendar=calendar_day
-    ).aggregate(
-        total_kcal=Coalesce(Sum(ExpressionWrapper(F('kcal_1g') * F('amount_g'), output_field=DecimalField())), Value(0.0)),
-        total_protein=Coalesce(Sum(ExpressionWrapper(F('protein_1g') * F('amount_g'), output_field=DecimalField())), Value(0.0)),
-        total_fat=Coalesce(Sum(ExpressionWrapper(F('fat_1g') * F('amount_g'), output_field=DecimalField())), Value(0.0)),
-        total_carbohydrates=Coalesce(Sum(ExpressionWrapper(F('carbohydrates_1g') * F('amount_g'), output_field=DecimalField())), Value(0.0)),
-        total_salt=Coalesce(Sum(ExpressionWrapper(F('salt_1g') * F('amount_g'), output_field=DecimalField())), Value(0.0))
+ITEM_TOTAL_NAMES = ('total_kcal', 'total_protein', 'total_fat', 'total_carbohydrates', 'display_salt')
+
+
+def _set_totals(obj, names, vector):
+    for name, value in zip(names, vector):
+        setattr(obj, name, value)
+
+
+def build_meal_item(meal_category, product, grams, full_meal=None, serving_unit=None, amount=1):
+    """Niezapisany MealItem z wartościami na 1g skopiowanymi z wektora produktu."""
+    vector = get_product_vector(product)
+    item = MealItem(
+        meal_category=meal_category,
+        full_meal=full_meal,
+        name=product.title,
+        original_product=product,
+        product_serving_unit=serving_unit,
+        amount=amount,
+        calculated_gram_weight=grams,
+        **{f'{n}_1g': value for n, value in to_decimals(vector).items()},
+    )
+    _set_totals(item, ITEM_TOTAL_NAMES, scale(vector, grams))
+    return item
+
+
+def dish_nutrients(dish, grams=None):
+    """Wektor składników całego dania albo porcji o podanej wadze - jedno zapytanie po składniki, reszta z cache."""
+    portions = list(DishIngredient.objects.filter(dish=dish).values_list('product_id', 'weight_in_g'))
+    total = combine(portions)
+    if grams is None:
+        return total
+
+    dish_weight = sum(float(weight or 0) for _, weight in portions)
+    if not dish_weight:
+        return zero_vector()
+    return scale(total, float(grams) / dish_weight)
+
+
+def _ingredient_sum(expression, **filters):
+    total = (
+        DishIngredient.objects.filter(**filters)
+        .values(*filters)
+        .annotate(s=Sum(expression))
+        .values('s')
     )
+    return Coalesce(Subquery(total, output_field=DecimalField()), Value(0), output_field=DecimalField())
 
-    return {
-        "calendar": calendar_day,
-        "totals": day_totals
-    }
\ No newline at end of file
+
+def recalculate_dish_totals(dishes):
+    """Przelicza od zera sumy dań z aktualnych wartości produktów - po zmianie składników albo produktu."""
+    dish_ids = [getattr(dish, 'pk', dish) for dish in dishes]
+
+    Dish.objects.filter(pk__in=dish_ids).update(
+        dish_weight_g=_ingredient_sum(F('weight_in_g'), dish=OuterRef('pk')),
+        **{
+            f'dish_{n}': _ingredient_sum(F(f'product__{n}_1g') * F('weight_in_g'), dish=OuterRef('pk'))
+            for n in NUTRIENTS
+        },
+    )
+
+
+def save_dish_ingredients(dish, ingredients):
+    """
+    Zapis wielu składników naraz: opakowania i produkty sprawdzane jednym zapytaniem
+    na partię zamiast full_clean() per wiersz, sumy dania przeliczane raz na końcu.
+    """
+    ingredients = list(ingredients)
+    for ingredient in ingredients:
+        ingredient.dish = dish
+        ingredient.clean_fields(exclude=['dish', 'product'])
+
+    names = {ingredient.name_packaging for ingredient in ingredients if ingredient.name_packaging}
+    if names:
+        known = set(Packaging.objects.filter(name__in=names).values_list('name', flat=True))
+        missing = sorted(names - known)
+        if missing:
+            raise DishIngredient.packaging_error(missing[0])
+
+    # Cudze produkty prywatne traktujemy jak nieistniejące
+    product_ids = {ingredient.product_id for ingredient in ingredients}
+    visible = Product.objects.filter(Q(user__isnull=True) | Q(user=dish.user_id), pk__in=product_ids)
+    if visible.count() != len(product_ids):
+        raise ValidationError({'error': "Produkt nie istnieje.", "code": 'product doesnt exist'})
+
+    created = DishIngredient.objects.bulk_create(ingredients)
+    recalculate_dish_totals([dish])
+    return created
+
+
+def get_meal_plans(user, start, end):
+    """
+    Dni z zakresu z kategoriami, posiłkami i pozycjami. Wszystkie MealItem z zakresu
+    idą jednym zapytaniem. Sumy dni, kategorii i posiłków są trzymane w tabelach
+    (sygnały MealItem), liczymy tylko sumy pozycji na wektorach składników.
+    """
+    calendars = list(DailyMealCalendar.objects.filter(user=user, date__range=(start, end)).order_by('date'))
+    if not calendars:
+        return []
+
+    categories = list(MealCategory.objects.filter(calendar__in=calendars).order_by('order', 'id'))
+    full_meals = list(FullMeal.objects.filter(meal_category__calendar__in=calendars).order_by('id'))
+    items = list(
+        MealItem.objects.filter(meal_category__calendar__in=calendars)
+        .select_related('product_serving_unit')
+        .order_by('id')
+    )
+
+    calendar_by_id = {calendar.pk: calendar for calendar in calendars}
+    category_by_id = {category.pk: category for category in categories}
+    full_meal_by_id = {full_meal.pk: full_meal for full_meal in full_meals}
+
+    for calendar in calendars:
+        calendar.meals_list = []
+
+    for category in categories:
+        category.full_meals_list = []
+        category.direct_items_list = []
+        calendar_by_id[category.calendar_id].meals_list.append(category)
+
+    for full_meal in full_meals:
+        full_meal.items_list = []
+        category_by_id[full_meal.meal_category_id].full_meals_list.append(full_meal)
+
+    for item in items:
+        _set_totals(item, ITEM_TOTAL_NAMES, scale(nutrient_vector(item), item.calculated_gram_weight))
+
+        full_meal = full_meal_by_id.get(item.full_meal_id)
+        if full_meal is not None:
+            full_meal.items_list.append(item)
+        else:
+            category_by_id[item.meal_category_id].direct_items_list.append(item)
+
+    return calendars
+
+
+def get_daily_meal_plan(user, target_date):
+    plans = get_meal_plans(user, target_date, target_date)
+    return plans[0] if plans else None
@@ -0,0 +1,135 @@
+from decimal import Decimal
+
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Product, MealItem, MealCategory, FullMeal, DailyMealCalendar, Dish, DishIngredient, NUTRIENTS
+from .nutrients import invalidate_product_vectors
+from .services import recalculate_dish_totals
+from .utils import invalidate_product_barcode
+
+
+ROLLUP_FIELDS = ['meal_category_id', 'full_meal_id', 'calculated_gram_weight', *[f'{n}_1g' for n in NUTRIENTS]]
+
+
+def item_snapshot(values):
+    grams = Decimal(str(values['calculated_gram_weight'] or 0))
+    return {
+        'meal_category_id': values['meal_category_id'],
+        'full_meal_id': values['full_meal_id'],
+        'totals': {n: Decimal(str(values[f'{n}_1g'] or 0)) * grams for n in NUTRIENTS},
+    }
+
+
+def apply_rollup(snapshot, sign):
+    totals = {n: value * sign for n, value in snapshot['totals'].items() if value}
+    if not totals:
+        return
+
+    category_id = snapshot['meal_category_id']
+    MealCategory.objects.filter(pk=category_id).update(
+        **{f'category_{n}': F(f'category_{n}') + v for n, v in totals.items()}
+    )
+    DailyMealCalendar.objects.filter(meals__id=category_id).update(
+        **{f'total_day_{n}': F(f'total_day_{n}') + v for n, v in totals.items()}
+    )
+    if snapshot['full_meal_id']:
+        FullMeal.objects.filter(pk=snapshot['full_meal_id']).update(
+            **{f'meal_{n}': F(f'meal_{n}') + v for n, v in totals.items()}
+        )
+
+
+@receiver(pre_save, sender=MealItem)
+def remember_previous_rollup(sender, instance, raw=False, **kwargs):
+    instance._previous_rollup = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+
+    previous = MealItem.objects.filter(pk=instance.pk).values(*ROLLUP_FIELDS).first()
+    if previous:
+        instance._previous_rollup = item_snapshot(previous)
+
+
+@receiver(post_save, sender=MealItem)
+def update_rollup_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    current = item_snapshot({field: getattr(instance, field) for field in ROLLUP_FIELDS})
+    previous = getattr(instance, '_previous_rollup', None)
+    if previous == current:
+        return
+
+    if previous:
+        apply_rollup(previous, -1)
+    apply_rollup(current, 1)
+
+
+@receiver(post_delete, sender=MealItem)
+def update_rollup_on_delete(sender, instance, **kwargs):
+    apply_rollup(item_snapshot({field: getattr(instance, field) for field in ROLLUP_FIELDS}), -1)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def drop_product_vector(sender, instance, **kwargs):
+    invalidate_product_vectors(instance.pk)
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_barcode(sender, instance, raw=False, **kwargs):
+    instance._previous_barcode = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+
+    instance._previous_barcode = Product.objects.filter(pk=instance.pk).values_list('barcode', flat=True).first()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def drop_product_barcode(sender, instance, **kwargs):
+    # Po zmianie kodu pod starym kluczem zostałby produkt, który już go nie ma
+    invalidate_product_barcode(instance.barcode, getattr(instance, '_previous_barcode', None))
+
+
+@receiver(post_save, sender=Product)
+def refresh_dishes_with_product(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created:
+        return
+    recalculate_dish_totals(Dish.objects.filter(ingredients__product=instance).values_list('pk', flat=True))
+
+
+def ingredient_snapshot(dish_id, product_id, weight):
+    return (dish_id, product_id, Decimal(str(weight or 0)))
+
+
+@receiver(pre_save, sender=DishIngredient)
+def remember_previous_ingredient(sender, instance, raw=False, **kwargs):
+    instance._previous_ingredient = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+
+    previous = DishIngredient.objects.filter(pk=instance.pk).values_list('dish_id', 'product_id', 'weight_in_g').first()
+    if previous:
+        instance._previous_ingredient = ingredient_snapshot(*previous)
+
+
+@receiver(post_save, sender=DishIngredient)
+def update_dish_on_ingredient_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    current = ingredient_snapshot(instance.dish_id, instance.product_id, instance.weight_in_g)
+    previous = getattr(instance, '_previous_ingredient', None)
+    if previous == current:
+        return
+
+    # Sumy liczone w bazie z aktualnych wartości produktu - cache wektorów jest lokalny dla procesu,
+    # więc przyrost z niego mógłby na stałe zapisać wartości sprzed zmiany produktu w innym procesie
+    recalculate_dish_totals({instance.dish_id, previous[0] if previous else instance.dish_id})
+
+
+@receiver(post_delete, sender=DishIngredient)
+def update_dish_on_ingredient_delete(sender, instance, **kwargs):
+    recalculate_dish_totals([instance.dish_id])
@@ -1,8 +1,15 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import (DailyMealCalendarDetailView)
+from .views import (DailyMealCalendarDetailView, DailyMealCalendarRangeView, ProductListView, ProductBarcodeView,
+                    MealItemCreateView, DishNutrientsView, DishIngredientsCreateView)
 
 
 urlpatterns = [
-    path('daily-meals/', DailyMealCalendarDetailView.as_view(), name='daily-meals')
+    path('daily-meals/', DailyMealCalendarDetailView.as_view(), name='daily-meals'),
+    path('daily-meals/range/', DailyMealCalendarRangeView.as_view(), name='daily-meals-range'),
+    path('products/', ProductListView.as_view(), name='product-list'),
+    path('products/barcode/<str:code>/', ProductBarcodeView.as_view(), name='product-barcode'),
+    path('meal-items/', MealItemCreateView.as_view(), name='meal-item-create'),
+    path('dishes/<int:pk>/nutrients/', DishNutrientsView.as_view(), name='dish-nutrients'),
+    path('dishes/<int:pk>/ingredients/', DishIngredientsCreateView.as_view(), name='dish-ingredients-create'),
 ]
\ No newline at end of file
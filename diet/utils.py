@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+GTIN_LENGTHS = (8, 12, 13, 14)
+
+
+def gtin_check_digit(body: str) -> int:
+    total = sum(int(d) * (3 if i % 2 == 0 else 1) for i, d in enumerate(reversed(body)))
+    return (10 - total % 10) % 10
+
+
+def normalize_barcode(raw: str) -> str:
+    """
+    Zwraca kod bez zer wiodących (EAN-8, UPC-A, EAN-13 i GTIN-14 różnią się tylko
+    dopełnieniem zerami). Rzuca ValueError przy złej długości lub cyfrze kontrolnej.
+    """
+    code = "".join(ch for ch in (raw or "") if ch not in " -")
+
+    if not code.isdigit() or len(code) not in GTIN_LENGTHS:
+        raise ValueError("Barcode must have 8, 12, 13 or 14 digits")
+
+    if gtin_check_digit(code[:-1]) != int(code[-1]):
+        raise ValueError("Invalid barcode check digit")
+
+    return code.lstrip("0") or "0"
+
+
+def barcode_variants(code: str) -> list:
+    """Wszystkie formy, w jakich ten sam kod mógł trafić do bazy (z importu lub od usera)."""
+    return [code.zfill(length) for length in GTIN_LENGTHS if len(code) <= length]
+
+
+class TTLCache:
+    """Prosty LRU z TTL w pamięci procesu. Każdy worker ma swoją kopię, TTL ogranicza nieaktualność."""
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+product_barcode_cache = TTLCache(maxsize=10000, ttl=300)
+
+
+def invalidate_product_barcode(*barcodes):
+    keys = []
+    for barcode in barcodes:
+        try:
+            keys.append(normalize_barcode(barcode))
+        except ValueError:
+            continue
+    product_barcode_cache.delete(*keys)
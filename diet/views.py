@@ -1,59 +1,74 @@
-from django.shortcuts import render
-from django.db.models import Prefetch, F, ExpressionWrapper, DecimalField, Sum, CharField, Q, Value
-from django.contrib.postgres.fields import ArrayField
-from django.db.models.functions import Coalesce
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.shortcuts import get_object_or_404
+from django.db.models import Q
+from django.http import Http404
+from django.core.exceptions import ValidationError
 
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.generics import GenericAPIView
+from rest_framework.generics import GenericAPIView, ListAPIView
+from rest_framework.pagination import PageNumberPagination
 from rest_framework import status
 
-from .serializers import DailyMealCalendarSerializer
-from .models import DailyMealCalendar, MealCategory, FullMeal, MealItem
+from .serializers import (DailyMealCalendarSerializer, DailyMealCalendarTotalsSerializer, ProductListSerializer,
+                          MealItemSerializer, MealItemCreateSerializer, DishNutrientsSerializer,
+                          DishIngredientSerializer, DishIngredientsCreateSerializer)
+from .models import DailyMealCalendar, Product, Dish, DishIngredient, NUTRIENTS
+from .filters import ProductSearchFilter
+from .services import get_daily_meal_plan, get_meal_plans, build_meal_item, dish_nutrients, save_dish_ingredients
+from .utils import normalize_barcode, barcode_variants, product_barcode_cache
 
 from datetime import datetime
 
-class DailyMealCalendarDetailView(GenericAPIView):
+
+class ProductPagination(PageNumberPagination):
+    page_size = 20
+    max_page_size = 60
+
+
+class ProductListView(ListAPIView):
     permission_classes = [IsAuthenticated]
-    serializer_class = DailyMealCalendarSerializer
+    serializer_class = ProductListSerializer
+    pagination_class = ProductPagination
+    filter_backends = [ProductSearchFilter]
 
     def get_queryset(self):
-        meal_items_qs = MealItem.objects.with_nutrients().select_related('product_serving_unit')
-
-        full_meals_qs = FullMeal.objects.annotate(
-            meal_kcal=Coalesce(Sum('products__kcal_1g' * F('products__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            meal_protein=Coalesce(Sum('products__protein_1g' * F('products__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            meal_fat=Coalesce(Sum('products__fat_1g' * F('products__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            meal_carbohydrates=Coalesce(Sum('products__carbohydrates_1g' * F('products__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            meal_salt=Coalesce(Sum('products__salt_1g' * F('products__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-        ).prefetch_related(
-            Prefetch('products', queryset=meal_items_qs)
-        )
+        return Product.objects.filter(
+            Q(user__isnull=True) | Q(user=self.request.user)
+        ).select_related('category').order_by('id')
 
-        categories_qs = MealCategory.objects.annotate(
-            category_kcal=Coalesce(Sum('items__kcal_1g' * F('items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            category_protein=Coalesce(Sum('items__protein_1g' * F('items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            category_fat=Coalesce(Sum('items__fat_1g' * F('items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            category_carbohydrates=Coalesce(Sum('items__carbohydrates_1g' * F('items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            category_salt=Coalesce(Sum('items__salt_1g' * F('items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-        ).prefetch_related(
-            Prefetch('items', queryset=meal_items_qs.filter(full_meal__isnull=True), to_attr='direct_items_list'),
-            Prefetch('fullmeal', queryset=full_meals_qs)
-        )
 
-        return DailyMealCalendar.objects.filter(
-            user=self.request.user
-        ).annotate(
-            total_day_kcal=Coalesce(Sum('meals__items__kcal_1g' * F('meals__items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            total_day_protein=Coalesce(Sum('meals__items__protein_1g' * F('meals__items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            total_day_fat=Coalesce(Sum('meals__items__fat_1g' * F('meals__items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            total_day_carbohydrates=Coalesce(Sum('meals__items__carbohydrates_1g' * F('meals__items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-            total_day_salt=Coalesce(Sum('meals__items__salt_1g' * F('meals__items__calculated_gram_weight')), Value(0.0), output_field=DecimalField()),
-        ).prefetch_related(
-            Prefetch('meals', queryset=categories_qs)
-        )
+class ProductBarcodeView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = ProductListSerializer
+
+    def get(self, request, code):
+        try:
+            key = normalize_barcode(code)
+        except ValueError as e:
+            return Response({"error": str(e), "code": "invalid_barcode"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Pod jednym kodem może być produkt z katalogu i produkty użytkowników - trzymamy je razem, po właścicielu
+        cached = product_barcode_cache.get(key)
+        if cached is None:
+            cached = {}
+            for product in Product.objects.select_related('category').filter(barcode__in=barcode_variants(key)).order_by('id'):
+                cached.setdefault(product.user_id, self.get_serializer(product).data)
+            if cached:
+                product_barcode_cache.set(key, cached)
+
+        # Własny produkt użytkownika ma pierwszeństwo przed katalogowym
+        data = cached.get(request.user.id) or cached.get(None)
+        if data is None:
+            return Response({"error": "Product not found", "code": "product_not_found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class DailyMealCalendarDetailView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    serializer_class = DailyMealCalendarSerializer
+
+    def get_queryset(self):
+        return DailyMealCalendar.objects.filter(user=self.request.user)
 
     def get(self, request, date_str=None):
         target_date_str = date_str or request.query_params.get('date')
@@ -66,6 +81,115 @@ class DailyMealCalendarDetailView(GenericAPIView):
         except ValueError:
             return Response({"detail": "Niepoprawny format daty."}, status=status.HTTP_400_BAD_REQUEST)
 
-        calendar_day = get_object_or_404(self.get_queryset(), date=target_date)
+        # Sumy dnia, kategorii i posiłków są zapisane w bazie, w Pythonie liczymy tylko pozycje (diet/services.py)
+        calendar_day = get_daily_meal_plan(request.user, target_date)
+        if calendar_day is None:
+            raise Http404
         serializer = self.get_serializer(calendar_day)
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class DailyMealCalendarRangeView(DailyMealCalendarDetailView):
+    """
+    Wiele dni w jednej odpowiedzi (widok tygodnia/miesiąca). Plan jest budowany dla całego
+    zakresu naraz, więc liczba zapytań nie zależy od liczby dni. Przy totals_only
+    czytamy tylko zapisane sumy dnia.
+    """
+    MAX_RANGE_DAYS = 62
+    totals_only = False
+
+    def get_serializer_class(self):
+        if self.totals_only:
+            return DailyMealCalendarTotalsSerializer
+        return super().get_serializer_class()
+
+    def get(self, request):
+        start_str = request.query_params.get('start')
+        end_str = request.query_params.get('end')
+        self.totals_only = request.query_params.get('totals_only', '').lower() in ('1', 'true')
+
+        if not start_str or not end_str:
+            return Response({"detail": "Brak wymaganych parametrów start i end (YYYY-MM-DD)."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            start = datetime.strptime(start_str, "%Y-%m-%d").date()
+            end = datetime.strptime(end_str, "%Y-%m-%d").date()
+        except ValueError:
+            return Response({"detail": "Niepoprawny format daty."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if end < start or (end - start).days >= self.MAX_RANGE_DAYS:
+            return Response({"detail": f"Zakres dat musi mieć od 1 do {self.MAX_RANGE_DAYS} dni."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if self.totals_only:
+            days = self.get_queryset().filter(date__range=(start, end)).order_by('date')
+        else:
+            days = get_meal_plans(request.user, start, end)
+        serializer = self.get_serializer(days, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class MealItemCreateView(GenericAPIView):
+    """Pozycja posiłku z produktu - wartości na 1g i sumy z wektora produktu (cache w diet/nutrients.py)."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = MealItemCreateSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+
+        item = build_meal_item(
+            data['meal_category'], data['product'], data['grams'],
+            full_meal=data.get('full_meal'), serving_unit=data.get('serving_unit'), amount=data['amount'],
+        )
+        item.save()
+        return Response(MealItemSerializer(item).data, status=status.HTTP_201_CREATED)
+
+
+class DishNutrientsView(GenericAPIView):
+    """Składniki całego dania albo porcji (?grams=) liczone z wektorów produktów."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = DishNutrientsSerializer
+
+    def get_queryset(self):
+        return Dish.objects.filter(Q(user__isnull=True) | Q(user=self.request.user))
+
+    def get(self, request, pk):
+        dish = self.get_object()
+
+        grams = request.query_params.get('grams')
+        if grams is not None:
+            try:
+                grams = float(grams)
+            except ValueError:
+                return Response({"error": "grams must be a number", "code": "invalid_grams"}, status=status.HTTP_400_BAD_REQUEST)
+            if grams <= 0:
+                return Response({"error": "grams must be positive", "code": "invalid_grams"}, status=status.HTTP_400_BAD_REQUEST)
+
+        vector = dish_nutrients(dish, grams)
+        data = {'grams': grams, **{n: round(value, 2) for n, value in zip(NUTRIENTS, vector)}}
+        return Response(self.get_serializer(data).data, status=status.HTTP_200_OK)
+
+
+class DishIngredientsCreateView(GenericAPIView):
+    """Dodanie wielu składników do własnego dania naraz (jedna walidacja opakowań, jeden insert)."""
+    permission_classes = [IsAuthenticated]
+    serializer_class = DishIngredientsCreateSerializer
+
+    def get_queryset(self):
+        return Dish.objects.filter(user=self.request.user)
+
+    def post(self, request, pk):
+        dish = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            created = save_dish_ingredients(
+                dish, [DishIngredient(**ingredient) for ingredient in serializer.validated_data['ingredients']]
+            )
+        except ValidationError as e:
+            return Response(
+                {key: value[0] for key, value in e.message_dict.items()}, status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(DishIngredientSerializer(created, many=True).data, status=status.HTTP_201_CREATED)
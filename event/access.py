@@ -0,0 +1,57 @@
+from django.core.cache import cache
+
+from .caching import detail_version, detail_version_key
+from .models import Event
+from .services import event_role
+
+
+# Krótko - wpis i tak traci ważność przy każdej zmianie uczestników i eventu (wersja szczegółów)
+EVENT_ROLE_TIMEOUT = 30
+MISSING_EVENT = '-'
+
+
+def event_role_key(event_id, user_id):
+    return f'event-role:{event_id}:{user_id}'
+
+
+def _cached_role(event_id, user_id):
+    """
+    Wpis to (wersja szczegółów, rola). Wersję zmienia bump_event_detail przy każdej zmianie
+    roli, uczestników i autora, więc nieaktualna rola nie przeżyje zmiany uprawnień.
+    """
+    version_key, role_key = detail_version_key(event_id), event_role_key(event_id, user_id)
+    cached = cache.get_many([version_key, role_key])
+
+    version = cached.get(version_key) or detail_version(event_id)
+    entry = cached.get(role_key)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+
+    try:
+        role = event_role(event_id, user_id)
+    except Event.DoesNotExist:
+        role = MISSING_EVENT
+    cache.set(role_key, (version, role), EVENT_ROLE_TIMEOUT)
+    return role
+
+
+def resolve_event_role(request, event_id):
+    """
+    Rola usera z requestu w evencie: 'author', 'admin', 'trainer', 'participant' albo None.
+    Zapamiętana na czas requestu i krótko w cache per (user, event). Event.DoesNotExist, gdy eventu nie ma.
+    """
+    user = request.user
+    event_id = int(event_id)
+
+    memo = getattr(request, '_event_roles', None)
+    if memo is None:
+        memo = request._event_roles = {}
+
+    if event_id not in memo:
+        # Anonim nie ma żadnej roli - nie pytamy bazy
+        memo[event_id] = _cached_role(event_id, user.pk) if user.is_authenticated else None
+
+    role = memo[event_id]
+    if role == MISSING_EVENT:
+        raise Event.DoesNotExist
+    return role
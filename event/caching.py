@@ -0,0 +1,38 @@
+import uuid
+
+from django.core.cache import cache
+
+
+EVENT_DETAIL_TIMEOUT = 600
+
+
+def detail_version_key(event_id):
+    return f'event-detail-version:{event_id}'
+
+
+def detail_version(event_id):
+    """
+    Losowa wersja zamiast licznika - po wypadnięciu klucza z cache nowa wersja
+    nie trafi przypadkiem na stary fragment.
+    """
+    key = detail_version_key(event_id)
+    version = cache.get(key)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(key, version, None):
+            version = cache.get(key) or version
+    return version
+
+
+def bump_event_detail(event_id):
+    cache.set(detail_version_key(event_id), uuid.uuid4().hex, None)
+
+
+def get_event_detail(event_id, build):
+    """Część szczegółów eventu wspólna dla wszystkich userów; `build` liczy ją przy braku w cache."""
+    key = f'event-detail:{event_id}:{detail_version(event_id)}'
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, EVENT_DETAIL_TIMEOUT)
+    return data
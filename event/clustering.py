@@ -0,0 +1,85 @@
+from django.core.cache import cache
+from django.db.models import Avg, Count, F, Min, Value
+from django.db.models.functions import Floor
+from django.utils import timezone
+
+from .geo import in_bbox, tile_bounds, tile_for, tiles_in_bbox
+from .models import Event
+
+
+CLUSTER_MAX_ZOOM = 14
+CLUSTER_GRID = 8
+CLUSTER_MAX_TILES = 64
+CLUSTER_CACHE_TIMEOUT = 300
+
+
+def cluster_cache_key(zoom, x, y):
+    return f'event-map-clusters:{zoom}:{x}:{y}'
+
+
+def map_events():
+    return Event.objects.filter(public_event=True, date_time_event__gte=timezone.now())
+
+
+def compute_tile_clusters(zoom, x, y):
+    """
+    Kafelek dzielimy na siatkę CLUSTER_GRID x CLUSTER_GRID i grupujemy w SQL.
+    Kafelki są lewostronnie domknięte jak w tile_for, więc event na krawędzi
+    trafia tylko do jednego z nich.
+    """
+    n = 2 ** zoom
+    west, south, east, north = tile_bounds(zoom, x, y)
+    cell_w = (east - west) / CLUSTER_GRID
+    cell_h = (north - south) / CLUSTER_GRID
+
+    qs = map_events().filter(in_bbox(west, south, east, north))
+    if x < n - 1:
+        qs = qs.filter(longitude__lt=east)
+    if y < n - 1:
+        qs = qs.filter(latitude__gt=south)
+
+    cells = qs.annotate(
+        cell_x=Floor((F('longitude') - Value(west)) / Value(cell_w)),
+        cell_y=Floor((F('latitude') - Value(south)) / Value(cell_h)),
+    ).values('cell_x', 'cell_y').annotate(
+        count=Count('id'), lat=Avg('latitude'), lng=Avg('longitude'), first_id=Min('id'),
+    ).order_by('cell_y', 'cell_x')
+
+    return [
+        {
+            'id': cell['first_id'] if cell['count'] == 1 else None,
+            'count': cell['count'],
+            'latitude': cell['lat'],
+            'longitude': cell['lng'],
+        }
+        for cell in cells
+    ]
+
+
+def clusters_for_bbox(bbox, zoom):
+    tiles = tiles_in_bbox(*bbox, zoom)
+    if len(tiles) > CLUSTER_MAX_TILES:
+        raise ValueError("Viewport covers too many tiles for this zoom")
+
+    keys = {cluster_cache_key(zoom, x, y): (x, y) for x, y in tiles}
+    cached = cache.get_many(keys)
+
+    fresh = {}
+    for key, (x, y) in keys.items():
+        if key not in cached:
+            fresh[key] = compute_tile_clusters(zoom, x, y)
+    if fresh:
+        cache.set_many(fresh, CLUSTER_CACHE_TIMEOUT)
+
+    cached.update(fresh)
+    return [cluster for key in keys for cluster in cached[key]]
+
+
+def invalidate_clusters(*points):
+    """Kasuje kafelki zawierające podane (lat, lng) na wszystkich poziomach klastrowania."""
+    keys = {
+        cluster_cache_key(zoom, *tile_for(lat, lng, zoom))
+        for lat, lng in points if lat is not None and lng is not None
+        for zoom in range(CLUSTER_MAX_ZOOM + 1)
+    }
+    cache.delete_many(keys)
@@ -0,0 +1,105 @@
+import math
+
+from django.db import models
+from django.db.models import F, Func, Q, Value
+
+
+EARTH_RADIUS_KM = 6371.0
+KM_PER_DEGREE_LAT = 111.32
+
+
+class Point(Func):
+    """Wbudowany typ point Postgresa - (x, y) czyli (longitude, latitude)."""
+    function = 'point'
+    output_field = models.Field()
+
+
+class Box(Func):
+    function = 'box'
+    output_field = models.Field()
+
+
+class ContainedIn(Func):
+    """`a <@ b` - operator obsługiwany przez indeks GiST na point."""
+    arg_joiner = ' <@ '
+    template = '(%(expressions)s)'
+    output_field = models.BooleanField()
+
+
+def event_point():
+    # To samo wyrażenie jest w indeksie event_public_location_gist, inaczej planner go nie użyje
+    return Point(F('longitude'), F('latitude'))
+
+
+def in_bbox(west, south, east, north):
+    """
+    Warunek na prostokąt widoku mapy. Jeśli widok przechodzi przez południk 180
+    (west > east), dzielimy go na dwa prostokąty.
+    """
+    if west > east:
+        return in_bbox(west, south, 180.0, north) | in_bbox(-180.0, south, east, north)
+
+    box = Box(Point(Value(float(west)), Value(float(south))), Point(Value(float(east)), Value(float(north))))
+    return Q(ContainedIn(event_point(), box))
+
+
+def radius_bbox(lat, lng, radius_km):
+    """Prostokąt opisany na okręgu - zawęża wyniki indeksem, dokładny dystans liczymy potem."""
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(lat))
+    dlng = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+
+    south, north = max(lat - dlat, -90.0), min(lat + dlat, 90.0)
+    if dlng >= 180.0:
+        return -180.0, south, 180.0, north
+
+    west = lng - dlng if lng - dlng >= -180.0 else lng - dlng + 360.0
+    east = lng + dlng if lng + dlng <= 180.0 else lng + dlng - 360.0
+    return west, south, east, north
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+# Kafelki Web Mercator (z, x, y) - te same co w kliencie mapy
+MAX_MERCATOR_LAT = 85.0511287798
+
+
+def tile_for(lat, lng, zoom):
+    n = 2 ** zoom
+    lat = max(-MAX_MERCATOR_LAT, min(MAX_MERCATOR_LAT, lat))
+    x = int((lng + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(zoom, x, y):
+    """(west, south, east, north); skrajne rzędy sięgają biegunów, żeby nic nie wypadło."""
+    n = 2 ** zoom
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    west = x / n * 360.0 - 180.0
+    east = (x + 1) / n * 360.0 - 180.0
+    north = 90.0 if y == 0 else lat(y)
+    south = -90.0 if y == n - 1 else lat(y + 1)
+    return west, south, east, north
+
+
+def tiles_in_bbox(west, south, east, north, zoom):
+    n = 2 ** zoom
+    x_start, y_start = tile_for(north, west, zoom)
+    x_end, y_end = tile_for(south, east, zoom)
+
+    if west > east:
+        columns = list(range(x_start, n)) + list(range(0, x_end + 1))
+    else:
+        columns = list(range(x_start, x_end + 1))
+
+    return [(x, y) for x in columns for y in range(y_start, y_end + 1)]
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from event.models import Event, EventAdditionalInfo
+from event.services import join_event
+from user.models import CentralUser
+
+
+class Command(BaseCommand):
+    help = "Benchmark: N równoległych zapisów na jedno wydarzenie z limitem miejsc (dane tymczasowe są usuwane)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=200, help="Liczba równoległych zapisów")
+        parser.add_argument("--seats", type=int, default=50, help="Limit miejsc wydarzenia")
+        parser.add_argument("--retries", type=int, default=1, help="Ile razy każdy user ponawia zapis")
+
+    def handle(self, *args, **opts):
+        users_count, seats, retries = opts["users"], opts["seats"], opts["retries"]
+        stamp = int(time.time() * 1000)
+
+        author = CentralUser.objects.create(email=f"bench-author-{stamp}@bench.local")
+        users = CentralUser.objects.bulk_create(
+            [CentralUser(email=f"bench-{stamp}-{i}@bench.local") for i in range(users_count)]
+        )
+        event = Event.objects.create(
+            author=author, title="bench", short_desc="bench", duration_min=60,
+            date_time_event=timezone.now() + timedelta(days=1), latitude=0, longitude=0,
+        )
+        EventAdditionalInfo.objects.create(event=event, places_for_people_limit=seats)
+
+        results = Counter()
+        lock = threading.Lock()
+        barrier = threading.Barrier(users_count)
+        timings = []
+
+        def worker(user):
+            try:
+                barrier.wait()
+                for _ in range(retries):
+                    start = time.perf_counter()
+                    result = join_event(event.pk, user.pk)
+                    elapsed = time.perf_counter() - start
+                    with lock:
+                        results[result] += 1
+                        timings.append(elapsed)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = time.perf_counter() - started
+
+        event.refresh_from_db()
+        participants = event.eventparticipant.count()
+        timings.sort()
+
+        try:
+            self.stdout.write(
+                f"Zapisy: {len(timings)} w {total:.3f}s ({len(timings) / total:.0f}/s), "
+                f"p50 {timings[len(timings) // 2] * 1000:.1f}ms, p99 {timings[int(len(timings) * 0.99) - 1] * 1000:.1f}ms"
+            )
+            self.stdout.write(f"Wyniki: {dict(results)}")
+            self.stdout.write(f"Licznik: {event.participant_count}, uczestnicy: {participants}, limit: {seats}")
+
+            if event.participant_count != participants or participants > seats:
+                self.stderr.write(self.style.ERROR("Niespójny licznik albo przekroczony limit!"))
+            else:
+                self.stdout.write(self.style.SUCCESS("OK"))
+        finally:
+            event.delete()
+            CentralUser.objects.filter(pk__in=[author.pk, *[u.pk for u in users]]).delete()
@@ -0,0 +1,120 @@
+import re
+import statistics
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from event.models import Event, EventParticipant
+from user.models import CentralUser
+
+
+# Id rezerwujemy z sekwencji - wycofane wcześniej transakcje zostawiają dziury, więc max(id) + 1 nie wystarcza
+IDS_SQL = """
+CREATE TEMP TABLE {ids} ON COMMIT DROP AS
+SELECT g AS n, nextval(pg_get_serial_sequence('{table}', 'id')) AS id
+FROM generate_series(0, %(count)s - 1) g
+"""
+
+USERS_SQL = """
+INSERT INTO {user} (id, password, email, date_joined, is_active, is_staff, is_superuser, is_user_activated)
+SELECT id, '!', 'bench-visibility-' || n || '@bench.local', now(), true, false, false, true
+FROM bench_user_ids
+"""
+
+EVENTS_SQL = """
+INSERT INTO {event} (id, unique_id, author_id, title, short_desc, date_time_event, duration_min,
+                     latitude, longitude, public_event, participant_count)
+SELECT e.id, md5(random()::text || e.n)::uuid, u.id, 'bench', 'bench',
+       now() - interval '30 days' + (e.n %% 2160) * interval '1 hour', 60,
+       (e.n %% 180) - 90, (e.n %% 360) - 180, e.n %% 4 <> 0, %(per_event)s
+FROM bench_event_ids e
+JOIN bench_user_ids u ON u.n = e.n %% %(users)s
+"""
+
+PARTICIPANTS_SQL = """
+INSERT INTO {participant} (user_id, event_id, role, paid_status, presence)
+SELECT u.id, e.id, 'participant', false, true
+FROM bench_event_ids e
+CROSS JOIN generate_series(0, %(per_event)s - 1) k
+JOIN bench_user_ids u ON u.n = (e.n * 7919 + k) %% %(users)s
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark widoczności listy wydarzeń: stary OR-JOIN-DISTINCT kontra Exists. "
+        "Dane generowane w transakcji, która na końcu jest wycofywana."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--events", type=int, default=1_000_000)
+        parser.add_argument("--participants", type=int, default=10_000_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--runs", type=int, default=5)
+
+    def handle(self, *args, **opts):
+        events, users, runs = opts["events"], opts["users"], opts["runs"]
+        self.verbosity = opts["verbosity"]
+        per_event = max(1, min(opts["participants"] // events, users))
+
+        with transaction.atomic():
+            self.generate(events, users, per_event)
+
+            user = CentralUser.objects.filter(email__startswith="bench-visibility-").order_by("pk").first()
+            now = timezone.now()
+            base = Event.objects.filter(date_time_event__gte=now).order_by("date_time_event", "id")
+
+            old = base.filter(
+                Q(public_event=True) | Q(author=user) | Q(eventparticipant__user=user)
+            ).distinct()
+            new = base.visible_to(user)
+
+            for name, qs in (("OR-JOIN-DISTINCT", old), ("Exists", new)):
+                self.report(f"{name} strona 1", qs[:20], runs)
+                self.report(f"{name} głęboka strona", qs.filter(date_time_event__gte=now + timedelta(days=30))[:20], runs)
+                self.report(f"{name} count", qs.values("id"), runs, count=True)
+
+            transaction.set_rollback(True)
+
+    def generate(self, events, users, per_event):
+        tables = {
+            "user": CentralUser._meta.db_table,
+            "event": Event._meta.db_table,
+            "participant": EventParticipant._meta.db_table,
+        }
+        params = {"events": events, "users": users, "per_event": per_event}
+
+        with connection.cursor() as cursor:
+            for ids, table, count in (("bench_user_ids", tables["user"], users), ("bench_event_ids", tables["event"], events)):
+                cursor.execute(IDS_SQL.format(ids=ids, table=table), {"count": count})
+                cursor.execute(f"ANALYZE {ids}")
+
+            cursor.execute(USERS_SQL.format(**tables), params)
+            cursor.execute(EVENTS_SQL.format(**tables), params)
+            cursor.execute(PARTICIPANTS_SQL.format(**tables), params)
+            # Klucze obce są odroczone do commita, którego tu nie ma - bez tego złe id przeszłyby niezauważone
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+            for table in tables.values():
+                cursor.execute(f"ANALYZE {table}")
+
+        self.stdout.write(f"Dane: {events} wydarzeń, {events * per_event} uczestników, {users} userów")
+
+    def report(self, label, qs, runs, count=False):
+        sql, params = qs.query.sql_with_params()
+        if count:
+            sql = f"SELECT count(*) FROM ({sql}) q"
+
+        timings = []
+        with connection.cursor() as cursor:
+            for _ in range(runs):
+                cursor.execute(f"EXPLAIN (ANALYZE, FORMAT TEXT) {sql}", params)
+                plan = "\n".join(row[0] for row in cursor.fetchall())
+                timings.append(float(re.search(r"Execution Time: ([\d.]+) ms", plan).group(1)))
+
+        self.stdout.write(f"{label:<32} mediana {statistics.median(timings):9.2f} ms")
+        if self.verbosity > 1:
+            self.stdout.write(plan)
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:56
+
+import django.contrib.postgres.indexes
+import event.geo
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0014_event_event_image'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GistIndex(event.geo.Point(models.F('longitude'), models.F('latitude')), name='event_location_gist'),
+        ),
+    ]
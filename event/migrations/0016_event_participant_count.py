@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:59
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_participant_count(apps, schema_editor):
+    Event = apps.get_model('event', 'Event')
+    EventParticipant = apps.get_model('event', 'EventParticipant')
+
+    counts = (
+        EventParticipant.objects.filter(event=OuterRef('pk'))
+        .values('event')
+        .annotate(c=Count('id'))
+        .values('c')
+    )
+    Event.objects.update(participant_count=Coalesce(Subquery(counts, output_field=IntegerField()), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0015_event_location_gist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_participant_count, migrations.RunPython.noop),
+    ]
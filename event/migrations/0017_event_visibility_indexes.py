@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:02
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0016_event_participant_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['date_time_event', 'id'], name='event_time_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['public_event', 'date_time_event'], name='event_public_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['author', 'date_time_event'], name='event_author_time_idx'),
+        ),
+    ]
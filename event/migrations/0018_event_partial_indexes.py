@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:06
+
+import django.contrib.postgres.indexes
+import event.geo
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0017_event_visibility_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_location_gist',
+        ),
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_public_time_idx',
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=django.contrib.postgres.indexes.GistIndex(event.geo.Point(models.F('longitude'), models.F('latitude')), condition=models.Q(('public_event', True)), name='event_public_location_gist'),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(condition=models.Q(('public_event', True)), fields=['date_time_event', 'id'], name='event_public_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventparticipant',
+            index=models.Index(fields=['event', 'role'], name='participant_event_role_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-18 14:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('event', '0019_event_search'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='eventparticipant',
+            name='unique_user_event',
+        ),
+        migrations.RemoveIndex(
+            model_name='event',
+            name='event_author_time_idx',
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='eventparticipant',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='eventparticipant', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='event',
+            index=models.Index(fields=['author', 'date_time_event', 'id'], name='event_author_time_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='eventparticipant',
+            constraint=models.UniqueConstraint(fields=('user', 'event'), include=('role',), name='unique_user_event'),
+        ),
+    ]
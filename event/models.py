@@ -1,14 +1,19 @@
 import uuid
 
 from django.db import models
+from django.db.models import Exists, OuterRef, Prefetch, Q, Subquery
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex, GistIndex
+from django.contrib.postgres.search import SearchVectorField
 
 from decimal import Decimal
 
 from user.models import CentralUser
+from .geo import event_point
+from .search import event_search_vector
 
 
 ADVANCED_LEVEL = [
@@ -28,13 +33,54 @@ PARTICIPANT_ROLES = [
 class Category(models.Model):
     name = models.CharField(max_length=255)
 
+    class Meta:
+        indexes = [
+            GinIndex(fields=['name'], opclasses=['gin_trgm_ops'], name='category_name_trgm'),
+        ]
+
     def __str__(self):
         return self.name
 
 
+class EventQuerySet(models.QuerySet):
+    def visible_to(self, user):
+        """
+        Publiczne, własne i te, w których user jest uczestnikiem. Uczestnictwo jako Exists
+        zamiast JOIN - bez mnożenia wierszy i bez DISTINCT.
+        """
+        visible = Q(public_event=True)
+        if user.is_authenticated:
+            visible |= Q(author=user)
+            visible |= Exists(EventParticipant.objects.filter(event=OuterRef('pk'), user=user))
+        return self.filter(visible)
+
+    def for_detail(self):
+        """Wszystko, czego potrzebuje EventSerializer - trenerzy w `trainers`, bez zapytań per event."""
+        trainers = EventParticipant.objects.filter(role='trainer').select_related('user__profile').order_by('id')
+        return self.select_related('category', 'additional_info', 'author__profile').prefetch_related(
+            Prefetch('eventparticipant', queryset=trainers, to_attr='trainers'),
+            'additional_info__special_guests',
+        )
+
+    def upcoming_for(self, user):
+        """
+        Nadchodzące eventy, których user jest autorem albo uczestnikiem, z rolą w `role_in_event`.
+        Obie gałęzie UNION czytają tylko indeksy (event_author_time_idx, unique_user_event).
+        """
+        authored = Event.objects.filter(author=user, date_time_event__gte=timezone.now()).values('id')
+        joined = EventParticipant.objects.filter(user=user).values('event_id')
+        role = EventParticipant.objects.filter(user=user, event=OuterRef('pk')).values('role')[:1]
+
+        return self.filter(pk__in=authored.union(joined), date_time_event__gte=timezone.now()).annotate(
+            role_in_event=Subquery(role),
+            is_author=Q(author=user),
+        ).order_by('date_time_event', 'id')
+
+
 class Event(models.Model):
     unique_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
-    author = models.ForeignKey(CentralUser, on_delete=models.CASCADE, related_name='events')
+    # Indeks FK zbędny - author jest prefiksem event_author_time_idx
+    author = models.ForeignKey(CentralUser, on_delete=models.CASCADE, related_name='events', db_index=False)
     title = models.CharField(max_length=255)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True)
     short_desc = models.CharField(max_length=255)
@@ -55,8 +101,34 @@ class Event(models.Model):
     zip_code = models.CharField(max_length=255, blank=True, null=True)
     public_event = models.BooleanField(default=True)
 
+    # Utrzymywane przez event/services.py i sygnały EventParticipant - nie liczymy Count() przy każdym zapytaniu
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+
     event_image = models.ImageField(upload_to='event_photos/', null=True, blank=True)
 
+    search_vector = models.GeneratedField(
+        expression=event_search_vector(),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    objects = EventQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Mapa i klastry pokazują tylko publiczne eventy
+            GistIndex(event_point(), condition=Q(public_event=True), name='event_public_location_gist'),
+            # Kolejność listy i klucz paginacji keyset
+            models.Index(fields=['date_time_event', 'id'], name='event_time_id_idx'),
+            # Lista dla anonimowych i część publiczna visible_to; now() nie może być w warunku indeksu
+            models.Index(fields=['date_time_event', 'id'], condition=Q(public_event=True), name='event_public_time_idx'),
+            # "Moje wydarzenia" - id w kluczu, żeby gałąź autora w UNION była index-only
+            models.Index(fields=['author', 'date_time_event', 'id'], name='event_author_time_idx'),
+            # Wyszukiwarka listy (event/filters.py)
+            GinIndex(fields=['search_vector'], name='event_search_vector_gin'),
+            GinIndex(fields=['title'], opclasses=['gin_trgm_ops'], name='event_title_trgm'),
+        ]
+
     def __str__(self):
         return self.title
     
@@ -78,7 +150,8 @@ class SpecialGuests(models.Model):
 
 
 class EventParticipant(models.Model):
-    user = models.ForeignKey(CentralUser, on_delete=models.CASCADE, related_name='eventparticipant')
+    # Indeks FK zbędny - user jest prefiksem unique_user_event
+    user = models.ForeignKey(CentralUser, on_delete=models.CASCADE, related_name='eventparticipant', db_index=False)
     event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='eventparticipant')
 
     role = models.CharField(max_length=255, choices=PARTICIPANT_ROLES, default='participant')
@@ -87,7 +160,12 @@ class EventParticipant(models.Model):
 
     class Meta:
         constraints = [
-            models.UniqueConstraint(fields=['user', 'event'], name='unique_user_event')
+            # role w INCLUDE - rola w "moich wydarzeniach" bez sięgania do tabeli
+            models.UniqueConstraint(fields=['user', 'event'], include=['role'], name='unique_user_event')
+        ]
+        indexes = [
+            # Trenerzy w szczegółach, uprawnienia admin/trainer w widokach uczestników i zaproszeń
+            models.Index(fields=['event', 'role'], name='participant_event_role_idx'),
         ]
 
     def __str__(self):
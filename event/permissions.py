@@ -1,8 +1,41 @@
+from django.http import Http404
 from rest_framework.permissions import BasePermission
 
-class IsEventAuthor(BasePermission):
+from .access import resolve_event_role
+from .models import Event
+from .services import ORGANIZER_ROLES
+
+
+class EventRolePermission(BasePermission):
+    """
+    Sprawdza rolę usera w evencie z `event_id` w URL-u (albo z obiektu) przez resolve_event_role -
+    jedno zapytanie na request, potem memo i krótki cache.
+    """
+    allowed_roles = ()
+    message = {"error": "You don't have permissions for this event", "code": "no_permissions"}
+
+    def has_role(self, request, event_id):
+        try:
+            return resolve_event_role(request, event_id) in self.allowed_roles
+        except Event.DoesNotExist:
+            raise Http404
+
+    def has_permission(self, request, view):
+        event_id = view.kwargs.get('event_id')
+        if event_id is None:
+            return True
+        return self.has_role(request, event_id)
+
     def has_object_permission(self, request, view, obj):
-        return obj.event.author == request.user
+        return self.has_role(request, obj.pk if isinstance(obj, Event) else obj.event_id)
+
+
+class IsEventAuthor(EventRolePermission):
+    allowed_roles = ('author',)
+
+
+class IsEventOrganizer(EventRolePermission):
+    allowed_roles = ORGANIZER_ROLES
     
 
 class IsAuthorOrReadOnly(BasePermission):
@@ -10,4 +43,5 @@ class IsAuthorOrReadOnly(BasePermission):
         if request.method in ('GET', 'HEAD', 'OPTIONS'):
             return True
 
-        return obj.author == request.user
\ No newline at end of file
+        # Event jest już wczytany - author_id wystarcza, resolver dołożyłby zapytanie
+        return obj.author_id == request.user.pk
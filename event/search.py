@@ -0,0 +1,13 @@
+from django.contrib.postgres.search import SearchVector
+
+
+# Tytuły i opisy są mieszane językowo - 'simple' bez stemmingu, literówki łapie pg_trgm
+SEARCH_CONFIG = 'simple'
+
+
+def event_search_vector():
+    # To samo wyrażenie buduje kolumnę generowaną i zapytanie
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('short_desc', weight='B', config=SEARCH_CONFIG)
+    )
@@ -1,11 +1,12 @@
-from .models import Event, EventAdditionalInfo, EventInvitation, SpecialGuests, Category, EventParticipant
+from .models import Event, EventAdditionalInfo, EventInvitation, SpecialGuests, Category, EventParticipant, PARTICIPANT_ROLES
 from django.utils import timezone
 from rest_framework import serializers
 from user_profile.models import UserProfile
 from user.models import CentralUser
-import random, string
 from decimal import Decimal
 from django.db import transaction
+from .caching import bump_event_detail
+from .services import create_invitation, MAX_BULK_INVITATIONS, MAX_BULK_PARTICIPANTS
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -65,6 +66,7 @@ class EventAdditionalInfoSerializer(serializers.ModelSerializer):
             for guest in guest_data:
                 SpecialGuests.objects.create(add_info=instance, **guest)
 
+        bump_event_detail(instance.event_id)
         return instance
     
 
@@ -77,7 +79,7 @@ class EventParticipantSerializer(serializers.ModelSerializer):
 
 class EventSerializer(serializers.ModelSerializer):
     additional_info = EventAdditionalInfoSerializer()
-    event_participant_count = serializers.IntegerField(read_only=True)
+    event_participant_count = serializers.IntegerField(source='participant_count', read_only=True)
     author_full_name = serializers.SerializerMethodField()
     trainer_list = serializers.SerializerMethodField()
     category_name = serializers.SerializerMethodField()
@@ -108,8 +110,12 @@ class EventSerializer(serializers.ModelSerializer):
         return f"{author.profile.name} {author.profile.surname}"
 
     def get_trainer_list(self, obj):
+        # `trainers` z Event.objects.for_detail(); świeżo utworzony event nie ma prefetchu
+        trainers = getattr(obj, 'trainers', None)
+        if trainers is None:
+            trainers = obj.eventparticipant.filter(role='trainer').select_related('user__profile')
         return EventParticipantSerializer(
-            obj.eventparticipant.filter(role='trainer'),
+            trainers,
             many=True,
             context=self.context
         ).data
@@ -142,6 +148,7 @@ class EventSerializer(serializers.ModelSerializer):
             info_serializer.is_valid(raise_exception=True)
             info_serializer.save()
 
+        bump_event_detail(instance.pk)
         return instance
 
 class EventAdditionalInfoListSerializer(serializers.ModelSerializer):
@@ -153,7 +160,7 @@ class EventAdditionalInfoListSerializer(serializers.ModelSerializer):
 class EventListSerializer(serializers.ModelSerializer):
     additional_info = EventAdditionalInfoListSerializer(read_only=True)
     category_name = serializers.SerializerMethodField()
-    event_participant_count = serializers.IntegerField(read_only=True)
+    event_participant_count = serializers.IntegerField(source='participant_count', read_only=True)
 
     class Meta:
         model = Event
@@ -164,6 +171,17 @@ class EventListSerializer(serializers.ModelSerializer):
         return obj.category.name if obj.category else None
 
 
+class MyEventSerializer(serializers.ModelSerializer):
+    event_participant_count = serializers.IntegerField(source='participant_count', read_only=True)
+    role_in_event = serializers.CharField(read_only=True, allow_null=True)
+    is_author = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = Event
+        fields = ['id', 'date_time_event', 'duration_min', 'title', 'city', 'event_image',
+                  'event_participant_count', 'role_in_event', 'is_author']
+
+
 class EventInvitationSerializer(serializers.ModelSerializer):
     is_valid = serializers.ReadOnlyField()
 
@@ -178,13 +196,13 @@ class EventInvitationCreateSerializer(serializers.ModelSerializer):
         fields = ['is_one_use', 'is_active']
 
     def create(self, validated_data):
-        while True:
-            code = "".join(random.choices(string.ascii_uppercase + string.digits, k=8))
-            if not EventInvitation.objects.filter(code=code).exists():
-                validated_data["code"] = code
-                break
+        return create_invitation(**validated_data)
+
 
-        return super().create(validated_data)
+class EventInvitationBulkCreateSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1, max_value=MAX_BULK_INVITATIONS)
+    is_one_use = serializers.BooleanField(default=True)
+    is_active = serializers.BooleanField(default=True)
 
 
 class ProfileEvenSimpleSerializer(serializers.ModelSerializer):
@@ -204,7 +222,7 @@ class EventInvSerializer(serializers.ModelSerializer):
     author = EventSimpleSerializer(read_only=True)
     additional_info = EventAdditionalInfoListSerializer(read_only=True)
     category_name = serializers.SerializerMethodField()
-    event_participant_count = serializers.IntegerField(read_only=True)
+    event_participant_count = serializers.IntegerField(source='participant_count', read_only=True)
 
     class Meta:
         model = Event
@@ -215,18 +233,8 @@ class EventInvSerializer(serializers.ModelSerializer):
     
 
 class CodeSerializer(serializers.Serializer):
-    code = serializers.CharField(required=True)
-
-    def validate_code(self, value):
-        try:
-            inv = EventInvitation.objects.get(code=value)
-        except EventInvitation.DoesNotExist:
-            raise serializers.ValidationError("Invalid invitation code.")
-
-        if not inv.is_valid:
-            raise serializers.ValidationError("Invitation expired or inactive.")
-
-        return value
+    # Ważność kodu sprawdza dopiero redeem_invitation, pod blokadą wiersza
+    code = serializers.CharField(required=True, max_length=8)
     
 
 class NoneSerializer(serializers.Serializer):
@@ -237,7 +245,60 @@ class ChangeRoleSerializer(serializers.Serializer):
     new_role = serializers.CharField(required=True)
 
 
+class ParticipantIdsSerializer(serializers.Serializer):
+    participant_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=MAX_BULK_PARTICIPANTS
+    )
+
+
+class BulkChangeRoleSerializer(ParticipantIdsSerializer):
+    new_role = serializers.ChoiceField(choices=PARTICIPANT_ROLES)
+
+
+class BulkParticipantStatusSerializer(ParticipantIdsSerializer):
+    paid_status = serializers.BooleanField(required=False)
+    presence = serializers.BooleanField(required=False, allow_null=True)
+
+    def validate(self, attrs):
+        if 'paid_status' not in attrs and 'presence' not in attrs:
+            raise serializers.ValidationError({"error": "Provide paid_status or presence", "code": "nothing_to_update"})
+        return attrs
+
+
 class EventMapSerializer(serializers.ModelSerializer):
     class Meta:
         model = Event
         fields = ['id', 'latitude', 'longitude']
+
+
+class MapViewportSerializer(serializers.Serializer):
+    MAX_RADIUS_KM = 200
+
+    bbox = serializers.CharField(required=False, help_text="west,south,east,north")
+    lat = serializers.FloatField(required=False, min_value=-90, max_value=90)
+    lng = serializers.FloatField(required=False, min_value=-180, max_value=180)
+    radius_km = serializers.FloatField(required=False, min_value=0.01, max_value=MAX_RADIUS_KM)
+    zoom = serializers.IntegerField(required=False, min_value=0, max_value=22)
+
+    def validate_bbox(self, value):
+        try:
+            west, south, east, north = (float(v) for v in value.split(','))
+        except ValueError:
+            raise serializers.ValidationError("bbox must be west,south,east,north")
+
+        if not (-180 <= west <= 180 and -180 <= east <= 180 and -90 <= south <= north <= 90):
+            raise serializers.ValidationError("bbox is out of range")
+
+        return west, south, east, north
+
+    def validate(self, attrs):
+        if 'bbox' not in attrs and not {'lat', 'lng', 'radius_km'} <= attrs.keys():
+            raise serializers.ValidationError({"error": "Provide bbox or lat, lng and radius_km", "code": "viewport_required"})
+        return attrs
+
+
+class EventMapClusterSerializer(serializers.Serializer):
+    id = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+    latitude = serializers.FloatField()
+    longitude = serializers.FloatField()
@@ -0,0 +1,224 @@
+import secrets
+import string
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, F, OuterRef, Subquery, Value, When
+
+from .caching import bump_event_detail
+from .models import Event, EventAdditionalInfo, EventInvitation, EventParticipant
+
+
+INVITATION_CODE_ALPHABET = string.ascii_uppercase + string.digits
+INVITATION_CODE_LENGTH = 8
+# 36^8 kodów - kolizja to rzadkość, więc kilka prób wystarcza z zapasem
+INVITATION_CODE_ATTEMPTS = 5
+MAX_BULK_INVITATIONS = 500
+MAX_BULK_PARTICIPANTS = 500
+
+ORGANIZER_ROLES = ('author', 'admin', 'trainer')
+
+JOINED = 'joined'
+ALREADY_JOINED = 'already_joined'
+FULL = 'full'
+INVALID_INVITATION = 'invalid_invitation'
+
+
+# Jedno polecenie w autocommit: warunkowy UPDATE licznika i INSERT uczestnika.
+# Blokada wiersza Event trwa tylko do końca tego polecenia, bez select_for_update.
+JOIN_SQL = """
+WITH existing AS (
+    SELECT id FROM {participant} WHERE event_id = %(event)s AND user_id = %(user)s
+), seat AS (
+    UPDATE {event} SET participant_count = participant_count + 1
+    WHERE id = %(event)s
+      AND NOT EXISTS (SELECT 1 FROM existing)
+      AND participant_count < COALESCE(
+          (SELECT NULLIF(places_for_people_limit, 0) FROM {additional_info} WHERE event_id = %(event)s),
+          2147483647
+      )
+    RETURNING id
+), joined AS (
+    INSERT INTO {participant} (user_id, event_id, role, paid_status, presence)
+    SELECT %(user)s, id, %(role)s, false, true FROM seat
+    ON CONFLICT (user_id, event_id) DO NOTHING
+    RETURNING id
+)
+SELECT (SELECT id FROM existing), (SELECT id FROM seat), (SELECT id FROM joined)
+"""
+
+
+def join_event(event_id, user_id, role='participant'):
+    """
+    Rezerwuje miejsce i dopisuje uczestnika. Zwraca JOINED, ALREADY_JOINED albo FULL.
+    Ponowienie tego samego żądania nie zajmuje drugiego miejsca.
+    """
+    sql = JOIN_SQL.format(
+        participant=EventParticipant._meta.db_table,
+        event=Event._meta.db_table,
+        additional_info=EventAdditionalInfo._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'event': event_id, 'user': user_id, 'role': role})
+        existing, seat, joined = cursor.fetchone()
+
+    if existing:
+        return ALREADY_JOINED
+    if joined:
+        bump_event_detail(event_id)
+        return JOINED
+    if seat:
+        # Równoległe ponowienie tego samego usera wstawiło wiersz pierwsze - oddajemy miejsce
+        release_seat(event_id)
+        return ALREADY_JOINED
+    return FULL
+
+
+# Jak JOIN_SQL, ale event bierzemy z zaproszenia zablokowanego FOR UPDATE. Równoległe
+# użycie tego samego kodu czeka na blokadę i po commicie pierwszego widzi is_used = true.
+REDEEM_SQL = """
+WITH inv AS (
+    SELECT i.id, i.event_id, i.is_one_use FROM {invitation} i
+    JOIN {event} e ON e.id = i.event_id
+    WHERE i.code = %(code)s AND i.is_active AND NOT i.is_used AND e.date_time_event >= now()
+    FOR UPDATE OF i
+), existing AS (
+    SELECT p.id FROM {participant} p, inv WHERE p.event_id = inv.event_id AND p.user_id = %(user)s
+), seat AS (
+    UPDATE {event} SET participant_count = participant_count + 1
+    WHERE id = (SELECT event_id FROM inv)
+      AND NOT EXISTS (SELECT 1 FROM existing)
+      AND participant_count < COALESCE(
+          (SELECT NULLIF(places_for_people_limit, 0) FROM {additional_info} WHERE event_id = (SELECT event_id FROM inv)),
+          2147483647
+      )
+    RETURNING id
+), joined AS (
+    INSERT INTO {participant} (user_id, event_id, role, paid_status, presence)
+    SELECT %(user)s, id, 'participant', false, true FROM seat
+    ON CONFLICT (user_id, event_id) DO NOTHING
+    RETURNING id
+), used AS (
+    UPDATE {invitation} SET is_used = true
+    WHERE id = (SELECT id FROM inv WHERE is_one_use) AND EXISTS (SELECT 1 FROM joined)
+    RETURNING id
+)
+SELECT (SELECT event_id FROM inv), (SELECT id FROM existing), (SELECT id FROM seat),
+       (SELECT id FROM joined), (SELECT id FROM used)
+"""
+
+
+def redeem_invitation(code, user_id):
+    """
+    Weryfikuje kod, rezerwuje miejsce, dopisuje uczestnika i zużywa kod jednorazowy
+    w jednym poleceniu. Zwraca (wynik, event_id); INVALID_INVITATION gdy kod nie istnieje,
+    jest nieaktywny, zużyty albo wydarzenie minęło. Kod jednorazowy zużywa tylko faktyczne dołączenie.
+    """
+    sql = REDEEM_SQL.format(
+        invitation=EventInvitation._meta.db_table,
+        participant=EventParticipant._meta.db_table,
+        event=Event._meta.db_table,
+        additional_info=EventAdditionalInfo._meta.db_table,
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'code': code, 'user': user_id})
+        event_id, existing, seat, joined, used = cursor.fetchone()
+
+    if event_id is None:
+        return INVALID_INVITATION, None
+    if existing:
+        return ALREADY_JOINED, event_id
+    if joined:
+        bump_event_detail(event_id)
+        return JOINED, event_id
+    if seat:
+        release_seat(event_id)
+        return ALREADY_JOINED, event_id
+    return FULL, event_id
+
+
+def release_seat(event_id):
+    Event.objects.filter(pk=event_id, participant_count__gt=0).update(participant_count=F('participant_count') - 1)
+
+
+def generate_invitation_code():
+    return ''.join(secrets.choice(INVITATION_CODE_ALPHABET) for _ in range(INVITATION_CODE_LENGTH))
+
+
+def _is_code_collision(error):
+    # psycopg2 podaje nazwę naruszonego ograniczenia - inne błędy integralności nie są powodem do ponowienia
+    constraint = getattr(getattr(error.__cause__, 'diag', None), 'constraint_name', None) or ''
+    return 'code' in constraint
+
+
+def create_invitations(event, created_by, count=1, **fields):
+    """
+    Tworzy `count` zaproszeń jednym bulk_create. Unikalność kodu pilnuje indeks,
+    bez wcześniejszego sprawdzania - przy kolizji cała paczka jest losowana od nowa.
+    """
+    for attempt in range(INVITATION_CODE_ATTEMPTS):
+        codes = set()
+        while len(codes) < count:
+            codes.add(generate_invitation_code())
+
+        invitations = [
+            EventInvitation(event=event, created_by=created_by, code=code, **fields)
+            for code in codes
+        ]
+        try:
+            # Savepoint - błąd nie psuje zewnętrznej transakcji żądania
+            with transaction.atomic():
+                return EventInvitation.objects.bulk_create(invitations)
+        except IntegrityError as error:
+            if not _is_code_collision(error) or attempt == INVITATION_CODE_ATTEMPTS - 1:
+                raise
+
+
+def create_invitation(event, created_by, **fields):
+    return create_invitations(event, created_by, 1, **fields)[0]
+
+
+def event_role(event_id, user):
+    """
+    Rola usera w evencie jednym zapytaniem: 'author', rola uczestnika albo None.
+    Event.DoesNotExist gdy eventu nie ma.
+    """
+    participant_role = EventParticipant.objects.filter(event=OuterRef('pk'), user=user).values('role')[:1]
+    rows = Event.objects.filter(pk=event_id).annotate(
+        user_role=Case(When(author=user, then=Value('author')), default=Subquery(participant_role)),
+    ).values_list('user_role', flat=True)
+
+    for role in rows:
+        return role
+    raise Event.DoesNotExist
+
+
+# Jedno polecenie: usunięcie uczestników i korekta licznika miejsc. Omija sygnały post_delete,
+# które przy queryset.delete() zdejmowałyby miejsca po jednym.
+REMOVE_PARTICIPANTS_SQL = """
+WITH removed AS (
+    DELETE FROM {participant} WHERE event_id = %(event)s AND id = ANY(%(ids)s) RETURNING id
+), seats AS (
+    UPDATE {event} SET participant_count = GREATEST(participant_count - (SELECT count(*) FROM removed), 0)
+    WHERE id = %(event)s AND EXISTS (SELECT 1 FROM removed)
+)
+SELECT count(*) FROM removed
+"""
+
+
+def remove_participants(event_id, participant_ids):
+    sql = REMOVE_PARTICIPANTS_SQL.format(participant=EventParticipant._meta.db_table, event=Event._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {'event': event_id, 'ids': list(participant_ids)})
+        removed = cursor.fetchone()[0]
+
+    if removed:
+        bump_event_detail(event_id)
+    return removed
+
+
+def update_participants(event_id, participant_ids, **fields):
+    """Zbiorczy UPDATE (role, paid_status, presence). update() nie woła sygnałów - cache szczegółów zrzucamy raz."""
+    updated = EventParticipant.objects.filter(event_id=event_id, pk__in=participant_ids).update(**fields)
+    if updated:
+        bump_event_detail(event_id)
+    return updated
@@ -0,0 +1,56 @@
+from django.db.models import F
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .caching import bump_event_detail
+from .clustering import invalidate_clusters
+from .models import Event, EventParticipant
+from .services import release_seat
+
+
+@receiver(pre_save, sender=Event)
+def remember_previous_location(sender, instance, raw=False, **kwargs):
+    instance._previous_location = None
+    if raw or instance._state.adding or instance.pk is None:
+        return
+
+    instance._previous_location = Event.objects.filter(pk=instance.pk).values_list('latitude', 'longitude').first()
+
+
+@receiver(post_save, sender=Event)
+def drop_clusters_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+
+    points = [(instance.latitude, instance.longitude)]
+    previous = getattr(instance, '_previous_location', None)
+    if previous and previous != points[0]:
+        points.append(previous)
+    invalidate_clusters(*points)
+    bump_event_detail(instance.pk)
+
+
+@receiver(post_delete, sender=Event)
+def drop_clusters_on_delete(sender, instance, **kwargs):
+    invalidate_clusters((instance.latitude, instance.longitude))
+    # Unieważnia też zapamiętane role (event/access.py)
+    bump_event_detail(instance.pk)
+
+
+@receiver(post_save, sender=EventParticipant)
+def track_participant_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+
+    # Zmiana roli zmienia listę trenerów w szczegółach eventu
+    bump_event_detail(instance.event_id)
+
+    # join_event wstawia uczestnika surowym SQL razem z licznikiem, więc tu trafiają tylko inne ścieżki
+    if created:
+        Event.objects.filter(pk=instance.event_id).update(participant_count=F('participant_count') + 1)
+
+
+@receiver(post_delete, sender=EventParticipant)
+def track_participant_on_delete(sender, instance, **kwargs):
+    release_seat(instance.event_id)
+    bump_event_detail(instance.event_id)
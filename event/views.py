@@ -1,3 +1,6 @@
+import base64
+from datetime import datetime
+
 from django.shortcuts import render, get_object_or_404
 from django.db.models import Q, Count, F, Subquery, OuterRef, Value, CharField
 from django.utils import timezone
@@ -11,30 +14,115 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.generics import ListAPIView, CreateAPIView, GenericAPIView
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.throttling import UserRateThrottle
 
 from .serializers import( EventSerializer, EventInvitationCreateSerializer, EventListSerializer, CodeSerializer,
                           CategorySerializer, EventParticipantSerializer, EventInvitationSerializer, EventInvSerializer, NoneSerializer,
-                          ChangeRoleSerializer, EventMapSerializer)
+                          ChangeRoleSerializer, EventMapSerializer, MapViewportSerializer, EventMapClusterSerializer,
+                          EventInvitationBulkCreateSerializer, MyEventSerializer, ParticipantIdsSerializer,
+                          BulkChangeRoleSerializer, BulkParticipantStatusSerializer)
 
 from .models import Event, Category, EventParticipant, EventInvitation, PARTICIPANT_ROLES, EventAdditionalInfo
-from .permissions import IsEventAuthor, IsAuthorOrReadOnly
+from .permissions import IsEventAuthor, IsEventOrganizer, IsAuthorOrReadOnly
 from .filters import EventListFilter
+from .services import (join_event, redeem_invitation, create_invitations, remove_participants, update_participants,
+                       ALREADY_JOINED, FULL, INVALID_INVITATION)
+from .caching import get_event_detail
+from .geo import in_bbox, radius_bbox, haversine_km
+from .clustering import CLUSTER_MAX_ZOOM, clusters_for_bbox
 from user.tasks import async_generate_report_task
 
 class CustomPagination(PageNumberPagination):
     page_size = 20
     max_page_size = 60
 
+
+class EventListPagination(CustomPagination):
+    """
+    Domyślnie numery stron. Z parametrem ?cursor= (pusty dla pierwszej strony) paginacja keyset
+    po (date_time_event, id) - każda strona kosztuje tyle co pierwsza, COUNT tylko przy ?with_count=true.
+    Wyniki ?search= są posortowane wg trafności, więc dla nich zostają numery stron.
+    """
+    cursor_query_param = 'cursor'
+    ordering = ('date_time_event', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = (
+            self.cursor_query_param in request.query_params
+            and 'search_rank' not in queryset.query.annotations
+        )
+        if not self.keyset:
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        size = self.get_page_size(request)
+        position = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        self.count = None
+        if request.query_params.get('with_count', '').lower() in ('1', 'true'):
+            self.count = queryset.count()
+
+        reverse = False
+        if position is not None:
+            reverse, date_time, pk = position
+            if reverse:
+                queryset = queryset.filter(Q(date_time_event__lt=date_time) | Q(date_time_event=date_time, id__lt=pk))
+            else:
+                queryset = queryset.filter(Q(date_time_event__gt=date_time) | Q(date_time_event=date_time, id__gt=pk))
+
+        ordering = [f'-{field}' for field in self.ordering] if reverse else list(self.ordering)
+        page = list(queryset.order_by(*ordering)[:size + 1])
+        has_more = len(page) > size
+        page = page[:size]
+
+        if reverse:
+            page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.page_items = page
+        return page
+
+    def encode_cursor(self, event, reverse):
+        payload = f"{int(reverse)}|{event.date_time_event.isoformat()}|{event.pk}"
+        token = base64.urlsafe_b64encode(payload.encode()).decode()
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            reverse, date_time, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+            return reverse == '1', datetime.fromisoformat(date_time), int(pk)
+        except (ValueError, UnicodeDecodeError):
+            raise NotFound({"error": "Invalid cursor", "code": "invalid_cursor"})
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        body = {
+            'next': self.encode_cursor(self.page_items[-1], False) if self.has_next and self.page_items else None,
+            'previous': self.encode_cursor(self.page_items[0], True) if self.has_previous and self.page_items else None,
+            'results': data,
+        }
+        if self.count is not None:
+            body['count'] = self.count
+        return Response(body)
+
 class TenPerMinuteThrottle(UserRateThrottle):
     rate = '10/min'
 
 
 class EventViewSet(viewsets.ModelViewSet):
+    MAP_EVENTS_LIMIT = 500
+
     serializer_class = EventSerializer
     permission_classes = [IsAuthenticated, IsAuthorOrReadOnly]
-    pagination_class = CustomPagination
+    pagination_class = EventListPagination
     filterset_class = EventListFilter
 
     def get_serializer_class(self):
@@ -46,7 +134,7 @@ class EventViewSet(viewsets.ModelViewSet):
         if self.action in ["list", "retrieve"]:
             self.permission_classes = [AllowAny]
             
-        elif self.action in ["join_to_public_event", "quit_from_event"]:
+        elif self.action in ["join_to_public_event", "quit_from_event", "my_upcoming"]:
             self.permission_classes = [IsAuthenticated]
 
         else:
@@ -58,18 +146,13 @@ class EventViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        base_qs = Event.objects.select_related('category', 'additional_info').prefetch_related('eventparticipant__user__profile').order_by('date_time_event')
-        filters = Q(public_event=True)
-
-        if user.is_authenticated:
-            filters |= Q(author=user)
-            filters |= Q(eventparticipant__user=user)
-
-        qs = base_qs.filter(filters, date_time_event__gte=timezone.now())
-        qs = qs.annotate(event_participant_count=Count('eventparticipant'))
-
         if self.action == "list":
-            return qs.distinct()
+            return Event.objects.select_related('category', 'additional_info').visible_to(user).filter(
+                date_time_event__gte=timezone.now()
+            ).order_by('date_time_event', 'id')
+
+        base_qs = Event.objects.for_detail().order_by('date_time_event', 'id')
+        qs = base_qs.visible_to(user).filter(date_time_event__gte=timezone.now())
 
         if self.action in ["retrieve", "join_to_public_event", "quit_from_event"]:
             if user.is_authenticated:
@@ -82,17 +165,74 @@ class EventViewSet(viewsets.ModelViewSet):
             else:
                 qs = qs.annotate(role_in_event=Value(None, output_field=CharField(null=True)))
 
-            return qs.distinct()
+            return qs
         
         if user.is_authenticated:
             return base_qs.filter(author=user)
         
         return base_qs.none()
     
+    def retrieve(self, request, *args, **kwargs):
+        user = request.user
+        try:
+            pk = int(kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            raise NotFound()
+
+        # Jedno zapytanie: widoczność eventu dla usera i jego rola; reszta z cache
+        visible = Event.objects.visible_to(user).filter(pk=pk, date_time_event__gte=timezone.now())
+        if user.is_authenticated:
+            role = EventParticipant.objects.filter(event=OuterRef('pk'), user=user).values('role')[:1]
+            row = visible.annotate(role_in_event=Subquery(role)).values_list('pk', 'role_in_event').first()
+        else:
+            row = visible.values_list('pk', Value(None, output_field=CharField(null=True))).first()
+
+        if row is None:
+            raise NotFound()
+
+        data = get_event_detail(pk, lambda: self.get_serializer(Event.objects.for_detail().get(pk=pk)).data)
+        return Response({**data, 'role_in_event': row[1]})
+
+    @action(detail=False, methods=['get'], serializer_class=MyEventSerializer, url_path='my-upcoming')
+    def my_upcoming(self, request, *args, **kwargs):
+        events = Event.objects.upcoming_for(request.user).only(
+            'id', 'date_time_event', 'duration_min', 'title', 'city', 'event_image', 'participant_count', 'author_id'
+        )
+        page = self.paginate_queryset(events)
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+
     @action(detail=False, methods=['get'],  serializer_class=EventMapSerializer)
     def events_on_map(self, request, *args, **kwargs):
-        queryset = Event.objects.filter(public_event=True, date_time_event__gte=timezone.now())
-        serializer = self.get_serializer(queryset, many=True)
+        viewport = MapViewportSerializer(data=request.query_params)
+        viewport.is_valid(raise_exception=True)
+        params = viewport.validated_data
+
+        if 'bbox' in params:
+            bbox = params['bbox']
+        else:
+            bbox = radius_bbox(params['lat'], params['lng'], params['radius_km'])
+
+        # Przy oddalonej mapie zwracamy klastry z siatki kafelków zamiast pojedynczych pinezek
+        zoom = params.get('zoom')
+        if zoom is not None and zoom <= CLUSTER_MAX_ZOOM:
+            try:
+                clusters = clusters_for_bbox(bbox, zoom)
+            except ValueError:
+                return Response({"error": "Viewport too large for this zoom", "code": "viewport_too_large"}, status=status.HTTP_400_BAD_REQUEST)
+            return Response(EventMapClusterSerializer(clusters, many=True).data)
+
+        # Prostokąt idzie po indeksie GiST (event_public_location_gist), okrąg dopinamy w Pythonie
+        events = Event.objects.filter(
+            in_bbox(*bbox), public_event=True, date_time_event__gte=timezone.now()
+        ).only('id', 'latitude', 'longitude').order_by('date_time_event', 'id')[:self.MAP_EVENTS_LIMIT]
+
+        if 'bbox' not in params:
+            events = [
+                event for event in events
+                if haversine_km(params['lat'], params['lng'], event.latitude, event.longitude) <= params['radius_km']
+            ]
+
+        serializer = self.get_serializer(events, many=True)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'], serializer_class=EventSerializer, throttle_classes = [TenPerMinuteThrottle], url_path=r'by-code/(?P<access_code>[^/.]+)')
@@ -106,7 +246,7 @@ class EventViewSet(viewsets.ModelViewSet):
                 ).values('role')[:1]
         
         try:
-            event = Event.objects.filter(
+            event = Event.objects.for_detail().filter(
                 eventinvitation__code=access_code,
                 eventinvitation__is_active=True,
                 eventinvitation__is_used=False,
@@ -118,7 +258,6 @@ class EventViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(event, many=False)
         return Response(serializer.data)
     
-    @transaction.atomic
     @action(detail=True, methods=['post'], serializer_class=NoneSerializer)
     def join_to_public_event(self, request, *args, **kwargs):
         user = self.request.user
@@ -127,21 +266,18 @@ class EventViewSet(viewsets.ModelViewSet):
         if event.public_event == False:
             return Response({"error": "You can't entry to this event without access code", "code": "no_access_code"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if EventParticipant.objects.filter(event=event, user=user).exists() or event.author == user:
+        if event.author == user:
             return Response({"error": "You are already in this event", "code": "participant_already_exist"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        add = getattr(event, 'additional_info', None)
-        if add and add.places_for_people_limit:
-            add = EventAdditionalInfo.objects.select_for_update().get(pk=add.pk)
-            current = EventParticipant.objects.filter(event=event).count()
-            if current >= add.places_for_people_limit:
-                return Response({"error": "no seatsavaible", "code": "no_seats_avaible"}, status=status.HTTP_400_BAD_REQUEST)
-        
-        EventParticipant.objects.create(
-            user=user,
-            event=event,
-            role='participant',
-        )
+
+        # Bez transakcji i blokad - miejsce zajmuje jedno warunkowe polecenie (event/services.py)
+        result = join_event(event.pk, user.pk)
+
+        if result == ALREADY_JOINED:
+            return Response({"error": "You are already in this event", "code": "participant_already_exist"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result == FULL:
+            return Response({"error": "no seatsavaible", "code": "no_seats_avaible"}, status=status.HTTP_400_BAD_REQUEST)
+
         return Response({"success": "user added to event"}, status=status.HTTP_200_OK)
     
     @action(detail=True, methods=['post'], serializer_class=NoneSerializer)
@@ -167,62 +303,75 @@ class CategoryListView(ListAPIView):
 
 class EventParticipantList(mixins.ListModelMixin, viewsets.GenericViewSet):
     serializer_class = EventParticipantSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsEventOrganizer]
 
     def get_queryset(self):
-        user = self.request.user
-        event_id = self.kwargs.get('event_id')
-        event = get_object_or_404(Event, pk=event_id)
-
-        if user == event.author or EventParticipant.objects.filter(event=event, user=user, role__in=['admin', 'trainer']).exists():
-            return EventParticipant.objects.select_related('event').filter(event=event)
-
-        raise PermissionDenied(detail="You don't have permissions")
+        return EventParticipant.objects.select_related('user__profile').filter(event_id=self.kwargs.get('event_id'))
     
-    @action(detail=True, permission_classes=[IsEventAuthor], methods=['post'])
+    @action(detail=True, permission_classes=[IsAuthenticated, IsEventAuthor], methods=['post'])
     def delete_user_from_participant_list(self, request, *args, **kwargs):
         participant = self.get_object()
         participant.delete()
         return Response({"detail": "User has been removed from list"}, status=status.HTTP_204_NO_CONTENT)
-    
+
+    def bulk_input(self, serializer_class):
+        ser = serializer_class(data=self.request.data)
+        ser.is_valid(raise_exception=True)
+        return ser.validated_data
+
+    # Uprawnienia sprawdza IsEventOrganizer/IsEventAuthor jednym zapytaniem, potem jedno polecenie na paczkę.
+    # Tak jak delete_user_from_participant_list - usuwać może tylko autor
+    @action(detail=False, methods=['post'], url_path='bulk-remove', serializer_class=ParticipantIdsSerializer,
+            permission_classes=[IsAuthenticated, IsEventAuthor])
+    def bulk_remove(self, request, *args, **kwargs):
+        data = self.bulk_input(ParticipantIdsSerializer)
+
+        removed = remove_participants(int(kwargs['event_id']), data['participant_ids'])
+        return Response({"status": "removed", "count": removed})
+
+    @action(detail=False, methods=['post'], url_path='bulk-role', serializer_class=BulkChangeRoleSerializer)
+    def bulk_role(self, request, *args, **kwargs):
+        data = self.bulk_input(BulkChangeRoleSerializer)
+
+        updated = update_participants(int(kwargs['event_id']), data['participant_ids'], role=data['new_role'])
+        return Response({"status": "changed role", "count": updated})
+
+    @action(detail=False, methods=['post'], url_path='bulk-status', serializer_class=BulkParticipantStatusSerializer)
+    def bulk_status(self, request, *args, **kwargs):
+        data = self.bulk_input(BulkParticipantStatusSerializer)
+
+        fields = {name: data[name] for name in ('paid_status', 'presence') if name in data}
+        updated = update_participants(int(kwargs['event_id']), data['participant_ids'], **fields)
+        return Response({"status": "updated", "count": updated})
+
 
 class ChangeUserRankInEvent(GenericAPIView):
     serializer_class = ChangeRoleSerializer
-    permission_classes = [IsAuthenticated]
+    permission_classes = [IsAuthenticated, IsEventOrganizer]
 
     def post(self, request, *args, **kwargs):
-        user = request.user
-        event_id = kwargs.get('event_id')
-        participant_id = kwargs.get('participant_id')
-        event = get_object_or_404(Event, pk=event_id)
-
-        if EventParticipant.objects.filter(event=event, user=user, role__in=['admin', 'trainer']).exists() or request.user == event.author:
-            
-            participant = get_object_or_404(EventParticipant, pk=participant_id, event=event)
+        participant = get_object_or_404(EventParticipant, pk=kwargs.get('participant_id'), event_id=kwargs.get('event_id'))
 
-            serializer = self.get_serializer(data=request.data)
-            serializer.is_valid(raise_exception=True)
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
 
-            new_role = serializer.validated_data['new_role']
+        new_role = serializer.validated_data['new_role']
 
-            if new_role == participant.role:
-                return Response({"error": "Already has this role", "code": "role_aleardy_assigned"}, status=status.HTTP_200_OK)
-            
-            VALID_ROLES = [r[0] for r in PARTICIPANT_ROLES]
-
-            if new_role not in VALID_ROLES:
-                return Response({"error": "This role doesn't exist", "code": "role_didnt_found"}, status=status.HTTP_400_BAD_REQUEST)
-            
-            participant.role = new_role
-            participant.save(update_fields=["role"])
+        if new_role == participant.role:
+            return Response({"error": "Already has this role", "code": "role_aleardy_assigned"}, status=status.HTTP_200_OK)
+        
+        VALID_ROLES = [r[0] for r in PARTICIPANT_ROLES]
 
-            return Response({
-                "status": "changed role",
-                "participant": EventParticipantSerializer(participant).data
-            })
+        if new_role not in VALID_ROLES:
+            return Response({"error": "This role doesn't exist", "code": "role_didnt_found"}, status=status.HTTP_400_BAD_REQUEST)
         
-        else:
-            raise PermissionDenied({"error": "You don't have permissions to invite users to this event", "code": "no_permissions"})
+        participant.role = new_role
+        participant.save(update_fields=["role"])
+
+        return Response({
+            "status": "changed role",
+            "participant": EventParticipantSerializer(participant).data
+        })
 
 
 class EventInvitationViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
@@ -234,26 +383,37 @@ class EventInvitationViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, vie
             return EventInvitationSerializer
         return super().get_serializer_class()
 
-    def get_queryset(self):
-        user = self.request.user
-        event_id = self.kwargs.get('event_id')
-        event = get_object_or_404(Event, pk=event_id)
+    def get_permissions(self):
+        # Listę widzą organizatorzy, tworzyć i przełączać zaproszenia może tylko autor
+        if self.action == 'list':
+            self.permission_classes = [IsAuthenticated, IsEventOrganizer]
+        else:
+            self.permission_classes = [IsAuthenticated, IsEventAuthor]
+        return super().get_permissions()
 
-        if user == event.author or EventParticipant.objects.filter(event=event, user=user, role__in=['admin', 'trainer']).exists():
-            return EventInvitation.objects.select_related('event').filter(event=event).order_by('-id')
+    def get_queryset(self):
+        return EventInvitation.objects.select_related('event').filter(event_id=self.kwargs.get('event_id')).order_by('-id')
 
-        raise PermissionDenied({"error": "You don't have permissions to invite users to this event", "code": "no_permissions"})
+    def get_event(self):
+        return get_object_or_404(Event, pk=self.kwargs.get('event_id'))
 
     def perform_create(self, serializer):
-        event_id = self.kwargs.get('event_id')
-        event = get_object_or_404(Event, pk=event_id)
+        serializer.save(created_by=self.request.user, event=self.get_event())
 
-        if event.author != self.request.user:
-            raise PermissionDenied({"error": "You don't have permissions to invite users to this event", "code": "no_permissions"})
-        
-        serializer.save(created_by=self.request.user, event=event)
+    @action(detail=False, methods=['post'], serializer_class=EventInvitationBulkCreateSerializer)
+    def bulk(self, request, *args, **kwargs):
+        event = self.get_event()
+        ser = self.get_serializer(data=request.data)
+        ser.is_valid(raise_exception=True)
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsEventAuthor], serializer_class=NoneSerializer)
+        invitations = create_invitations(event, request.user, **ser.validated_data)
+        for invitation in invitations:
+            # is_valid czyta event - bez tego serializer robi zapytanie na każde zaproszenie
+            invitation.event = event
+
+        return Response(EventInvitationSerializer(invitations, many=True).data, status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'], serializer_class=NoneSerializer)
     def deactivate(self, request, pk=None, *args, **kwargs):
         invitation = self.get_object()
         invitation.is_active = False
@@ -263,7 +423,7 @@ class EventInvitationViewSet(mixins.CreateModelMixin, mixins.ListModelMixin, vie
             {"status": "deactivated", "invitation_id": invitation.id}
         )
     
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated, IsEventAuthor], serializer_class=NoneSerializer)
+    @action(detail=True, methods=['post'], serializer_class=NoneSerializer)
     def activate(self, request, pk=None, *args, **kwargs):
         invitation = self.get_object()
         invitation.is_active = True
@@ -277,33 +437,16 @@ class InvGetIntoEvent(GenericAPIView):
     serializer_class = CodeSerializer
     permission_classes = [IsAuthenticated]
 
-    @transaction.atomic
     def post(self, request, *args, **kwargs):
         ser = self.get_serializer(data=request.data)
         ser.is_valid(raise_exception=True)
-        code = ser.validated_data['code']
-
-        inv = EventInvitation.objects.select_for_update().filter(code=code).first()
-        if not inv or not inv.is_valid:
-            return Response({"error": "Invalid or expired invitation", "code": "invalid_invitation_code"}, status=status.HTTP_400_BAD_REQUEST)
-
-        event = inv.event
-        # limit miejsc
 
-        add = getattr(event, 'additional_info', None)
-        if add and add.places_for_people_limit:
-            current = EventParticipant.objects.select_for_update().filter(event=event).count()
-            if current >= add.places_for_people_limit:
-                return Response({"detail": "No seats available"}, status=status.HTTP_400_BAD_REQUEST)
+        # Już zapisany user dostaje 200 jak wcześniej przy get_or_create
+        result, _ = redeem_invitation(ser.validated_data['code'], request.user.pk)
 
-        obj, created = EventParticipant.objects.get_or_create(
-            user=request.user, event=event, defaults={'role': 'participant'}
-        )
-
-        if inv.is_one_use:
-            if inv.is_used:
-                return Response({"detail": "Invitation already used"}, status=status.HTTP_400_BAD_REQUEST)
-            inv.is_used = True
-            inv.save(update_fields=["is_used"])
+        if result == INVALID_INVITATION:
+            return Response({"error": "Invalid or expired invitation", "code": "invalid_invitation_code"}, status=status.HTTP_400_BAD_REQUEST)
+        if result == FULL:
+            return Response({"detail": "No seats available"}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"status": "success"}, status=status.HTTP_200_OK)
\ No newline at end of file
@@ -1,7 +1,19 @@
 import pytest
+from django.db import connections
+from django.db.models.signals import pre_migrate
+from django.dispatch import receiver
 from rest_framework.test import APIClient
 
 
+@receiver(pre_migrate)
+def create_postgres_extensions(sender, using, **kwargs):
+    """--nomigrations pomija TrigramExtension z migracji, a indeksy gin_trgm_ops jej wymagają."""
+    if sender.name != 'diet':
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -18,4 +30,12 @@ def use_fast_password_hasher(settings):
     """Wymusza użycie szybkiego haszowania haseł w testach."""
     settings.PASSWORD_HASHERS = [
         "django.contrib.auth.hashers.MD5PasswordHasher",
-    ]
\ No newline at end of file
+    ]
+
+
+@pytest.fixture(autouse=True)
+def use_local_cache(settings):
+    """Testy nie wymagają Redisa - wszystko dzieje się w jednym procesie, LocMem wystarcza."""
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    }
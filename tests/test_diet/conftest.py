@@ -0,0 +1,15 @@
+from pytest_factoryboy import register
+from tests.test_event.factories import UserFactory
+from .factories import (ProductFactory, ProductCategoryFactory, DailyMealCalendarFactory, MealCategoryFactory,
+                        FullMealFactory, MealItemFactory, DishFactory, DishIngredientFactory)
+
+
+register(UserFactory)
+register(ProductFactory)
+register(ProductCategoryFactory)
+register(DailyMealCalendarFactory)
+register(MealCategoryFactory)
+register(FullMealFactory)
+register(MealItemFactory)
+register(DishFactory)
+register(DishIngredientFactory)
@@ -0,0 +1,80 @@
+import factory
+from decimal import Decimal
+from factory.django import DjangoModelFactory
+from django.utils import timezone
+from diet.models import Product, ProductCategory, DailyMealCalendar, MealCategory, FullMeal, MealItem, Dish, DishIngredient
+
+
+class ProductCategoryFactory(DjangoModelFactory):
+    class Meta:
+        model = ProductCategory
+        django_get_or_create = ('name',)
+
+    name = factory.Sequence(lambda n: f"Kategoria {n}")
+
+
+class ProductFactory(DjangoModelFactory):
+    class Meta:
+        model = Product
+
+    title = factory.Sequence(lambda n: f"Produkt {n}")
+    brand = "Piątnica"
+    barcode = factory.Sequence(lambda n: f"590{n:010d}")
+    kcal_1g = Decimal("2.50000")
+    protein_1g = Decimal("0.10000")
+    fat_1g = Decimal("0.05000")
+    carbohydrates_1g = Decimal("0.40000")
+    salt_1g = Decimal("0.01000")
+
+
+class DailyMealCalendarFactory(DjangoModelFactory):
+    class Meta:
+        model = DailyMealCalendar
+
+    date = factory.LazyFunction(lambda: timezone.now().date())
+
+
+class MealCategoryFactory(DjangoModelFactory):
+    class Meta:
+        model = MealCategory
+
+    name = "Śniadanie"
+    order = 1
+
+
+class FullMealFactory(DjangoModelFactory):
+    class Meta:
+        model = FullMeal
+
+    name = "Owsianka"
+    portion = 1
+
+
+class MealItemFactory(DjangoModelFactory):
+    class Meta:
+        model = MealItem
+
+    name = "Płatki owsiane"
+    kcal_1g = Decimal("3.70000")
+    protein_1g = Decimal("0.13000")
+    fat_1g = Decimal("0.07000")
+    carbohydrates_1g = Decimal("0.60000")
+    salt_1g = Decimal("0.00100")
+    amount = Decimal("1")
+    calculated_gram_weight = Decimal("100")
+
+
+class DishFactory(DjangoModelFactory):
+    class Meta:
+        model = Dish
+
+    name = factory.Sequence(lambda n: f"Danie {n}")
+
+
+class DishIngredientFactory(DjangoModelFactory):
+    class Meta:
+        model = DishIngredient
+
+    dish = factory.SubFactory(DishFactory)
+    product = factory.SubFactory(ProductFactory)
+    weight_in_g = Decimal("100")
@@ -0,0 +1,210 @@
+import pytest
+from django.conf import settings
+from diet.search import SEARCH_CONFIGS
+from diet.utils import normalize_barcode, product_barcode_cache
+
+
+def test_search_configs_cover_languages():
+    assert set(SEARCH_CONFIGS) == {code for code, _ in settings.LANGUAGES}
+
+
+@pytest.mark.django_db
+def test_product_search_ranks_title_matches(auth_api_client, product_factory):
+    client, user = auth_api_client
+    brand_match = product_factory(title="Serek wiejski", brand="Jogurtownia")
+    title_match = product_factory(title="Jogurt naturalny", brand="Bakoma")
+    product_factory(title="Chleb razowy")
+
+    response = client.get('/diet/products/?search=jogurt')
+
+    assert response.status_code == 200, response.data
+    assert [p["id"] for p in response.data["results"]] == [title_match.id]
+
+    response = client.get('/diet/products/?search=Bakoma')
+    assert [p["id"] for p in response.data["results"]] == [title_match.id]
+
+
+@pytest.mark.django_db
+def test_product_search_stemming_per_language(auth_api_client, product_factory):
+    client, user = auth_api_client
+    product = product_factory(title="Frozen berry mix")
+
+    response = client.get('/diet/products/?search=berries&lang=en')
+    assert [p["id"] for p in response.data["results"]] == [product.id]
+
+    response = client.get('/diet/products/?search=berries&lang=pl')
+    assert response.data["results"] == []
+
+
+@pytest.mark.django_db
+def test_product_search_category_and_barcode(auth_api_client, product_factory, product_category_factory):
+    client, user = auth_api_client
+    dairy = product_category_factory(name="Nabiał")
+    in_category = product_factory(title="Masło", category=dairy)
+    by_barcode = product_factory(barcode="5901234567893")
+
+    response = client.get('/diet/products/?search=nabiał')
+    assert [p["id"] for p in response.data["results"]] == [in_category.id]
+    assert response.data["results"][0]["category_name"] == "Nabiał"
+
+    response = client.get('/diet/products/?search=5901234567893')
+    assert [p["id"] for p in response.data["results"]] == [by_barcode.id]
+
+    response = client.get('/diet/products/?search=05901234567893')
+    assert [p["id"] for p in response.data["results"]] == [by_barcode.id]
+
+    # Prefiks kodu nie jest kodem - trafia do wyszukiwania tekstowego
+    response = client.get('/diet/products/?search=590123')
+    assert response.data["results"] == []
+
+
+@pytest.mark.django_db
+def test_product_search_excludes_allergens(auth_api_client, product_factory):
+    client, user = auth_api_client
+    product_factory(title="Czekolada mleczna", allergens=["milk", "nuts"])
+    dark = product_factory(title="Czekolada gorzka", allergens=["soybeans"])
+
+    response = client.get('/diet/products/?search=czekolada milk')
+    assert [p["id"] for p in response.data["results"]] == [dark.id]
+
+
+@pytest.mark.django_db
+def test_product_list_hides_other_users_products(auth_api_client, product_factory, user_factory):
+    client, user = auth_api_client
+    own = product_factory(user=user)
+    product_factory(user=user_factory())
+    public = product_factory()
+
+    response = client.get('/diet/products/')
+    assert sorted(p["id"] for p in response.data["results"]) == sorted([own.id, public.id])
+
+
+@pytest.fixture
+def empty_barcode_cache():
+    product_barcode_cache.clear()
+    yield product_barcode_cache
+    product_barcode_cache.clear()
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("5901234123457", "5901234123457"),
+    ("036000291452", "36000291452"),
+    ("0036000291452", "36000291452"),
+    ("9638-5074", "96385074"),
+])
+def test_normalize_barcode(raw, expected):
+    assert normalize_barcode(raw) == expected
+
+
+@pytest.mark.parametrize("raw", ["5901234123458", "123", "59012341234ab"])
+def test_normalize_barcode_rejects_invalid(raw):
+    with pytest.raises(ValueError):
+        normalize_barcode(raw)
+
+
+@pytest.mark.django_db
+def test_barcode_lookup_matches_padded_upc_and_caches(auth_api_client, product_factory, empty_barcode_cache, django_assert_num_queries):
+    client, user = auth_api_client
+    product = product_factory(barcode="0036000291452")
+
+    response = client.get('/diet/products/barcode/036000291452/')
+    assert response.status_code == 200, response.data
+    assert response.data["id"] == product.id
+
+    with django_assert_num_queries(0):
+        response = client.get('/diet/products/barcode/0036000291452/')
+    assert response.data["id"] == product.id
+
+
+@pytest.mark.django_db
+def test_barcode_lookup_errors(auth_api_client, product_factory, user_factory, empty_barcode_cache):
+    client, user = auth_api_client
+    product_factory(barcode="5901234123457", user=user_factory())
+
+    response = client.get('/diet/products/barcode/5901234123458/')
+    assert response.status_code == 400
+    assert response.data["code"] == "invalid_barcode"
+
+    response = client.get('/diet/products/barcode/96385074/')
+    assert response.status_code == 404
+
+    response = client.get('/diet/products/barcode/5901234123457/')
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_barcode_lookup_prefers_own_product(auth_api_client, product_factory, user_factory, empty_barcode_cache):
+    client, user = auth_api_client
+    catalog = product_factory(barcode="5901234123457")
+    product_factory(barcode="5901234123457", user=user_factory())
+
+    assert client.get('/diet/products/barcode/5901234123457/').data["id"] == catalog.id
+
+    own = product_factory(barcode="5901234123457", user=user)
+    assert client.get('/diet/products/barcode/5901234123457/').data["id"] == own.id
+
+
+@pytest.mark.django_db
+def test_barcode_cache_invalidation(auth_api_client, product_factory, empty_barcode_cache):
+    client, user = auth_api_client
+    product = product_factory(barcode="5901234123457", title="Stara nazwa")
+    client.get('/diet/products/barcode/5901234123457/')
+
+    product.title = "Nowa nazwa"
+    product.save()
+    response = client.get('/diet/products/barcode/5901234123457/')
+    assert response.data["title"] == "Nowa nazwa"
+
+    # Stary kod nie może dalej wskazywać produktu z cache
+    product.barcode = "96385074"
+    product.save()
+    assert client.get('/diet/products/barcode/5901234123457/').status_code == 404
+    assert client.get('/diet/products/barcode/96385074/').data["id"] == product.id
+
+    product.delete()
+    assert client.get('/diet/products/barcode/96385074/').status_code == 404
+
+
+@pytest.mark.django_db
+def test_meal_item_from_product(auth_api_client, product_factory, daily_meal_calendar_factory, meal_category_factory,
+                                full_meal_factory, user_factory):
+    client, user = auth_api_client
+    category = meal_category_factory(calendar=daily_meal_calendar_factory(user=user))
+    product = product_factory(kcal_1g="2.5")
+    serving = product.serving_units.create(unit_name="slice", gram_weight="20")
+
+    response = client.post('/diet/meal-items/', {"meal_category": category.id, "product": product.id, "grams": "150"}, format='json')
+    assert response.status_code == 201, response.data
+    assert response.data["total_kcal"] == "375.00"
+
+    response = client.post('/diet/meal-items/', {
+        "meal_category": category.id, "product": product.id, "serving_unit": serving.id, "amount": "2",
+        "full_meal": full_meal_factory(meal_category=category).id,
+    }, format='json')
+    assert response.status_code == 201, response.data
+    assert response.data["calculated_gram_weight"] == "40.00"
+    category.refresh_from_db()
+    assert category.category_kcal == 475
+
+    foreign = meal_category_factory(calendar=daily_meal_calendar_factory(user=user_factory()))
+    response = client.post('/diet/meal-items/', {"meal_category": foreign.id, "product": product.id, "grams": "10"}, format='json')
+    assert response.data["code"] == ["meal_category_not_found"]
+    response = client.post('/diet/meal-items/', {"meal_category": category.id, "product": product.id}, format='json')
+    assert response.data["code"] == ["missing_grams"]
+
+
+@pytest.mark.django_db
+def test_dish_nutrients_portion(auth_api_client, product_factory, dish_factory, dish_ingredient_factory, user_factory):
+    client, user = auth_api_client
+    dish = dish_factory(user=user)
+    dish_ingredient_factory(dish=dish, product=product_factory(kcal_1g="3.7"), weight_in_g="100")
+    dish_ingredient_factory(dish=dish, product=product_factory(kcal_1g="0.5"), weight_in_g="300")
+
+    response = client.get(f'/diet/dishes/{dish.id}/nutrients/')
+    assert response.status_code == 200
+    assert response.data["kcal"] == pytest.approx(520)
+
+    response = client.get(f'/diet/dishes/{dish.id}/nutrients/?grams=200')
+    assert response.data["kcal"] == pytest.approx(260)
+    assert client.get(f'/diet/dishes/{dish.id}/nutrients/?grams=abc').data["code"] == "invalid_grams"
+    assert client.get(f'/diet/dishes/{dish_factory(user=user_factory()).id}/nutrients/').status_code == 404
@@ -0,0 +1,79 @@
+import pytest
+from decimal import Decimal
+from django.core.exceptions import ValidationError
+from diet.models import DishIngredient, Packaging
+from diet.services import save_dish_ingredients
+
+
+def dish_kcal(dish):
+    dish.refresh_from_db()
+    return dish.dish_kcal, dish.dish_weight_g
+
+
+@pytest.mark.django_db
+def test_dish_totals_follow_ingredient_changes(dish, product_factory, dish_ingredient_factory):
+    oats = product_factory(kcal_1g=Decimal("3.7"))
+    milk = product_factory(kcal_1g=Decimal("0.5"))
+
+    first = dish_ingredient_factory(dish=dish, product=oats, weight_in_g=Decimal("100"))
+    dish_ingredient_factory(dish=dish, product=milk, weight_in_g=Decimal("200"))
+    assert dish_kcal(dish) == (Decimal("470"), Decimal("300"))
+
+    first.weight_in_g = Decimal("50")
+    first.save()
+    assert dish_kcal(dish) == (Decimal("285"), Decimal("250"))
+
+    first.delete()
+    assert dish_kcal(dish) == (Decimal("100"), Decimal("200"))
+
+    milk.kcal_1g = Decimal("0.6")
+    milk.save()
+    assert dish_kcal(dish) == (Decimal("120"), Decimal("200"))
+
+
+@pytest.mark.django_db
+def test_save_dish_ingredients_validates_batch_once(dish, product_factory, django_assert_num_queries):
+    Packaging.objects.create(name="Szklanka", default_size="250", default_metric="ml")
+    products = product_factory.create_batch(3)
+    ingredients = [
+        DishIngredient(product=p, name_packaging="Szklanka", weight_in_g=Decimal("100")) for p in products
+    ]
+
+    # opakowania, produkty, insert, przeliczenie dania
+    with django_assert_num_queries(4):
+        save_dish_ingredients(dish, ingredients)
+
+    assert dish_kcal(dish) == (Decimal("750"), Decimal("300"))
+
+
+@pytest.mark.django_db
+def test_save_dish_ingredients_rejects_unknown_packaging(dish, product):
+    with pytest.raises(ValidationError) as exc:
+        save_dish_ingredients(dish, [DishIngredient(product=product, name_packaging="Wiadro", weight_in_g=Decimal("10"))])
+
+    assert exc.value.message_dict["code"] == ["packaging doesnt exist"]
+    assert not DishIngredient.objects.exists()
+
+
+@pytest.mark.django_db
+def test_dish_ingredients_endpoint(auth_api_client, dish_factory, product_factory, user_factory, django_assert_num_queries):
+    client, user = auth_api_client
+    dish = dish_factory(user=user)
+    Packaging.objects.create(name="Szklanka", default_size="250", default_metric="ml")
+    products = product_factory.create_batch(3)
+    payload = {"ingredients": [{"product_id": p.id, "name_packaging": "Szklanka", "weight_in_g": "100"} for p in products]}
+
+    # dish, opakowania, produkty, insert, przeliczenie dania
+    with django_assert_num_queries(5):
+        response = client.post(f'/diet/dishes/{dish.id}/ingredients/', payload, format='json')
+    assert response.status_code == 201, response.data
+    assert len(response.data) == 3
+    assert dish_kcal(dish) == (Decimal("750"), Decimal("300"))
+
+    private = product_factory(user=user_factory())
+    response = client.post(f'/diet/dishes/{dish.id}/ingredients/', {"ingredients": [{"product_id": private.id, "weight_in_g": "10"}]}, format='json')
+    assert response.status_code == 400
+    assert response.data["code"] == "product doesnt exist"
+
+    other = dish_factory(user=user_factory())
+    assert client.post(f'/diet/dishes/{other.id}/ingredients/', payload, format='json').status_code == 404
@@ -0,0 +1,204 @@
+import io
+import json
+import os
+import pytest
+from decimal import Decimal
+from django.core.management import call_command
+from diet.models import DishIngredient, Product, ProductAdditionalInfo, ProductCategory, ProductServingUnit
+
+
+def make_row(n, **overrides):
+    row = {
+        "id": f"590000000{n:04d}",
+        "name": f"Produkt {n}",
+        "brand": "Piątnica",
+        "category": "Nabiał" if n % 2 else "Napoje",
+        "nutriments_100g": {"energy_kcal": 250, "proteins": 10, "fat": 5.5, "carbohydrates": 40, "salt": 1.2},
+        "diet_flags": {"is_vegan": False, "is_vegetarian": True},
+        "additives": {"tags": ["e330"]},
+        "ingredients": "mleko\tśmietana",
+        "serving_g": 125 if n % 2 else None,
+    }
+    row.update(overrides)
+    return row
+
+
+@pytest.fixture
+def jsonl_file(tmp_path):
+    def factory(rows):
+        path = tmp_path / "products.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for row in rows:
+                f.write((row if isinstance(row, str) else json.dumps(row, ensure_ascii=False)) + "\n")
+        return path
+    return factory
+
+
+@pytest.mark.django_db
+def test_import_products_sequential(jsonl_file):
+    path = jsonl_file([make_row(n) for n in range(5)] + ["", "{broken"])
+
+    call_command("import_products", str(path), "--batch-size", "2", stdout=open(os.devnull, "w"))
+
+    assert Product.objects.count() == 5
+    assert ProductAdditionalInfo.objects.count() == 5
+    assert ProductServingUnit.objects.count() == 2
+    assert ProductCategory.objects.count() == 2
+
+    product = Product.objects.get(barcode="5900000000001")
+    assert product.kcal_1g == Decimal("2.5")
+    assert product.category.name == "Nabiał"
+    assert not os.path.exists(f"{path}.checkpoint")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_products_parallel_copy(jsonl_file):
+    path = jsonl_file([make_row(n) for n in range(7)])
+
+    call_command("import_products", str(path), "--workers", "2", "--batch-size", "3", stdout=open(os.devnull, "w"))
+
+    assert Product.objects.count() == 7
+    assert ProductAdditionalInfo.objects.count() == 7
+    assert ProductServingUnit.objects.count() == 3
+    assert ProductCategory.objects.count() == 2
+
+    product = Product.objects.select_related("additional_info").get(barcode="5900000000003")
+    assert product.fat_1g == Decimal("0.055")
+    assert product.brand == "Piątnica"
+    assert product.additional_info.ingredients_text == "mleko\tśmietana"
+    assert product.additional_info.additives_tags == ["e330"]
+    assert product.serving_units.get().gram_weight == Decimal("125")
+
+
+@pytest.mark.django_db
+def test_import_products_resumes_from_checkpoint(jsonl_file):
+    rows = [make_row(n) for n in range(4)]
+    path = jsonl_file(rows)
+    first_two = sum(len((json.dumps(r, ensure_ascii=False) + "\n").encode("utf-8")) for r in rows[:2])
+
+    with open(f"{path}.checkpoint", "w", encoding="utf-8") as f:
+        json.dump({"file": os.path.abspath(path), "offset": first_two, "count": 2}, f)
+
+    call_command("import_products", str(path), stdout=open(os.devnull, "w"))
+
+    assert sorted(Product.objects.values_list("title", flat=True)) == ["Produkt 2", "Produkt 3"]
+    assert not os.path.exists(f"{path}.checkpoint")
+
+
+@pytest.mark.django_db
+def test_import_products_reuses_existing_categories(jsonl_file, django_assert_max_num_queries):
+    existing = ProductCategory.objects.create(name="Nabiał")
+    path = jsonl_file([make_row(n) for n in range(6)])
+
+    with django_assert_max_num_queries(12):
+        call_command("import_products", str(path), "--batch-size", "6", stdout=open(os.devnull, "w"))
+
+    assert ProductCategory.objects.count() == 2
+    assert Product.objects.filter(category=existing).count() == 3
+
+
+@pytest.mark.django_db
+def test_import_products_skips_existing_barcodes(jsonl_file):
+    path = jsonl_file([make_row(n) for n in range(3)] + [make_row(1, name="Duplikat")])
+
+    call_command("import_products", str(path), stdout=open(os.devnull, "w"))
+    call_command("import_products", str(path), stdout=open(os.devnull, "w"))
+
+    assert Product.objects.count() == 3
+    assert Product.objects.get(barcode="5900000000001").title == "Produkt 1"
+
+
+@pytest.mark.django_db
+def test_import_products_ignores_user_barcodes(jsonl_file, user_factory):
+    user = user_factory()
+    Product.objects.create(
+        title="Mój produkt", barcode="5900000000001", user=user,
+        kcal_1g=1, protein_1g=0, fat_1g=0, carbohydrates_1g=0, salt_1g=0,
+    )
+    path = jsonl_file([make_row(n) for n in range(3)])
+
+    call_command("import_products", str(path), stdout=open(os.devnull, "w"))
+
+    assert Product.objects.filter(user__isnull=True).count() == 3
+    assert Product.objects.get(barcode="5900000000001", user=user).title == "Mój produkt"
+
+
+@pytest.mark.django_db
+def test_import_products_sync_updates_only_changed(jsonl_file):
+    path = jsonl_file([make_row(n) for n in range(4)])
+    call_command("import_products", str(path), "--sync", stdout=open(os.devnull, "w"))
+
+    unchanged = Product.objects.get(barcode="5900000000000")
+    changed = Product.objects.get(barcode="5900000000001")
+
+    rows = [make_row(n) for n in range(4)]
+    rows[1] = make_row(1, name="Nowa nazwa", serving_g=200, diet_flags={"is_vegan": True})
+    path = jsonl_file(rows + [make_row(4)])
+
+    out = io.StringIO()
+    call_command("import_products", str(path), "--sync", stdout=out)
+
+    assert "zapisano/zaktualizowano: 2" in out.getvalue()
+    assert Product.objects.count() == 5
+    assert ProductAdditionalInfo.objects.count() == 5
+
+    changed.refresh_from_db()
+    assert changed.title == "Nowa nazwa"
+    assert changed.additional_info.is_vegan is True
+    assert list(changed.serving_units.values_list("gram_weight", flat=True)) == [Decimal("200")]
+
+    assert Product.objects.get(pk=unchanged.pk).content_hash == unchanged.content_hash
+
+
+@pytest.mark.django_db
+def test_import_products_sync_keeps_serving_and_user_products(jsonl_file, user_factory, daily_meal_calendar_factory,
+                                                               meal_category_factory, meal_item_factory):
+    path = jsonl_file([make_row(1)])
+    call_command("import_products", str(path), "--sync", stdout=open(os.devnull, "w"))
+    serving = ProductServingUnit.objects.get()
+    user = user_factory()
+    breakfast = meal_category_factory(calendar=daily_meal_calendar_factory(user=user))
+    item = meal_item_factory(meal_category=breakfast, product_serving_unit=serving)
+    own = Product.objects.create(
+        title="Mój jogurt", barcode="5900000000002", user=user,
+        kcal_1g=1, protein_1g=0, fat_1g=0, carbohydrates_1g=0, salt_1g=0,
+    )
+
+    path = jsonl_file([make_row(1, serving_g=200), make_row(2)])
+    out = io.StringIO()
+    call_command("import_products", str(path), "--sync", stdout=out)
+
+    # Produkt użytkownika z tym samym kodem nie blokuje dodania go do katalogu
+    assert "zapisano/zaktualizowano: 2" in out.getvalue()
+    assert Product.objects.get(barcode="5900000000002", user__isnull=True).title == "Produkt 2"
+    serving.refresh_from_db()
+    assert serving.gram_weight == Decimal("200")
+    item.refresh_from_db()
+    assert item.product_serving_unit_id == serving.pk
+    own.refresh_from_db()
+    assert (own.title, own.user_id) == ("Mój jogurt", user.pk)
+
+
+@pytest.mark.django_db
+def test_import_products_sync_refreshes_dish_totals(jsonl_file, dish):
+    path = jsonl_file([make_row(0)])
+    call_command("import_products", str(path), "--sync", stdout=open(os.devnull, "w"))
+    DishIngredient.objects.create(dish=dish, product=Product.objects.get(), weight_in_g=Decimal("100"))
+
+    path = jsonl_file([make_row(0, nutriments_100g={"energy_kcal": 400, "proteins": 10, "fat": 5.5, "carbohydrates": 40, "salt": 1.2})])
+    call_command("import_products", str(path), "--sync", stdout=open(os.devnull, "w"))
+
+    dish.refresh_from_db()
+    assert dish.dish_kcal == Decimal("400")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_import_products_parallel_copy_skips_existing_barcodes(jsonl_file):
+    path = jsonl_file([make_row(n) for n in range(4)])
+    call_command("import_products", str(path), stdout=open(os.devnull, "w"))
+
+    path = jsonl_file([make_row(n) for n in range(6)] + [make_row(5)])
+    call_command("import_products", str(path), "--workers", "2", "--batch-size", "2", stdout=open(os.devnull, "w"))
+
+    assert Product.objects.count() == 6
+    assert ProductAdditionalInfo.objects.count() == 6
@@ -0,0 +1,132 @@
+import pytest
+from datetime import date, timedelta
+from decimal import Decimal
+from diet.services import get_daily_meal_plan
+
+
+@pytest.fixture
+def day(user_factory, daily_meal_calendar_factory, meal_category_factory, full_meal_factory):
+    user = user_factory()
+    calendar = daily_meal_calendar_factory(user=user)
+    breakfast = meal_category_factory(calendar=calendar, name="Śniadanie", order=1)
+    dinner = meal_category_factory(calendar=calendar, name="Obiad", order=2)
+    porridge = full_meal_factory(meal_category=breakfast)
+    return user, calendar, breakfast, dinner, porridge
+
+
+def totals(obj, prefix):
+    obj.refresh_from_db()
+    return getattr(obj, f'{prefix}kcal')
+
+
+@pytest.mark.django_db
+def test_rollups_follow_item_create_update_delete(day, meal_item_factory):
+    user, calendar, breakfast, dinner, porridge = day
+
+    oats = meal_item_factory(meal_category=breakfast, full_meal=porridge, kcal_1g=Decimal("3.7"), calculated_gram_weight=Decimal("100"))
+    milk = meal_item_factory(meal_category=breakfast, kcal_1g=Decimal("0.5"), calculated_gram_weight=Decimal("200"))
+    meal_item_factory(meal_category=dinner, kcal_1g=Decimal("1.2"), calculated_gram_weight=Decimal("250"))
+
+    assert totals(porridge, 'meal_') == Decimal("370")
+    assert totals(breakfast, 'category_') == Decimal("470")
+    assert totals(dinner, 'category_') == Decimal("300")
+    assert totals(calendar, 'total_day_') == Decimal("770")
+
+    oats.calculated_gram_weight = Decimal("50")
+    oats.save()
+    assert totals(porridge, 'meal_') == Decimal("185")
+    assert totals(calendar, 'total_day_') == Decimal("585")
+
+    milk.meal_category = dinner
+    milk.save()
+    assert totals(breakfast, 'category_') == Decimal("185")
+    assert totals(dinner, 'category_') == Decimal("400")
+    assert totals(calendar, 'total_day_') == Decimal("585")
+
+    oats.delete()
+    assert totals(porridge, 'meal_') == Decimal("0")
+    assert totals(breakfast, 'category_') == Decimal("0")
+    assert totals(calendar, 'total_day_') == Decimal("400")
+
+    dinner.delete()
+    assert totals(calendar, 'total_day_') == Decimal("0")
+
+
+@pytest.mark.django_db
+def test_daily_meals_detail_single_items_query(api_client, day, meal_item_factory, django_assert_num_queries):
+    user, calendar, breakfast, dinner, porridge = day
+    meal_item_factory(meal_category=breakfast, full_meal=porridge, kcal_1g=Decimal("3.7"), calculated_gram_weight=Decimal("100"))
+    meal_item_factory(meal_category=breakfast, kcal_1g=Decimal("0.5"), calculated_gram_weight=Decimal("200"))
+    api_client.force_authenticate(user=user)
+
+    # kalendarz, kategorie, posiłki, pozycje
+    with django_assert_num_queries(4):
+        response = api_client.get(f'/diet/daily-meals/?date={calendar.date}')
+
+    assert response.status_code == 200, response.data
+    assert response.data["total_day_kcal"] == "470.00"
+    breakfast_data = response.data["meals"][0]
+    assert breakfast_data["category_kcal"] == "470.00"
+    assert breakfast_data["full_meals"][0]["meal_kcal"] == "370.00"
+    assert breakfast_data["full_meals"][0]["products"][0]["total_kcal"] == "370.00"
+    assert len(breakfast_data["direct_items"]) == 1
+    assert response.data["meals"][1]["category_kcal"] == "0.00"
+
+    assert api_client.get(f'/diet/daily-meals/?date={calendar.date + timedelta(days=1)}').status_code == 404
+
+
+@pytest.mark.django_db
+def test_daily_meal_plan_serves_stored_rollups(day, meal_item_factory, django_assert_num_queries):
+    user, calendar, breakfast, dinner, porridge = day
+    meal_item_factory(meal_category=breakfast, full_meal=porridge, kcal_1g=Decimal("2"), calculated_gram_weight=Decimal("100"))
+
+    # kalendarz, kategorie, posiłki, pozycje - bez agregacji
+    with django_assert_num_queries(4):
+        plan = get_daily_meal_plan(user, calendar.date)
+
+    assert plan.total_day_kcal == Decimal("200")
+    assert plan.meals_list[0].category_kcal == Decimal("200")
+    assert plan.meals_list[0].full_meals_list[0].meal_kcal == Decimal("200")
+    assert plan.meals_list[0].full_meals_list[0].items_list[0].total_kcal == pytest.approx(200)
+    assert plan.meals_list[1].direct_items_list == []
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("days", [2, 14])
+def test_daily_meals_range_constant_queries(api_client, user_factory, daily_meal_calendar_factory, meal_category_factory,
+                                            full_meal_factory, meal_item_factory, django_assert_num_queries, days):
+    user = user_factory()
+    start = date(2026, 3, 1)
+    for offset in range(days):
+        calendar = daily_meal_calendar_factory(user=user, date=start + timedelta(days=offset))
+        category = meal_category_factory(calendar=calendar)
+        meal_item_factory(meal_category=category, full_meal=full_meal_factory(meal_category=category))
+        meal_item_factory(meal_category=category)
+    daily_meal_calendar_factory(user=user_factory(), date=start)
+    api_client.force_authenticate(user=user)
+
+    url = f'/diet/daily-meals/range/?start={start}&end={start + timedelta(days=days - 1)}'
+    with django_assert_num_queries(4):
+        response = api_client.get(url)
+
+    assert response.status_code == 200, response.data
+    assert [d["date"] for d in response.data] == [str(start + timedelta(days=i)) for i in range(days)]
+    assert response.data[0]["total_day_kcal"] == "740.00"
+    assert len(response.data[0]["meals"][0]["direct_items"]) == 1
+
+    with django_assert_num_queries(1):
+        response = api_client.get(url + '&totals_only=true')
+    assert response.data[0] == {
+        "id": response.data[0]["id"], "date": str(start), "total_day_kcal": "740.00", "total_day_protein": "26.00",
+        "total_day_fat": "14.00", "total_day_carbohydrates": "120.00", "total_day_salt": "0.20",
+    }
+
+
+@pytest.mark.django_db
+def test_daily_meals_range_validation(api_client, user_factory):
+    api_client.force_authenticate(user=user_factory())
+
+    assert api_client.get('/diet/daily-meals/range/?start=2026-03-01').status_code == 400
+    assert api_client.get('/diet/daily-meals/range/?start=2026-03-05&end=2026-03-01').status_code == 400
+    assert api_client.get('/diet/daily-meals/range/?start=2026-01-01&end=2026-12-31').status_code == 400
+    assert api_client.get('/diet/daily-meals/range/?start=2026-03-01&end=2026-03-01').data == []
@@ -0,0 +1,77 @@
+import pytest
+from decimal import Decimal
+from diet.nutrients import combine, get_product_vector, get_product_vectors, product_vector_cache
+from diet.services import build_meal_item, dish_nutrients
+from diet.utils import TTLCache
+
+
+@pytest.fixture(autouse=True)
+def clear_vector_cache():
+    product_vector_cache.clear()
+    yield
+    product_vector_cache.clear()
+
+
+@pytest.mark.django_db
+def test_product_vectors_loaded_once(product_factory, django_assert_num_queries):
+    products = product_factory.create_batch(3)
+    ids = [p.pk for p in products]
+    product_vector_cache.clear()
+
+    with django_assert_num_queries(1):
+        vectors = get_product_vectors(ids)
+    with django_assert_num_queries(0):
+        assert get_product_vectors(ids) == vectors
+
+    assert list(vectors[ids[0]]) == pytest.approx([2.5, 0.1, 0.05, 0.4, 0.01])
+
+
+@pytest.mark.django_db
+def test_product_vector_invalidated_on_save(product):
+    assert get_product_vector(product.pk)[0] == pytest.approx(2.5)
+
+    product.kcal_1g = Decimal("1.2")
+    product.save()
+
+    assert get_product_vector(product.pk)[0] == pytest.approx(1.2)
+
+
+def test_ttl_cache_is_size_bounded():
+    cache = TTLCache(maxsize=2, ttl=60)
+    for key in range(3):
+        cache.set(key, key)
+
+    assert cache.get(0) is None
+    assert cache.get(2) == 2
+
+
+@pytest.mark.django_db
+def test_combine_and_dish_scaling(product_factory, dish, dish_ingredient_factory, django_assert_num_queries):
+    oats = product_factory(kcal_1g=Decimal("3.7"), protein_1g=Decimal("0.13"))
+    milk = product_factory(kcal_1g=Decimal("0.5"), protein_1g=Decimal("0.03"))
+    dish_ingredient_factory(dish=dish, product=oats, weight_in_g=Decimal("100"))
+    dish_ingredient_factory(dish=dish, product=milk, weight_in_g=Decimal("300"))
+    product_vector_cache.clear()
+
+    assert combine([(oats.pk, 100), (milk.pk, 300)])[:2].tolist() == pytest.approx([520, 22])
+
+    # Wektory produktów są już w cache - zostaje tylko zapytanie o składniki
+    with django_assert_num_queries(1):
+        portion = dish_nutrients(dish, grams=200)
+    assert portion[0] == pytest.approx(260)
+    assert portion[1] == pytest.approx(11)
+
+
+@pytest.mark.django_db
+def test_build_meal_item_from_product(product, meal_category_factory, daily_meal_calendar_factory, user_factory):
+    category = meal_category_factory(calendar=daily_meal_calendar_factory(user=user_factory()))
+
+    item = build_meal_item(category, product, Decimal("150"))
+    item.save()
+    item.refresh_from_db()
+
+    assert item.name == product.title
+    assert item.kcal_1g == product.kcal_1g
+    assert item.salt_1g == product.salt_1g
+    category.refresh_from_db()
+    assert category.category_kcal == Decimal("375")
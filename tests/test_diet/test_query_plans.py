@@ -0,0 +1,118 @@
+import json
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from diet.models import Product, ProductCategory
+from diet.search import SEARCH_CONFIGS
+
+
+PRODUCTS = 50000
+SEARCH_INDEXES = {'product_search_vector_gin', 'product_title_trgm', *(f'product_search_{lang}' for lang in SEARCH_CONFIGS)}
+PER_GRAM = dict(kcal_1g=1, protein_1g=0, fat_1g=0, carbohydrates_1g=0, salt_1g=0)
+
+
+@pytest.fixture
+def catalog():
+    """
+    Katalog wielkości zbliżonej do importu - na kilku tysiącach wierszy przejście całego indeksu
+    user_id wychodzi taniej niż GIN i plan nie mówi nic o produkcji. Szukana fraza pasuje do kilku produktów.
+    Statystyki indeksów GIN uzupełnia dopiero VACUUM (na produkcji autovacuum) - bez nich koszt skanu
+    trigramów jest zawyżony i planner losowo wybiera pełny indeks category_id.
+    """
+    dairy = ProductCategory.objects.create(name="Nabiał")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO diet_product (title, brand, barcode, kcal_1g, protein_1g, fat_1g, carbohydrates_1g, salt_1g,
+                                      allergens, countries)
+            SELECT 'Chleb ' || g, 'Piekarnia', lpad(g::text, 13, '0'), 1, 0, 0, 0, 0, '[]', '[]'
+            FROM generate_series(1, %s) g
+            """,
+            [PRODUCTS],
+        )
+    Product.objects.bulk_create(
+        [Product(title=f"Jogurt naturalny {n}", brand="Bakoma", **PER_GRAM) for n in range(3)]
+        + [Product(title=f"Masło {n}", category=dairy, **PER_GRAM) for n in range(3)]
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('VACUUM ANALYZE diet_product, diet_productcategory')
+
+
+def search_plan_problems(sql, indexes=SEARCH_INDEXES):
+    """
+    Wyszukiwanie ma iść po indeksach wyszukiwarki (BitmapOr GIN + FK kategorii). Przy wyłączonym
+    seq scan planner zamiast tego potrafi przejść cały indeks user_id albo category_id - to też błąd.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    nodes, used, problems = [plan[0]['Plan']], set(), []
+    while nodes:
+        node = nodes.pop()
+        nodes.extend(node.get('Plans', []))
+        used.add(node.get('Index Name'))
+        if node.get('Relation Name') == 'diet_product' and node['Node Type'] == 'Seq Scan':
+            problems.append('Seq Scan on diet_product')
+
+    if not used & indexes:
+        problems.append(f'no search index used: {sorted(filter(None, used))}')
+    return problems
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('query', ['jogurt&lang=pl', 'jogurt&lang=en', 'nabiał&lang=pl', 'nabiał&lang=en'])
+def test_product_search_plans(auth_api_client, catalog, query):
+    client, user = auth_api_client
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(f'/diet/products/?search={query}')
+    assert response.status_code == 200
+    assert response.data['results']
+
+    problems = {q['sql']: search_plan_problems(q['sql']) for q in ctx.captured_queries if 'FROM "diet_product"' in q['sql']}
+    assert problems
+    assert not any(problems.values()), problems
+
+
+@pytest.mark.django_db(transaction=True)
+def test_product_barcode_search_plan(auth_api_client, catalog):
+    client, user = auth_api_client
+    product = Product.objects.create(title="Twaróg", barcode="5901234567893", **PER_GRAM)
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT indexname FROM pg_indexes WHERE tablename = 'diet_product' AND indexdef LIKE '%%(barcode%%'")
+        barcode_indexes = {row[0] for row in cursor.fetchall()}
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/diet/products/?search=5901234567893')
+    assert [p['id'] for p in response.data['results']] == [product.id]
+
+    problems = {
+        q['sql']: search_plan_problems(q['sql'], barcode_indexes)
+        for q in ctx.captured_queries if 'FROM "diet_product"' in q['sql']
+    }
+    assert problems
+    assert not any(problems.values()), problems
+
+
+@pytest.mark.django_db(transaction=True)
+def test_product_category_search_plan(auth_api_client, catalog):
+    client, user = auth_api_client
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/diet/products/?search=nabial')
+    assert response.data['results']
+
+    problems = {
+        q['sql']: search_plan_problems(q['sql'], {'product_category_name_trgm'})
+        for q in ctx.captured_queries if 'FROM "diet_productcategory"' in q['sql']
+    }
+    assert problems
+    assert not any(problems.values()), problems
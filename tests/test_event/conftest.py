@@ -1,9 +1,18 @@
 from django.utils import timezone
 from datetime import timedelta
 import pytest
+from django.core.cache import cache
 from .factories import EventFactory, UserFactory, EventInvitationFactory, EventParticipantFactory
 from pytest_factoryboy import register
 
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Klastry mapy i szczegóły eventów siedzą w cache - każdy test zaczyna od pustego."""
+    cache.clear()
+    yield
+    cache.clear()
+
+
 @pytest.fixture
 def event_payload_factory():
     def factory(**overrides):
@@ -0,0 +1,78 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIRequestFactory
+from event.access import resolve_event_role
+from event.models import Event
+
+
+def make_request(user):
+    request = APIRequestFactory().get('/')
+    request.user = user
+    return request
+
+
+@pytest.mark.django_db
+def test_role_is_memoized_per_request_and_cached_per_user_event(event_factory, user_factory, event_participant_factory):
+    event = event_factory(author=user_factory())
+    trainer = event_participant_factory(event=event, user=user_factory(), role='trainer')
+    stranger = user_factory()
+
+    request = make_request(trainer.user)
+    with CaptureQueriesContext(connection) as ctx:
+        assert resolve_event_role(request, event.id) == 'trainer'
+        assert resolve_event_role(request, str(event.id)) == 'trainer'
+    assert len(ctx.captured_queries) == 1
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert resolve_event_role(make_request(trainer.user), event.id) == 'trainer'
+        assert resolve_event_role(make_request(event.author), event.id) == 'author'
+        assert resolve_event_role(make_request(stranger), event.id) is None
+    assert len(ctx.captured_queries) == 2
+
+    with pytest.raises(Event.DoesNotExist):
+        resolve_event_role(make_request(stranger), 999999)
+
+
+@pytest.mark.django_db
+def test_cached_role_follows_role_changes(api_client, event_factory, user_factory, event_participant_factory):
+    event = event_factory(author=user_factory())
+    member = event_participant_factory(event=event, user=user_factory())
+    participants_url = f'/event/{event.id}/event-participant-list/'
+
+    api_client.force_authenticate(user=member.user)
+    assert api_client.get(participants_url).status_code == 403
+
+    api_client.force_authenticate(user=event.author)
+    response = api_client.post(f'/event/{event.id}/change-role/{member.id}/', {'new_role': 'admin'}, format='json')
+    assert response.status_code == 200
+
+    api_client.force_authenticate(user=member.user)
+    assert api_client.get(participants_url).status_code == 200
+
+    api_client.force_authenticate(user=event.author)
+    assert api_client.post(f'{participants_url}bulk-remove/', {'participant_ids': [member.id]}, format='json').status_code == 200
+
+    api_client.force_authenticate(user=member.user)
+    assert api_client.get(participants_url).status_code == 403
+
+
+@pytest.mark.django_db
+def test_sub_resources_check_permission_once(api_client, event_factory, user_factory, event_participant_factory, event_invitation_factory):
+    event = event_factory(author=user_factory())
+    admin = event_participant_factory(event=event, user=user_factory(), role='admin')
+    invitation = event_invitation_factory(event=event, created_by=event.author)
+    api_client.force_authenticate(user=admin.user)
+
+    with CaptureQueriesContext(connection) as ctx:
+        assert api_client.get(f'/event/events/{event.id}/invitations/').status_code == 200
+    role_queries = [q for q in ctx.captured_queries if 'CASE WHEN' in q['sql']]
+    assert len(role_queries) == 1
+
+    # Kolejny request tego samego usera bierze rolę z cache
+    with CaptureQueriesContext(connection) as ctx:
+        assert api_client.get(f'/event/{event.id}/event-participant-list/').status_code == 200
+    assert not any('CASE WHEN' in q['sql'] for q in ctx.captured_queries)
+
+    assert api_client.post(f'/event/events/{event.id}/invitations/{invitation.id}/deactivate/').status_code == 403
+    assert api_client.get('/event/999999/event-participant-list/').status_code == 404
@@ -1,10 +1,13 @@
+import io
 import pytest
 from django.utils import timezone
 from datetime import timedelta
-from event.models import Event, EventInvitation
+from event.models import Event, EventInvitation, Category
 from .factories import EventFactory
 import threading
-from django.db import connections
+from django.db import connection, connections
+from django.core.management import call_command
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient
 
 
@@ -361,4 +364,115 @@ def test_quit_from_event(auth_api_client, user_factory, event_factory, event_par
     url = f'/event/events/{event.id}/quit_from_event/'
     response = client.post(url)
 
-    assert response.status_code == 200, f'blad {response.data}'
\ No newline at end of file
+    assert response.status_code == 200, f'blad {response.data}'
+
+
+@pytest.mark.django_db
+def test_event_keyset_pagination(api_client, event_factory, user_factory):
+    user = user_factory()
+    same_time = timezone.now() + timedelta(days=1)
+    events = event_factory.create_batch(25, author=user, date_time_event=same_time)
+    events += event_factory.create_batch(20, author=user, date_time_event=same_time + timedelta(hours=1))
+    expected = [e.id for e in events]
+
+    response = api_client.get('/event/events/?cursor=', format="json")
+    assert response.status_code == 200
+    assert "count" not in response.data
+    assert response.data["previous"] is None
+
+    seen = [e["id"] for e in response.data["results"]]
+    pages = [response.data]
+    while response.data["next"]:
+        response = api_client.get(response.data["next"], format="json")
+        pages.append(response.data)
+        seen += [e["id"] for e in response.data["results"]]
+
+    assert seen == expected
+    assert [len(p["results"]) for p in pages] == [20, 20, 5]
+
+    response = api_client.get(pages[2]["previous"], format="json")
+    assert [e["id"] for e in response.data["results"]] == expected[20:40]
+    assert response.data["next"] is not None
+
+    response = api_client.get('/event/events/?cursor=&with_count=true', format="json")
+    assert response.data["count"] == 45
+
+    assert api_client.get('/event/events/?cursor=nonsense', format="json").status_code == 404
+
+@pytest.mark.django_db
+def test_event_list_visibility_without_join_distinct(auth_api_client, event_factory, user_factory, event_participant_factory):
+    client, user = auth_api_client
+    other = user_factory()
+    public = event_factory(author=other, public_event=True)
+    own = event_factory(author=user, public_event=False)
+    joined = event_factory(author=other, public_event=False)
+    event_factory(author=other, public_event=False)
+    for participant in user_factory.create_batch(3):
+        event_participant_factory(event=joined, user=participant)
+    event_participant_factory(event=joined, user=user)
+    event_participant_factory(event=public, user=user)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/event/events/', format="json")
+
+    assert sorted(e["id"] for e in response.data["results"]) == sorted([public.id, own.id, joined.id])
+    assert response.data["count"] == 3
+    event_queries = [q["sql"] for q in ctx.captured_queries if 'FROM "event_event"' in q["sql"]]
+    assert event_queries
+    assert not any("DISTINCT" in sql for sql in event_queries)
+    assert not any('JOIN "event_eventparticipant"' in sql for sql in event_queries)
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_event_visibility_command_after_sequence_gap(event_factory, user_factory):
+    # Usunięty ostatni wiersz zostawia dziurę w sekwencji - max(id) + 1 wskazałby złe id
+    event = event_factory(author=user_factory())
+    event.delete()
+    event.author.delete()
+
+    out = io.StringIO()
+    call_command('bench_event_visibility', '--events', '50', '--participants', '200', '--users', '20', '--runs', '1', stdout=out)
+
+    assert "Dane: 50 wydarzeń, 200 uczestników, 20 userów" in out.getvalue()
+    assert "Exists count" in out.getvalue()
+    assert not Event.objects.filter(title='bench').exists()
+
+@pytest.mark.django_db
+def test_event_search_ranked_by_relevance_then_date(api_client, event_factory, user_factory):
+    author = user_factory()
+    soon = timezone.now() + timedelta(hours=1)
+    yoga = Category.objects.create(name="Joga")
+    stretching = Category.objects.create(name="Stretching")
+
+    in_desc = event_factory(author=author, title="Poranny trening", short_desc="Joga i rozciąganie", date_time_event=soon)
+    in_title_late = event_factory(author=author, title="Joga nad Wisłą", date_time_event=soon + timedelta(days=2))
+    in_title_early = event_factory(author=author, title="Joga nad Wisłą", date_time_event=soon + timedelta(days=1))
+    typo = event_factory(author=author, title="Zumba", date_time_event=soon)
+    by_category = event_factory(author=author, title="Sesja", category=yoga, date_time_event=soon)
+    event_factory(author=author, title="Crossfit", short_desc="Siłownia")
+    stretch = event_factory(author=author, title="Wieczór", category=stretching, date_time_event=soon)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.get('/event/events/?search=joga', format="json")
+    ids = [e["id"] for e in response.data["results"]]
+
+    assert ids[:3] == [in_title_early.id, in_title_late.id, in_desc.id]
+    assert set(ids) == {in_title_early.id, in_title_late.id, in_desc.id, by_category.id}
+    assert not any("DISTINCT" in q["sql"] for q in ctx.captured_queries)
+
+    ids = [e["id"] for e in api_client.get('/event/events/?search=zumbba', format="json").data["results"]]
+    assert ids == [typo.id]
+
+    ids = [e["id"] for e in api_client.get('/event/events/?search=stretch', format="json").data["results"]]
+    assert ids == [stretch.id]
+
+@pytest.mark.django_db
+def test_event_search_keeps_relevance_with_cursor(api_client, event_factory, user_factory):
+    author = user_factory()
+    soon = timezone.now() + timedelta(hours=1)
+    weak = event_factory(author=author, title="Trening", short_desc="Bieganie", date_time_event=soon)
+    strong = event_factory(author=author, title="Bieganie", date_time_event=soon + timedelta(days=1))
+
+    response = api_client.get('/event/events/?search=bieganie&cursor=', format="json")
+
+    assert [e["id"] for e in response.data["results"]] == [strong.id, weak.id]
+    assert response.data["count"] == 2
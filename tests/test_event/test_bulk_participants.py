@@ -0,0 +1,97 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from event.models import Event, EventParticipant
+from event.services import update_participants
+
+
+@pytest.fixture
+def crowded_event(event_factory, user_factory, event_participant_factory):
+    event = event_factory(author=user_factory())
+    participants = [event_participant_factory(event=event, user=user) for user in user_factory.create_batch(6)]
+    return event, participants
+
+
+def url(event, action):
+    return f'/event/{event.id}/event-participant-list/{action}/'
+
+
+@pytest.mark.django_db
+def test_bulk_remove_is_one_permission_check_and_one_statement(api_client, crowded_event, event_factory, user_factory, event_participant_factory):
+    event, participants = crowded_event
+    other_event = event_factory(author=event.author)
+    foreign = event_participant_factory(event=other_event, user=user_factory())
+    api_client.force_authenticate(user=event.author)
+    ids = [p.id for p in participants[:4]] + [foreign.id]
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.post(url(event, 'bulk-remove'), {'participant_ids': ids}, format='json')
+
+    assert response.status_code == 200
+    assert response.data['count'] == 4
+    assert len(ctx.captured_queries) == 2
+    assert set(event.eventparticipant.values_list('id', flat=True)) == {p.id for p in participants[4:]}
+    assert Event.objects.get(pk=event.pk).participant_count == 2
+    assert EventParticipant.objects.filter(pk=foreign.pk).exists()
+    assert Event.objects.get(pk=other_event.pk).participant_count == 1
+
+
+@pytest.mark.django_db
+def test_bulk_role_and_status(api_client, crowded_event, event_participant_factory, user_factory):
+    event, participants = crowded_event
+    trainer = event_participant_factory(event=event, user=user_factory(), role='trainer')
+    api_client.force_authenticate(user=trainer.user)
+    ids = [p.id for p in participants[:3]]
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.post(url(event, 'bulk-role'), {'participant_ids': ids, 'new_role': 'admin'}, format='json')
+    assert response.status_code == 200
+    assert response.data['count'] == 3
+    assert len(ctx.captured_queries) == 2
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.post(url(event, 'bulk-status'), {'participant_ids': ids, 'paid_status': True, 'presence': None}, format='json')
+    assert response.status_code == 200
+    assert len(ctx.captured_queries) == 2
+
+    rows = set(EventParticipant.objects.filter(pk__in=ids).values_list('role', 'paid_status', 'presence'))
+    assert rows == {('admin', True, None)}
+    assert not EventParticipant.objects.filter(pk=participants[3].pk, paid_status=True).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_participant_permissions_and_validation(api_client, crowded_event):
+    event, participants = crowded_event
+    ids = [p.id for p in participants]
+
+    # Zwykły uczestnik niczego nie zmienia, admin/trener nie usuwa
+    api_client.force_authenticate(user=participants[0].user)
+    response = api_client.post(url(event, 'bulk-status'), {'participant_ids': ids, 'presence': False}, format='json')
+    assert response.status_code == 403
+    assert response.data['code'] == 'no_permissions'
+
+    update_participants(event.id, [participants[0].pk], role='admin')
+    assert api_client.post(url(event, 'bulk-remove'), {'participant_ids': ids}, format='json').status_code == 403
+    assert event.eventparticipant.count() == 6
+
+    response = api_client.post(url(event, 'bulk-status'), {'participant_ids': ids}, format='json')
+    assert response.status_code == 400
+    assert api_client.post(url(event, 'bulk-role'), {'participant_ids': ids, 'new_role': 'king'}, format='json').status_code == 400
+    assert api_client.post(url(event, 'bulk-role'), {'participant_ids': [], 'new_role': 'admin'}, format='json').status_code == 400
+    assert api_client.post('/event/999999/event-participant-list/bulk-role/', {'participant_ids': ids, 'new_role': 'admin'}, format='json').status_code == 404
+
+
+@pytest.mark.django_db
+def test_bulk_status_refreshes_cached_detail(api_client, crowded_event, event_participant_factory, user_factory):
+    event, _ = crowded_event
+    trainer = event_participant_factory(event=event, user=user_factory(), role='trainer')
+    api_client.force_authenticate(user=trainer.user)
+
+    response = api_client.get(f'/event/events/{event.id}/')
+    assert response.data['trainer_list'][0]['paid_status'] is False
+
+    response = api_client.post(url(event, 'bulk-status'), {'participant_ids': [trainer.id], 'paid_status': True}, format='json')
+    assert response.status_code == 200
+
+    response = api_client.get(f'/event/events/{event.id}/')
+    assert response.data['trainer_list'][0]['paid_status'] is True
@@ -0,0 +1,67 @@
+import pytest
+from event.models import EventAdditionalInfo
+
+
+@pytest.fixture
+def detail_event(event_factory, user_factory):
+    event = event_factory(author=user_factory(), title="Bieg")
+    EventAdditionalInfo.objects.create(event=event, places_for_people_limit=10)
+    return event
+
+
+@pytest.mark.django_db
+def test_event_detail_served_from_cache_with_per_user_role(api_client, user_factory, detail_event, event_participant_factory, django_assert_num_queries):
+    trainer = user_factory()
+    event_participant_factory(event=detail_event, user=trainer, role='trainer')
+    url = f'/event/events/{detail_event.id}/'
+
+    api_client.force_authenticate(user=user_factory())
+    first = api_client.get(url).data
+    assert first['role_in_event'] is None
+
+    with django_assert_num_queries(1):
+        response = api_client.get(url)
+    assert response.data == first
+
+    api_client.force_authenticate(user=trainer)
+    with django_assert_num_queries(1):
+        response = api_client.get(url)
+    assert response.data['role_in_event'] == 'trainer'
+    assert response.data['title'] == 'Bieg'
+
+
+@pytest.mark.django_db
+def test_event_detail_cache_invalidated_on_writes(api_client, user_factory, detail_event):
+    url = f'/event/events/{detail_event.id}/'
+    user = user_factory()
+    api_client.force_authenticate(user=user)
+    assert api_client.get(url).data['event_participant_count'] == 0
+
+    assert api_client.post(f'{url}join_to_public_event/').status_code == 200
+    response = api_client.get(url)
+    assert response.data['event_participant_count'] == 1
+    assert response.data['role_in_event'] == 'participant'
+
+    assert api_client.post(f'{url}quit_from_event/').status_code == 200
+    assert api_client.get(url).data['event_participant_count'] == 0
+
+    api_client.force_authenticate(user=detail_event.author)
+    response = api_client.patch(url, {'title': 'Maraton', 'additional_info': {'price': '15.00'}}, format='json')
+    assert response.status_code == 200, response.data
+
+    response = api_client.get(url)
+    assert response.data['title'] == 'Maraton'
+    assert response.data['additional_info']['price'] == '15.00'
+
+
+@pytest.mark.django_db
+def test_event_detail_cache_respects_visibility(api_client, user_factory, event_factory):
+    private = event_factory(author=user_factory(), public_event=False)
+    url = f'/event/events/{private.id}/'
+
+    api_client.force_authenticate(user=private.author)
+    assert api_client.get(url).status_code == 200
+
+    api_client.force_authenticate(user=user_factory())
+    assert api_client.get(url).status_code == 404
+    assert api_client.get('/event/events/abc/').status_code == 404
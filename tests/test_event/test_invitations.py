@@ -0,0 +1,180 @@
+import threading
+import pytest
+from datetime import timedelta
+from django.db import IntegrityError, connection, connections
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from event import services
+from event.models import Event, EventAdditionalInfo, EventInvitation
+from event.services import (create_invitation, create_invitations, redeem_invitation, INVITATION_CODE_ALPHABET,
+                            JOINED, ALREADY_JOINED, FULL, INVALID_INVITATION)
+
+
+def invitation_queries(ctx):
+    return [q['sql'] for q in ctx.captured_queries if 'event_eventinvitation' in q['sql']]
+
+
+@pytest.mark.django_db
+def test_invitation_insert_without_probing_query(auth_api_client, event_factory):
+    client, user = auth_api_client
+    event = event_factory(author=user)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.post(f'/event/events/{event.id}/invitations/', {'is_one_use': True, 'is_active': True}, format='json')
+
+    assert response.status_code == 201
+    queries = invitation_queries(ctx)
+    assert len(queries) == 1 and queries[0].startswith('INSERT')
+    code = EventInvitation.objects.get().code
+    assert len(code) == 8 and set(code) <= set(INVITATION_CODE_ALPHABET)
+
+
+@pytest.mark.django_db
+def test_invitation_code_collision_is_retried(monkeypatch, event_factory, user_factory, event_invitation_factory):
+    author = user_factory()
+    event = event_factory(author=author)
+    event_invitation_factory(event=event, created_by=author, code='TAKEN000')
+
+    codes = iter(['TAKEN000', 'FRESH000'])
+    monkeypatch.setattr(services, 'generate_invitation_code', lambda: next(codes))
+
+    invitation = create_invitation(event, author, is_one_use=True)
+
+    assert invitation.code == 'FRESH000'
+    assert EventInvitation.objects.filter(event=event).count() == 2
+
+
+@pytest.mark.django_db
+def test_invitation_gives_up_after_repeated_collisions(monkeypatch, event_factory, user_factory, event_invitation_factory):
+    author = user_factory()
+    event = event_factory(author=author)
+    event_invitation_factory(event=event, created_by=author, code='TAKEN000')
+    monkeypatch.setattr(services, 'generate_invitation_code', lambda: 'TAKEN000')
+
+    with pytest.raises(IntegrityError):
+        create_invitations(event, author, 1)
+
+
+@pytest.mark.django_db
+def test_bulk_invitations_in_one_insert(auth_api_client, event_factory):
+    client, user = auth_api_client
+    event = event_factory(author=user)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.post(f'/event/events/{event.id}/invitations/bulk/', {'count': 300}, format='json')
+
+    assert response.status_code == 201
+    assert len(response.data) == 300
+    assert all(inv['is_one_use'] and inv['is_valid'] for inv in response.data)
+    assert len(invitation_queries(ctx)) == 1
+    assert EventInvitation.objects.filter(event=event, is_one_use=True).values('code').distinct().count() == 300
+
+
+@pytest.mark.django_db
+def test_bulk_invitations_only_for_author(auth_api_client, event_factory, user_factory):
+    client, user = auth_api_client
+    event = event_factory(author=user_factory())
+
+    response = client.post(f'/event/events/{event.id}/invitations/bulk/', {'count': 5}, format='json')
+    assert response.status_code == 403
+
+    event = event_factory(author=user)
+    response = client.post(f'/event/events/{event.id}/invitations/bulk/', {'count': 501}, format='json')
+    assert response.status_code == 400
+    assert not EventInvitation.objects.exists()
+
+
+@pytest.fixture
+def invited_event(event_factory, user_factory):
+    def factory(limit=100, **kwargs):
+        author = user_factory()
+        event = event_factory(author=author, public_event=False, **kwargs)
+        EventAdditionalInfo.objects.create(event=event, places_for_people_limit=limit)
+        return event
+    return factory
+
+
+@pytest.mark.django_db
+def test_redemption_fits_in_three_queries(api_client, user_factory, invited_event):
+    event = invited_event()
+    invitation = create_invitation(event, event.author, is_one_use=True, is_active=True)
+    api_client.force_authenticate(user=user_factory())
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.post('/event/event-inv-join/', {'code': invitation.code}, format='json')
+
+    assert response.status_code == 200
+    assert len(ctx.captured_queries) <= 3
+    invitation.refresh_from_db()
+    assert invitation.is_used
+    assert Event.objects.get(pk=event.pk).participant_count == 1
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = api_client.post('/event/event-inv-join/', {'code': 'NOPE0000'}, format='json')
+
+    assert response.status_code == 400
+    assert response.data['code'] == 'invalid_invitation_code'
+    assert len(ctx.captured_queries) <= 3
+
+
+@pytest.mark.django_db
+def test_redemption_rules(user_factory, invited_event, event_participant_factory):
+    event = invited_event(limit=2)
+    one_use = create_invitation(event, event.author, is_one_use=True, is_active=True)
+    member = user_factory()
+    event_participant_factory(event=event, user=member)
+
+    # Już zapisany nie zużywa kodu jednorazowego
+    assert redeem_invitation(one_use.code, member.pk) == (ALREADY_JOINED, event.pk)
+    assert redeem_invitation(one_use.code, user_factory().pk) == (JOINED, event.pk)
+    assert redeem_invitation(one_use.code, user_factory().pk) == (INVALID_INVITATION, None)
+
+    reusable = create_invitation(event, event.author, is_one_use=False, is_active=True)
+    assert redeem_invitation(reusable.code, user_factory().pk) == (FULL, event.pk)
+    assert not EventInvitation.objects.get(pk=reusable.pk).is_used
+
+    inactive = create_invitation(event, event.author, is_active=False)
+    assert redeem_invitation(inactive.code, user_factory().pk) == (INVALID_INVITATION, None)
+
+    past = invited_event(date_time_event=timezone.now() - timedelta(hours=1))
+    expired = create_invitation(past, past.author, is_active=True)
+    assert redeem_invitation(expired.code, user_factory().pk) == (INVALID_INVITATION, None)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_one_use_redemptions(user_factory, invited_event):
+    event = invited_event(limit=12)
+    invitations = create_invitations(event, event.author, 15, is_one_use=True, is_active=True)
+    # Każdy kod próbuje wykorzystać dwóch userów naraz
+    attempts = [(invitation.code, user) for invitation in invitations for user in user_factory.create_batch(2)]
+    results = []
+    barrier = threading.Barrier(len(attempts))
+
+    def redeem(code, user):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        try:
+            barrier.wait()
+            response = client.post('/event/event-inv-join/', {'code': code}, format='json')
+            results.append((code, response.status_code, response.data))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=redeem, args=attempt) for attempt in attempts]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    successes = [code for code, status_code, _ in results if status_code == 200]
+    assert len(successes) == 12
+    assert len(set(successes)) == 12
+    # Drugi user kodu już wykorzystanego dostaje invalid, obie próby z 3 niewykorzystanych kodów - brak miejsc
+    assert sum(1 for _, _, data in results if data.get('code') == 'invalid_invitation_code') == 12
+    assert sum(1 for _, _, data in results if data.get('detail') == 'No seats available') == 6
+
+    event.refresh_from_db()
+    assert event.participant_count == 12
+    assert event.eventparticipant.count() == 12
+    assert set(EventInvitation.objects.filter(is_used=True).values_list('code', flat=True)) == set(successes)
@@ -0,0 +1,123 @@
+import pytest
+from django.db import connection
+from django.utils import timezone
+from datetime import timedelta
+from event.models import Event
+from event.geo import in_bbox, radius_bbox
+
+
+MAP_URL = '/event/events/events_on_map/'
+
+
+@pytest.fixture
+def city_events(event_factory, user_factory):
+    author = user_factory()
+    krakow = event_factory(author=author, latitude=50.06, longitude=19.94)
+    katowice = event_factory(author=author, latitude=50.26, longitude=19.02)
+    warsaw = event_factory(author=author, latitude=52.23, longitude=21.01)
+    event_factory(author=author, latitude=50.07, longitude=19.95, public_event=False)
+    event_factory(author=author, latitude=50.05, longitude=19.93, date_time_event=timezone.now() - timedelta(days=1))
+    return krakow, katowice, warsaw
+
+
+@pytest.mark.django_db
+def test_events_on_map_bbox(api_client, user_factory, city_events):
+    krakow, katowice, warsaw = city_events
+    api_client.force_authenticate(user=user_factory())
+
+    response = api_client.get(MAP_URL, {'bbox': '18.5,49.5,20.5,50.5'})
+
+    assert response.status_code == 200, response.data
+    assert {e['id'] for e in response.data} == {krakow.id, katowice.id}
+
+
+@pytest.mark.django_db
+def test_events_on_map_radius(api_client, user_factory, city_events):
+    krakow, katowice, warsaw = city_events
+    api_client.force_authenticate(user=user_factory())
+
+    response = api_client.get(MAP_URL, {'lat': 50.06, 'lng': 19.94, 'radius_km': 30})
+    assert [e['id'] for e in response.data] == [krakow.id]
+
+    response = api_client.get(MAP_URL, {'lat': 50.06, 'lng': 19.94, 'radius_km': 80})
+    assert {e['id'] for e in response.data} == {krakow.id, katowice.id}
+
+
+@pytest.mark.django_db
+def test_events_on_map_requires_viewport(api_client, user_factory):
+    api_client.force_authenticate(user=user_factory())
+
+    assert api_client.get(MAP_URL).status_code == 400
+    assert api_client.get(MAP_URL, {'bbox': '1,2,3'}).status_code == 400
+    assert api_client.get(MAP_URL, {'bbox': '0,60,10,50'}).status_code == 400
+    assert api_client.get(MAP_URL, {'lat': 50, 'lng': 19}).status_code == 400
+
+
+@pytest.mark.django_db
+def test_events_on_map_bbox_across_antimeridian(event_factory, user_factory):
+    author = user_factory()
+    fiji = event_factory(author=author, latitude=-17.7, longitude=178.0)
+    samoa = event_factory(author=author, latitude=-13.8, longitude=-172.1)
+    event_factory(author=author, latitude=-17.7, longitude=0.0)
+
+    qs = Event.objects.filter(in_bbox(170, -20, -170, -10))
+    assert set(qs.values_list('id', flat=True)) == {fiji.id, samoa.id}
+    assert radius_bbox(0, 179.9, 50)[0] > radius_bbox(0, 179.9, 50)[2]
+
+
+@pytest.mark.django_db
+def test_events_on_map_bbox_uses_gist_index():
+    qs = Event.objects.filter(in_bbox(18.5, 49.5, 20.5, 50.5), public_event=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        plan = qs.explain()
+        cursor.execute('RESET enable_seqscan')
+
+    assert 'event_public_location_gist' in plan
+
+
+@pytest.mark.django_db
+def test_events_on_map_clusters_when_zoomed_out(api_client, user_factory, city_events, django_assert_num_queries):
+    krakow, katowice, warsaw = city_events
+    api_client.force_authenticate(user=user_factory())
+    params = {'bbox': '14,49,24,55', 'zoom': 2}
+
+    response = api_client.get(MAP_URL, params)
+    assert response.status_code == 200, response.data
+    assert [c['count'] for c in response.data] == [3]
+    assert response.data[0]['id'] is None
+    assert response.data[0]['latitude'] == pytest.approx((50.06 + 50.26 + 52.23) / 3)
+
+    with django_assert_num_queries(0):
+        assert api_client.get(MAP_URL, params).data == response.data
+
+    response = api_client.get(MAP_URL, {'bbox': '18,49.5,22,52.5', 'zoom': 8})
+    assert sorted(c['count'] for c in response.data) == [1, 1, 1]
+    assert {c['id'] for c in response.data} == {krakow.id, katowice.id, warsaw.id}
+
+    response = api_client.get(MAP_URL, {'bbox': '19.9,50,20,50.1', 'zoom': 16})
+    assert [e['id'] for e in response.data] == [krakow.id]
+
+
+@pytest.mark.django_db
+def test_map_clusters_invalidated_on_event_save(api_client, user_factory, city_events):
+    krakow, katowice, warsaw = city_events
+    api_client.force_authenticate(user=user_factory())
+    params = {'bbox': '14,49,24,55', 'zoom': 2}
+    assert api_client.get(MAP_URL, params).data[0]['count'] == 3
+
+    krakow.latitude, krakow.longitude = 40.4, -3.7
+    krakow.save()
+    assert api_client.get(MAP_URL, params).data[0]['count'] == 2
+
+    katowice.delete()
+    assert api_client.get(MAP_URL, params).data[0]['count'] == 1
+
+
+@pytest.mark.django_db
+def test_map_clusters_reject_too_many_tiles(api_client, user_factory):
+    api_client.force_authenticate(user=user_factory())
+
+    response = api_client.get(MAP_URL, {'bbox': '-180,-80,180,80', 'zoom': 10})
+    assert response.status_code == 400
+    assert response.data['code'] == 'viewport_too_large'
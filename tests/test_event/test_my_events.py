@@ -0,0 +1,43 @@
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+
+@pytest.mark.django_db
+def test_my_upcoming_events_union_authored_and_joined(auth_api_client, event_factory, user_factory, event_participant_factory):
+    client, user = auth_api_client
+    other = user_factory()
+    soon = timezone.now() + timedelta(hours=1)
+
+    authored = event_factory(author=user, public_event=False, date_time_event=soon + timedelta(days=2))
+    joined = event_factory(author=other, public_event=False, date_time_event=soon + timedelta(days=1))
+    trainer_in_own = event_factory(author=user, date_time_event=soon + timedelta(days=3))
+    event_factory(author=user, date_time_event=timezone.now() - timedelta(days=1))
+    event_factory(author=other, date_time_event=soon)
+    event_participant_factory(event=joined, user=user, role='admin')
+    event_participant_factory(event=trainer_in_own, user=user, role='trainer')
+    past = event_factory(author=other, date_time_event=timezone.now() - timedelta(days=1))
+    event_participant_factory(event=past, user=user)
+
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get('/event/events/my-upcoming/?cursor=', format='json')
+
+    assert response.status_code == 200
+    assert len(ctx.captured_queries) == 1
+    rows = [(e['id'], e['role_in_event'], e['is_author']) for e in response.data['results']]
+    assert rows == [
+        (joined.id, 'admin', False),
+        (authored.id, None, True),
+        (trainer_in_own.id, 'trainer', True),
+    ]
+    assert set(response.data['results'][0]) == {
+        'id', 'date_time_event', 'duration_min', 'title', 'city', 'event_image',
+        'event_participant_count', 'role_in_event', 'is_author',
+    }
+
+
+@pytest.mark.django_db
+def test_my_upcoming_events_requires_login(api_client):
+    assert api_client.get('/event/events/my-upcoming/', format='json').status_code == 401
@@ -0,0 +1,122 @@
+import io
+import threading
+import pytest
+from django.core.management import call_command
+from django.db import connections
+from event.models import Event, EventAdditionalInfo
+from event.services import join_event, JOINED, ALREADY_JOINED, FULL
+
+
+def participant_count(event):
+    return Event.objects.values_list('participant_count', flat=True).get(pk=event.pk)
+
+
+@pytest.fixture
+def limited_event(event_factory, user_factory):
+    def factory(limit, **kwargs):
+        event = event_factory(author=user_factory(), **kwargs)
+        EventAdditionalInfo.objects.create(event=event, places_for_people_limit=limit)
+        return event
+    return factory
+
+
+@pytest.mark.django_db
+def test_participant_count_follows_join_quit_and_kick(api_client, user_factory, limited_event, event_participant_factory):
+    event = limited_event(5)
+    user = user_factory()
+    api_client.force_authenticate(user=user)
+
+    assert api_client.post(f'/event/events/{event.id}/join_to_public_event/').status_code == 200
+    assert participant_count(event) == 1
+
+    kicked = event_participant_factory(event=event, user=user_factory())
+    assert participant_count(event) == 2
+
+    response = api_client.get(f'/event/events/{event.id}/')
+    assert response.data['event_participant_count'] == 2
+
+    assert api_client.post(f'/event/events/{event.id}/quit_from_event/').status_code == 200
+    assert participant_count(event) == 1
+
+    api_client.force_authenticate(user=event.author)
+    response = api_client.post(f'/event/{event.id}/event-participant-list/{kicked.id}/delete_user_from_participant_list/')
+    assert response.status_code == 204
+    assert participant_count(event) == 0
+
+
+@pytest.mark.django_db
+def test_join_full_event_is_rejected_by_conditional_update(api_client, user_factory, limited_event, event_participant_factory):
+    event = limited_event(1)
+    event_participant_factory(event=event, user=user_factory())
+    api_client.force_authenticate(user=user_factory())
+
+    response = api_client.post(f'/event/events/{event.id}/join_to_public_event/')
+
+    assert response.status_code == 400
+    assert response.data['code'] == 'no_seats_avaible'
+    assert participant_count(event) == 1
+    assert event.eventparticipant.count() == 1
+
+
+@pytest.mark.django_db
+def test_invitation_join_counts_seat(api_client, user_factory, limited_event, event_invitation_factory):
+    event = limited_event(1, public_event=False)
+    invitation = event_invitation_factory(event=event, created_by=event.author)
+
+    api_client.force_authenticate(user=user_factory())
+    assert api_client.post('/event/event-inv-join/', {'code': invitation.code}).status_code == 200
+    assert api_client.post('/event/event-inv-join/', {'code': invitation.code}).status_code == 200
+    assert participant_count(event) == 1
+
+    api_client.force_authenticate(user=user_factory())
+    assert api_client.post('/event/event-inv-join/', {'code': invitation.code}).status_code == 400
+    assert participant_count(event) == 1
+
+
+@pytest.mark.django_db
+def test_event_list_reads_participant_count(api_client, event_factory, user_factory, event_participant_factory):
+    event = event_factory(author=user_factory())
+    for user in user_factory.create_batch(3):
+        event_participant_factory(event=event, user=user)
+
+    response = api_client.get('/event/events/')
+
+    assert response.data['results'][0]['event_participant_count'] == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_parallel_joins_never_overbook(limited_event, user_factory):
+    event = limited_event(5)
+    users = user_factory.create_batch(20)
+    results = []
+    barrier = threading.Barrier(len(users))
+
+    def join(user):
+        try:
+            barrier.wait()
+            # drugie wywołanie to ponowienie po timeoucie klienta
+            results.append(join_event(event.pk, user.pk))
+            results.append(join_event(event.pk, user.pk))
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=join, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results.count(JOINED) == 5
+    assert results.count(ALREADY_JOINED) == 5
+    assert results.count(FULL) == 30
+    assert participant_count(event) == 5
+    assert event.eventparticipant.count() == 5
+
+
+@pytest.mark.django_db(transaction=True)
+def test_bench_event_joins_command():
+    out = io.StringIO()
+    call_command('bench_event_joins', '--users', '10', '--seats', '3', '--retries', '2', stdout=out)
+
+    assert "Licznik: 3, uczestnicy: 3, limit: 3" in out.getvalue()
+    assert not Event.objects.filter(title='bench').exists()
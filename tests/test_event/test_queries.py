@@ -0,0 +1,55 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from event.models import EventAdditionalInfo, SpecialGuests
+
+
+def make_event(event_factory, user_factory, event_participant_factory, trainers=2, guests=2):
+    event = event_factory(author=user_factory())
+    info = EventAdditionalInfo.objects.create(event=event, places_for_people_limit=50)
+    for n in range(guests):
+        SpecialGuests.objects.create(add_info=info, name=f"Gość {n}")
+    for user in user_factory.create_batch(trainers):
+        event_participant_factory(event=event, user=user, role='trainer')
+    event_participant_factory(event=event, user=user_factory())
+    return event
+
+
+def count_queries(client, url):
+    with CaptureQueriesContext(connection) as ctx:
+        response = client.get(url, format="json")
+    assert response.status_code == 200, response.data
+    return len(ctx.captured_queries), response
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", ['/event/events/', '/event/events/?cursor='])
+def test_event_list_queries_do_not_grow_with_page_size(auth_api_client, event_factory, user_factory, event_participant_factory, url):
+    client, user = auth_api_client
+
+    make_event(event_factory, user_factory, event_participant_factory)
+    single, _ = count_queries(client, url)
+
+    for _ in range(19):
+        make_event(event_factory, user_factory, event_participant_factory)
+    full, response = count_queries(client, url)
+
+    assert len(response.data["results"]) == 20
+    assert full == single
+
+
+@pytest.mark.django_db
+def test_event_detail_queries_pinned(auth_api_client, event_factory, user_factory, event_participant_factory):
+    client, user = auth_api_client
+    few = make_event(event_factory, user_factory, event_participant_factory, trainers=1, guests=1)
+    many = make_event(event_factory, user_factory, event_participant_factory, trainers=6, guests=5)
+
+    few_count, _ = count_queries(client, f'/event/events/{few.id}/')
+    many_count, response = count_queries(client, f'/event/events/{many.id}/')
+
+    # widoczność z rolą, event z joinami (kategoria, additional_info, profil autora), trenerzy, goście
+    assert few_count == many_count == 4
+    assert len(response.data["trainer_list"]) == 6
+    assert len(response.data["additional_info"]["special_guests"]) == 5
+    assert response.data["author_full_name"] == "Factory User"
+    assert response.data["trainer_list"][0]["user"]["profile"]["name"] == "Factory"
@@ -0,0 +1,175 @@
+import json
+import re
+import pytest
+from datetime import timedelta
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from event.models import Category, Event, EventAdditionalInfo, EventInvitation, EventParticipant
+
+
+# Tabele, na których Seq Scan oznacza brak pasującego indeksu
+WATCHED_TABLES = ('event_event', 'event_eventparticipant', 'event_eventinvitation')
+EVENTS = 1000
+EXPLAINABLE = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+
+
+@pytest.fixture
+def seeded(user_factory):
+    """
+    Dość wierszy, żeby statystyki nie premiowały przejścia całego indeksu,
+    a i tak wyłączamy seq scan - jeśli pasujący indeks istnieje, planner go weźmie.
+    """
+    author, member, trainer = user_factory.create_batch(3)
+    start = timezone.now() + timedelta(days=1)
+
+    events = Event.objects.bulk_create([
+        Event(
+            author=author, title=f"Trening {n}", short_desc="Bieganie", duration_min=60,
+            date_time_event=start + timedelta(hours=n), public_event=n % 3 != 0,
+            latitude=50 + n / 100, longitude=19 + n / 100,
+        )
+        for n in range(EVENTS)
+    ])
+    EventAdditionalInfo.objects.bulk_create([
+        EventAdditionalInfo(event=event, places_for_people_limit=100) for event in events
+    ])
+    EventParticipant.objects.bulk_create(
+        [EventParticipant(event=event, user=member) for event in events[:20]]
+        + [EventParticipant(event=event, user=trainer, role='trainer') for event in events]
+    )
+    EventInvitation.objects.bulk_create([
+        EventInvitation(event=event, code=f'P{n:07d}', is_active=True, created_by=author)
+        for n, event in enumerate(events)
+    ])
+    invitation = EventInvitation.objects.get(code='P0000000')
+
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE event_event, event_eventparticipant, event_eventinvitation')
+
+    return {'author': author, 'member': member, 'trainer': trainer, 'events': events, 'invitation': invitation}
+
+
+def watched_indexes():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT indexname FROM pg_indexes WHERE tablename = ANY(%s)', [list(WATCHED_TABLES)])
+        return {row[0] for row in cursor.fetchall()}
+
+
+def plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def unindexed_scans(sql, indexes):
+    """
+    Seq Scan albo skan całego indeksu bez Index Cond (planner przy wyłączonym
+    seq scan woli przejść cały pkey niż przyznać się do braku indeksu).
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    problems = []
+    for node in plan_nodes(plan[0]['Plan']):
+        if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in WATCHED_TABLES:
+            problems.append(f"Seq Scan on {node['Relation Name']}")
+        elif node.get('Index Name') in indexes and 'Index Cond' not in node:
+            problems.append(f"{node['Node Type']} using {node['Index Name']} without Index Cond")
+    return problems
+
+
+def assert_indexed(client, method, url, data=None):
+    with CaptureQueriesContext(connection) as ctx:
+        response = getattr(client, method)(url, data, format='json')
+    assert response.status_code < 500, response.data
+
+    indexes = watched_indexes()
+    problems = {}
+    for query in ctx.captured_queries:
+        if EXPLAINABLE.match(query['sql']):
+            scans = unindexed_scans(query['sql'], indexes)
+            if scans:
+                problems[query['sql']] = scans
+
+    assert not problems, "\n\n".join(f"{sql}\n  -> {scans}" for sql, scans in problems.items())
+    return response
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('who', ['anonymous', 'member'])
+@pytest.mark.parametrize('url', [
+    '/event/events/',
+    '/event/events/?cursor=',
+    '/event/events/?cursor=&with_count=true',
+    '/event/events/?page=2',
+])
+def test_event_list_plans(api_client, seeded, who, url):
+    if who == 'member':
+        api_client.force_authenticate(user=seeded['member'])
+    assert_indexed(api_client, 'get', url)
+
+
+@pytest.mark.django_db
+def test_event_search_plans(api_client, seeded):
+    # OR tsvector / trigram tytułu / kategorii potrzebuje BitmapOr po obu indeksach GIN i indeksie FK kategorii.
+    # Fraza musi być selektywna - "trening" pasuje do wszystkich eventów i skan całości jest wtedy zasadny.
+    zumba = Category.objects.create(name='Zumba')
+    events = seeded['events']
+    Event.objects.filter(pk__in=[e.pk for e in events[:3]]).update(title='Zumba fitness')
+    Event.objects.filter(pk__in=[e.pk for e in events[3:6]]).update(category=zumba)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE event_event, event_category')
+
+    api_client.force_authenticate(user=seeded['member'])
+    assert_indexed(api_client, 'get', '/event/events/?search=zumba')
+
+
+@pytest.mark.django_db
+def test_event_detail_and_map_plans(api_client, seeded):
+    event = seeded['events'][1]
+    api_client.force_authenticate(user=seeded['member'])
+
+    assert_indexed(api_client, 'get', f'/event/events/{event.id}/')
+    assert_indexed(api_client, 'get', '/event/events/my-upcoming/')
+    assert_indexed(api_client, 'get', '/event/events/my-upcoming/?cursor=')
+    assert_indexed(api_client, 'get', '/event/events/events_on_map/?bbox=18,49,21,51')
+    assert_indexed(api_client, 'get', '/event/events/events_on_map/?lat=50.1&lng=19.1&radius_km=20')
+    assert_indexed(api_client, 'get', '/event/events/events_on_map/?bbox=18,49,21,51&zoom=6')
+
+
+@pytest.mark.django_db
+def test_event_participant_and_invitation_plans(api_client, seeded):
+    event = seeded['events'][0]
+    api_client.force_authenticate(user=seeded['trainer'])
+
+    assert_indexed(api_client, 'get', f'/event/{event.id}/event-participant-list/')
+    assert_indexed(api_client, 'get', f'/event/events/{event.id}/invitations/')
+
+    api_client.force_authenticate(user=seeded['author'])
+    participant = EventParticipant.objects.get(event=event, user=seeded['member'])
+    assert_indexed(api_client, 'post', f'/event/{event.id}/change-role/{participant.id}/', {'new_role': 'admin'})
+
+    base = f'/event/{event.id}/event-participant-list'
+    assert_indexed(api_client, 'post', f'{base}/bulk-role/', {'participant_ids': [participant.id], 'new_role': 'trainer'})
+    assert_indexed(api_client, 'post', f'{base}/bulk-status/', {'participant_ids': [participant.id], 'paid_status': True})
+    assert_indexed(api_client, 'post', f'{base}/bulk-remove/', {'participant_ids': [participant.id]})
+
+
+@pytest.mark.django_db
+def test_event_join_and_quit_plans(api_client, user_factory, seeded):
+    event = seeded['events'][25]
+    api_client.force_authenticate(user=user_factory())
+
+    assert_indexed(api_client, 'post', f'/event/events/{event.id}/join_to_public_event/')
+    assert_indexed(api_client, 'post', f'/event/events/{event.id}/quit_from_event/')
+    assert_indexed(api_client, 'get', f"/event/events/by-code/{seeded['invitation'].code}/")
+    assert_indexed(api_client, 'post', '/event/event-inv-join/', {'code': seeded['invitation'].code})